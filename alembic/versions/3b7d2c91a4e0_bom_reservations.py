@@ -0,0 +1,38 @@
+"""BOM priorities and stock reservations
+
+Revision ID: 3b7d2c91a4e0
+Revises: f6a8468a5b45
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7d2c91a4e0'
+down_revision: Union[str, Sequence[str], None] = 'f6a8468a5b45'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('bom', sa.Column('priority', sa.Integer(), nullable=True, server_default='2'))
+    op.add_column('bom', sa.Column('due_date', sa.Date(), nullable=True))
+    op.add_column('bom_material', sa.Column('quantity_reserved', sa.Float(), nullable=True, server_default='0'))
+    op.create_index('ix_bom_material_bom_id', 'bom_material', ['bom_id'])
+    op.create_index('ix_bom_material_storage_id', 'bom_material', ['storage_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_bom_material_storage_id', table_name='bom_material')
+    op.drop_index('ix_bom_material_bom_id', table_name='bom_material')
+    with op.batch_alter_table('bom_material') as batch_op:
+        batch_op.drop_column('quantity_reserved')
+    with op.batch_alter_table('bom') as batch_op:
+        batch_op.drop_column('due_date')
+        batch_op.drop_column('priority')
@@ -0,0 +1,36 @@
+"""Material outward storage link
+
+Revision ID: 5c9e2a7d13f4
+Revises: 8e41f0d6c2b7
+Create Date: 2026-10-18 13:05:22.640317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c9e2a7d13f4'
+down_revision: Union[str, Sequence[str], None] = '8e41f0d6c2b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('material_outward') as batch_op:
+        batch_op.add_column(sa.Column('storage_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_material_outward_storage_id', 'storage', ['storage_id'], ['id'])
+        batch_op.alter_column('qty', existing_type=sa.Integer(), type_=sa.Float())
+    op.create_index('ix_material_outward_storage_id', 'material_outward', ['storage_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_material_outward_storage_id', table_name='material_outward')
+    with op.batch_alter_table('material_outward') as batch_op:
+        batch_op.alter_column('qty', existing_type=sa.Float(), type_=sa.Integer())
+        batch_op.drop_constraint('fk_material_outward_storage_id', type_='foreignkey')
+        batch_op.drop_column('storage_id')
@@ -0,0 +1,44 @@
+"""BOM running totals
+
+Revision ID: 8e41f0d6c2b7
+Revises: 3b7d2c91a4e0
+Create Date: 2026-10-18 11:40:05.502118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e41f0d6c2b7'
+down_revision: Union[str, Sequence[str], None] = '3b7d2c91a4e0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('bom', sa.Column('required_total', sa.Float(), nullable=True, server_default='0'))
+    op.add_column('bom', sa.Column('provided_total', sa.Float(), nullable=True, server_default='0'))
+    op.create_index('ix_bom_status', 'bom', ['status'])
+
+    # Backfill from the existing material rows
+    op.execute(
+        "UPDATE bom_material SET is_fully_provided = "
+        "(COALESCE(quantity_provided, 0) >= COALESCE(quantity_required, 0))"
+    )
+    op.execute(
+        "UPDATE bom SET "
+        "required_total = (SELECT COALESCE(SUM(quantity_required), 0) FROM bom_material WHERE bom_material.bom_id = bom.id), "
+        "provided_total = (SELECT COALESCE(SUM(quantity_provided), 0) FROM bom_material WHERE bom_material.bom_id = bom.id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_bom_status', table_name='bom')
+    with op.batch_alter_table('bom') as batch_op:
+        batch_op.drop_column('provided_total')
+        batch_op.drop_column('required_total')
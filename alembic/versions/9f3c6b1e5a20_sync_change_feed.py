@@ -0,0 +1,65 @@
+"""Change sequence columns and tombstones for the sync feed
+
+Revision ID: 9f3c6b1e5a20
+Revises: e2d7a4c9f813
+Create Date: 2026-10-19 01:41:07.322918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9f3c6b1e5a20'
+down_revision: Union[str, Sequence[str], None] = 'e2d7a4c9f813'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Tables that gain updated_at as well as change_seq
+NEW_UPDATED_AT = ('dealer', 'purchase_order', 'material_inward')
+SYNCED = ('storage',) + NEW_UPDATED_AT
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in SYNCED:
+        with op.batch_alter_table(table) as batch_op:
+            if table in NEW_UPDATED_AT:
+                batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+            # Existing rows start at 0 and are sent by a first (token-less) sync
+            batch_op.add_column(sa.Column('change_seq', sa.Integer(), server_default='0', nullable=True))
+        op.create_index(f'ix_{table}_change_seq', table, ['change_seq'])
+
+    op.create_table(
+        'change_counter',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('value', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.execute("INSERT INTO change_counter (id, value) VALUES (1, 0)")
+
+    op.create_table(
+        'sync_tombstones',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('resource', sa.String(length=32), nullable=False),
+        sa.Column('row_id', sa.Integer(), nullable=False),
+        sa.Column('change_seq', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_sync_tombstones_feed', 'sync_tombstones', ['resource', 'change_seq', 'row_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_sync_tombstones_feed', table_name='sync_tombstones')
+    op.drop_table('sync_tombstones')
+    op.drop_table('change_counter')
+    for table in SYNCED:
+        op.drop_index(f'ix_{table}_change_seq', table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('change_seq')
+            if table in NEW_UPDATED_AT:
+                batch_op.drop_column('updated_at')
@@ -0,0 +1,69 @@
+"""Price list upserts and price history
+
+Revision ID: a1f7c3e9b205
+Revises: 5c9e2a7d13f4
+Create Date: 2026-10-18 14:22:51.907113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1f7c3e9b205'
+down_revision: Union[str, Sequence[str], None] = '5c9e2a7d13f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _check_duplicate_items() -> None:
+    """Fail with the offending rows instead of a bare IntegrityError from CREATE UNIQUE INDEX"""
+    storage = sa.table('storage', sa.column('id'), sa.column('dealer_id'), sa.column('defined_name_with_spec'))
+    duplicates = op.get_bind().execute(
+        sa.select(storage.c.dealer_id, storage.c.defined_name_with_spec,
+                  sa.func.count().label('copies'), sa.func.min(storage.c.id), sa.func.max(storage.c.id))
+        .where(storage.c.defined_name_with_spec.isnot(None))
+        .group_by(storage.c.dealer_id, storage.c.defined_name_with_spec)
+        .having(sa.func.count() > 1)
+        .order_by(storage.c.dealer_id, storage.c.defined_name_with_spec)
+    ).all()
+    if duplicates:
+        listed = "\n".join(
+            f"  dealer {dealer_id}, '{spec}': {copies} items (ids {first_id}..{last_id})"
+            for dealer_id, spec, copies, first_id, last_id in duplicates[:50]
+        )
+        more = f"\n  ... and {len(duplicates) - 50} more" if len(duplicates) > 50 else ""
+        raise RuntimeError(
+            "storage has items that share a dealer and defined_name_with_spec, which the new unique "
+            "index uq_storage_dealer_spec forbids. Merge or rename them, then run the upgrade again:\n"
+            f"{listed}{more}"
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _check_duplicate_items()
+    op.create_index('uq_storage_dealer_spec', 'storage', ['dealer_id', 'defined_name_with_spec'], unique=True)
+    op.create_table(
+        'price_history',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('storage_id', sa.Integer(), nullable=True),
+        sa.Column('dealer_id', sa.Integer(), nullable=True),
+        sa.Column('price', sa.Float(), nullable=True),
+        sa.Column('tax', sa.Float(), nullable=True),
+        sa.Column('source', sa.String(length=32), nullable=True),
+        sa.Column('recorded_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['dealer_id'], ['dealer.id']),
+        sa.ForeignKeyConstraint(['storage_id'], ['storage.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_price_history_storage_id', 'price_history', ['storage_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_price_history_storage_id', table_name='price_history')
+    op.drop_table('price_history')
+    op.drop_index('uq_storage_dealer_spec', table_name='storage')
@@ -0,0 +1,52 @@
+"""Transactional outbox for change events
+
+Revision ID: b7e2f4a9c1d3
+Revises: 9f3c6b1e5a20
+Create Date: 2026-10-19 03:12:44.051263
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2f4a9c1d3'
+down_revision: Union[str, Sequence[str], None] = '9f3c6b1e5a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'outbox_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('resource', sa.String(length=32), nullable=False),
+        sa.Column('action', sa.String(length=16), nullable=False),
+        sa.Column('change_seq', sa.Integer(), nullable=False),
+        sa.Column('row_ids', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_outbox_events_created_at', 'outbox_events', ['created_at'])
+
+    op.create_table(
+        'outbox_cursors',
+        sa.Column('subscriber', sa.String(length=200), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('leased_until', sa.DateTime(), nullable=True),
+        sa.Column('lease_owner', sa.String(length=64), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('subscriber'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('outbox_cursors')
+    op.drop_index('ix_outbox_events_created_at', table_name='outbox_events')
+    op.drop_table('outbox_events')
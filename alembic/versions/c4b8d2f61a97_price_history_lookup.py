@@ -0,0 +1,79 @@
+"""Price history lookup index and PO line prices
+
+Revision ID: c4b8d2f61a97
+Revises: a1f7c3e9b205
+Create Date: 2026-10-18 15:48:13.275640
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4b8d2f61a97'
+down_revision: Union[str, Sequence[str], None] = 'a1f7c3e9b205'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('price_history') as batch_op:
+        batch_op.add_column(sa.Column('po_no', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_price_history_po_no', 'purchase_order', ['po_no'], ['po_no'])
+    op.drop_index('ix_price_history_storage_id', table_name='price_history')
+    op.create_index('ix_price_history_lookup', 'price_history', ['storage_id', 'dealer_id', 'recorded_at'])
+    op.create_index('ix_price_history_po_no', 'price_history', ['po_no'])
+
+    # Backfill from existing PO lines, dated with the PO date
+    bind = op.get_bind()
+    history = sa.table(
+        'price_history', sa.column('storage_id'), sa.column('dealer_id'), sa.column('price'), sa.column('tax'),
+        sa.column('source'), sa.column('po_no'), sa.column('recorded_at'),
+    )
+    item = sa.table('purchase_order_item', sa.column('po_no'), sa.column('material_id'), sa.column('price'))
+    order = sa.table('purchase_order', sa.column('po_no'), sa.column('dealer_id'), sa.column('date'))
+    storage = sa.table(
+        'storage', sa.column('id'), sa.column('dealer_id'), sa.column('price'), sa.column('tax'),
+        sa.column('updated_at'), sa.column('created_at'),
+    )
+    po_date = sa.func.coalesce(order.c.date, sa.func.current_date())
+    if bind.dialect.name == 'sqlite':
+        # SQLite keeps datetimes as text; CAST would turn the date into a number
+        po_date = po_date.concat(' 00:00:00.000000')
+    else:
+        po_date = sa.cast(po_date, sa.DateTime())
+    op.execute(
+        history.insert().from_select(
+            ['storage_id', 'dealer_id', 'price', 'source', 'po_no', 'recorded_at'],
+            sa.select(item.c.material_id, order.c.dealer_id, item.c.price, sa.literal('purchase_order'),
+                      order.c.po_no, po_date)
+            .select_from(item.join(order, order.c.po_no == item.c.po_no))
+            .where(item.c.material_id.isnot(None), item.c.price.isnot(None)),
+        )
+    )
+    # and the current price of items that have no history yet
+    op.execute(
+        history.insert().from_select(
+            ['storage_id', 'dealer_id', 'price', 'tax', 'source', 'recorded_at'],
+            sa.select(storage.c.id, storage.c.dealer_id, storage.c.price, storage.c.tax, sa.literal('edit'),
+                      sa.func.coalesce(storage.c.updated_at, storage.c.created_at, sa.func.current_timestamp()))
+            .where(
+                storage.c.price.isnot(None),
+                ~sa.exists().where(history.c.storage_id == storage.c.id, history.c.source != 'purchase_order'),
+            ),
+        )
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM price_history WHERE source IN ('purchase_order', 'edit')")
+    op.drop_index('ix_price_history_po_no', table_name='price_history')
+    op.drop_index('ix_price_history_lookup', table_name='price_history')
+    op.create_index('ix_price_history_storage_id', 'price_history', ['storage_id'])
+    with op.batch_alter_table('price_history') as batch_op:
+        batch_op.drop_constraint('fk_price_history_po_no', type_='foreignkey')
+        batch_op.drop_column('po_no')
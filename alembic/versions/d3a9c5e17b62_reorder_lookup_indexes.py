@@ -0,0 +1,30 @@
+"""Indexes for the reorder engine's stock-on-order lookup
+
+Revision ID: d3a9c5e17b62
+Revises: b7e2f4a9c1d3
+Create Date: 2026-10-19 04:26:13.508117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3a9c5e17b62'
+down_revision: Union[str, Sequence[str], None] = 'b7e2f4a9c1d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_purchase_order_item_material_id', 'purchase_order_item', ['material_id'])
+    op.create_index('ix_material_inward_items_po_item_id', 'material_inward_items', ['po_item_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_material_inward_items_po_item_id', table_name='material_inward_items')
+    op.drop_index('ix_purchase_order_item_material_id', table_name='purchase_order_item')
@@ -0,0 +1,34 @@
+"""Summary table for the dashboard KPIs
+
+Revision ID: f1c6e8a2b934
+Revises: d3a9c5e17b62
+Create Date: 2026-10-19 06:12:40.215733
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c6e8a2b934'
+down_revision: Union[str, Sequence[str], None] = 'd3a9c5e17b62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'dashboard_kpis',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('value', sa.Float(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('dashboard_kpis')
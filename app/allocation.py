@@ -0,0 +1,244 @@
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import select, update, insert, bindparam, func
+from sqlalchemy.orm import Session
+
+from app import models
+from app.stock import take_stock
+
+# BOMs in these states compete for stock; everything else releases its reservations
+OPEN_BOM_STATUSES = ('pending', 'in_progress')
+
+PRIORITY_CHOICES = [(1, "Low"), (2, "Normal"), (3, "High"), (4, "Urgent")]
+
+# Float slack allowed when a supply exactly meets the outstanding quantity
+SUPPLY_TOLERANCE = 1e-9
+
+
+def _open_bom_ranks(conn):
+    """Allocation order of open BOMs: priority, then earliest due date, then age"""
+    bom = models.BOM.__table__
+    rows = conn.execute(
+        select(bom.c.id, bom.c.priority, bom.c.due_date).where(bom.c.status.in_(OPEN_BOM_STATUSES))
+    ).all()
+    rows.sort(key=lambda r: (-(r.priority or 0), r.due_date is None, r.due_date or date.min, r.id))
+    return {row.id: rank for rank, row in enumerate(rows)}
+
+
+def allocate_stock(db: Session, storage_ids=None):
+    """Reserve storage stock across open BOMs by priority and due date.
+
+    Passing storage_ids reallocates only those materials, which is what the
+    stock-arrival paths use. A full run walks every open BOM line, so rows are
+    read as plain tuples and ordered in Python against the (small) ranked BOM
+    list instead of sorting the joined set in SQL, and only rows whose
+    reservation changed are written back in a single executemany. The caller
+    owns the commit. Returns the number of BOM material rows whose
+    reservation changed.
+    """
+    if storage_ids is not None:
+        storage_ids = list(set(storage_ids))
+        if not storage_ids:
+            return 0
+
+    conn = db.connection()
+    storage = models.Storage.__table__
+    material = models.BOMMaterial.__table__
+
+    stock_query = select(storage.c.id, storage.c.current_stock)
+    if storage_ids is not None:
+        stock_query = stock_query.where(storage.c.id.in_(storage_ids))
+    available = {sid: (stock or 0) for sid, stock in conn.execute(stock_query)}
+
+    ranks = _open_bom_ranks(conn)
+    demand_query = select(
+        material.c.id,
+        material.c.bom_id,
+        material.c.storage_id,
+        material.c.quantity_required,
+        material.c.quantity_provided,
+        material.c.quantity_reserved,
+    ).where(material.c.storage_id.isnot(None))
+    if storage_ids is not None:
+        demand_query = demand_query.where(material.c.storage_id.in_(storage_ids))
+    demand = [row for row in conn.execute(demand_query).all() if row[1] in ranks]
+    demand.sort(key=lambda row: (ranks[row[1]], row[0]))
+
+    changes = []
+    for row_id, _, storage_id, required, provided, reserved in demand:
+        outstanding = max((required or 0) - (provided or 0), 0)
+        free = available.get(storage_id, 0)
+        take = outstanding if outstanding <= free else max(free, 0)
+        available[storage_id] = free - take
+        if take != (reserved or 0):
+            changes.append((take, row_id))
+
+    # Closed BOMs give their reservations back
+    release = update(material).where(
+        material.c.quantity_reserved > 0,
+        material.c.bom_id.in_(
+            select(models.BOM.__table__.c.id).where(models.BOM.__table__.c.status.notin_(OPEN_BOM_STATUSES))
+        ),
+    ).values(quantity_reserved=0)
+    if storage_ids is not None:
+        release = release.where(material.c.storage_id.in_(storage_ids))
+    released = conn.execute(release).rowcount or 0
+
+    if changes:
+        # Straight to the driver: compiling bind parameters per row costs more
+        # than the UPDATE itself on a full reallocation
+        mark = "%s" if conn.dialect.paramstyle in ("format", "pyformat") else "?"
+        conn.exec_driver_sql(
+            f"UPDATE {material.name} SET quantity_reserved = {mark} WHERE id = {mark}",
+            changes,
+        )
+
+    return len(changes) + released
+
+
+def record_supply(db: Session, lines_by_bom, supply_type="manual", notes=None):
+    """Record supply transactions for several BOMs in one pass.
+
+    lines_by_bom maps a BOM id to a list of (bom_material_id, quantity) pairs.
+    A line may not exceed what its material still requires (ValueError).
+    Transactions and items are bulk inserted, stock is taken with
+    app.stock.take_stock so concurrent issues cannot oversell or dip into
+    other BOMs' reservations, and the touched materials are reallocated
+    afterwards. Returns the ids of the created supply transactions.
+    """
+    merged = {}
+    for bom_id, lines in lines_by_bom.items():
+        totals = defaultdict(float)
+        for m_id, qty in lines:
+            if qty and qty > 0:
+                totals[m_id] += qty
+        if totals:
+            merged[bom_id] = list(totals.items())
+    lines_by_bom = merged
+    if not lines_by_bom:
+        return []
+
+    material_ids = [m_id for lines in lines_by_bom.values() for m_id, _ in lines]
+    materials = {
+        row.id: row
+        for row in db.execute(
+            select(
+                models.BOMMaterial.id,
+                models.BOMMaterial.bom_id,
+                models.BOMMaterial.storage_id,
+                models.BOMMaterial.quantity_required,
+                models.BOMMaterial.quantity_provided,
+                models.BOMMaterial.quantity_reserved,
+            ).where(models.BOMMaterial.id.in_(material_ids))
+        )
+    }
+
+    # Take the stock first so a shortfall aborts before anything is written
+    per_storage = defaultdict(float)
+    for bom_id, lines in lines_by_bom.items():
+        for m_id, qty in lines:
+            material = materials.get(m_id)
+            if material is None or material.bom_id != bom_id:
+                raise ValueError(f"BOM material {m_id} does not belong to BOM {bom_id}")
+            outstanding = max((material.quantity_required or 0) - (material.quantity_provided or 0), 0)
+            if qty > outstanding + SUPPLY_TOLERANCE:
+                raise ValueError(
+                    f"Cannot supply {qty:g} of BOM material {m_id}: only {outstanding:g} is still required"
+                )
+            per_storage[material.storage_id] += qty
+
+    # The lines' own reservations are theirs to use; other BOMs' are not
+    take_stock(db, per_storage, own=list(materials))
+
+    today = date.today()
+    transactions = db.execute(
+        insert(models.BOMSupplyTransaction).returning(
+            models.BOMSupplyTransaction.id, models.BOMSupplyTransaction.bom_id
+        ),
+        [
+            {"bom_id": bom_id, "supply_date": today, "supply_type": supply_type, "notes": notes}
+            for bom_id in lines_by_bom
+        ],
+    ).all()
+    transaction_ids = {bom_id: tx_id for tx_id, bom_id in transactions}
+
+    items = []
+    material_updates = []
+    for bom_id, lines in lines_by_bom.items():
+        for m_id, qty in lines:
+            material = materials[m_id]
+            provided = (material.quantity_provided or 0) + qty
+            required = material.quantity_required or 0
+            items.append({
+                "transaction_id": transaction_ids[bom_id],
+                "bom_id": bom_id,
+                "storage_id": material.storage_id,
+                "quantity_provided": qty,
+            })
+            material_updates.append({
+                "id": m_id,
+                "quantity_provided": provided,
+                "quantity_reserved": max((material.quantity_reserved or 0) - qty, 0),
+                "is_fully_provided": provided >= required,
+            })
+    db.execute(insert(models.BOMSupplyItem), items)
+    db.execute(update(models.BOMMaterial), material_updates)
+
+    bom_table = models.BOM.__table__
+    db.execute(
+        update(bom_table)
+        .where(bom_table.c.id == bindparam("b_id"))
+        .values(provided_total=func.coalesce(bom_table.c.provided_total, 0) + bindparam("qty")),
+        [{"b_id": bom_id, "qty": sum(qty for _, qty in lines)} for bom_id, lines in lines_by_bom.items()],
+    )
+
+    _refresh_bom_status(db, list(lines_by_bom))
+    allocate_stock(db, list(per_storage))
+
+    return [tx_id for tx_id, _ in transactions]
+
+
+def supply_reserved(db: Session, bom_ids, notes=None):
+    """Issue everything currently reserved for the given BOMs"""
+    lines_by_bom = defaultdict(list)
+    rows = db.execute(
+        select(
+            models.BOMMaterial.bom_id,
+            models.BOMMaterial.id,
+            models.BOMMaterial.quantity_reserved,
+        ).where(
+            models.BOMMaterial.bom_id.in_(bom_ids),
+            models.BOMMaterial.quantity_reserved > 0,
+        )
+    )
+    for bom_id, m_id, reserved in rows:
+        lines_by_bom[bom_id].append((m_id, reserved))
+    return record_supply(db, lines_by_bom, supply_type="reserved", notes=notes)
+
+
+def _refresh_bom_status(db: Session, bom_ids):
+    """Move supplied BOMs to in_progress or completed"""
+    unfinished = set(db.execute(
+        select(models.BOMMaterial.bom_id).where(
+            models.BOMMaterial.bom_id.in_(bom_ids),
+            models.BOMMaterial.is_fully_provided.isnot(True),
+        ).distinct()
+    ).scalars())
+    completed = [bom_id for bom_id in bom_ids if bom_id not in unfinished]
+    in_progress = [bom_id for bom_id in bom_ids if bom_id in unfinished]
+
+    if completed:
+        db.execute(
+            update(models.BOM)
+            .where(models.BOM.id.in_(completed))
+            .values(status="completed", completion_date=date.today())
+            .execution_options(synchronize_session=False)
+        )
+    if in_progress:
+        db.execute(
+            update(models.BOM)
+            .where(models.BOM.id.in_(in_progress), models.BOM.status == "pending")
+            .values(status="in_progress")
+            .execution_options(synchronize_session=False)
+        )
@@ -0,0 +1,275 @@
+import json
+from datetime import date, datetime
+from typing import NamedTuple, Optional
+
+from fastapi import HTTPException, Query
+from fastapi.responses import Response
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_storage = models.Storage.__table__
+_dealer = models.Dealer.__table__
+_product = models.Product.__table__
+_product_material = models.ProductMaterial.__table__
+_consignee = models.Consignee.__table__
+_company_branch = models.CompanyBranch.__table__
+_purchase_order = models.PurchaseOrder.__table__
+_po_item = models.PurchaseOrderItem.__table__
+_material_inward = models.MaterialInward.__table__
+_inward_item = models.MaterialInwardItem.__table__
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    """Serialize API rows to JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class RowsResponse(Response):
+    """JSON response for plain rows that skips FastAPI's jsonable_encoder"""
+    media_type = "application/json"
+
+    def render(self, content):
+        return dumps(content)
+
+
+class Embed:
+    """A many-to-one relation returned as a nested object, e.g. "dealer": {"id", "name"}"""
+
+    def __init__(self, table, onclause, columns):
+        self.table = table
+        self.onclause = onclause
+        self.columns = columns  # {key: column}; the first one is the related row's key
+
+
+class Children:
+    """A one-to-many relation returned as a list, loaded with one extra
+    SELECT .. WHERE foreign_key IN (..) per batch of parent rows"""
+
+    def __init__(self, table, foreign_key, columns, order_by=None):
+        self.table = table
+        self.foreign_key = foreign_key
+        self.columns = columns  # {key: column}
+        self.order_by = order_by if order_by is not None else list(table.primary_key.columns)
+
+
+class Selection(NamedTuple):
+    fields: tuple
+    include: tuple
+
+
+# SQLite allows 999 bound parameters per statement in older builds
+IN_BATCH_SIZE = 500
+
+
+def _names(value):
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+class Projection:
+    """Which columns an /api endpoint can return and how to join for them.
+
+    Reads go through Core: one SELECT of just the requested columns, outer
+    joined only to the tables those columns and the included embeds need,
+    with the result tuples turned straight into dicts. No ORM instances,
+    identity map or lazy loads.
+    """
+
+    def __init__(self, table, columns, embeds=None, children=None, default_include=(), order_by=None):
+        self.table = table
+        self.columns = columns  # {key: column}, may include columns of embedded tables
+        self.embeds = embeds or {}  # {key: Embed}
+        self.children = children or {}  # {key: Children}
+        self.default_include = tuple(default_include)
+        self.order_by = order_by if order_by is not None else list(table.primary_key.columns)
+        self.primary_key = list(table.primary_key.columns)[0]
+        self._joins = {embed.table: embed.onclause for embed in self.embeds.values()}
+        for key, column in columns.items():
+            if column.table is not table and column.table not in self._joins:
+                raise ValueError(f"Column '{key}' needs an Embed for {column.table}")
+
+    def selection(self, fields=None, include=None):
+        """Selection from the comma-separated fields= and include= query values.
+
+        No fields means every column; no include means default_include, and
+        an empty include= turns the default embeds off.
+        """
+        names = _names(fields) if fields else list(self.columns)
+        unknown = [name for name in names if name not in self.columns]
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown)}. "
+                             f"Available: {', '.join(self.columns)}")
+        included = self.default_include if include is None else _names(include)
+        relations = list(self.embeds) + list(self.children)
+        unknown = [name for name in included if name not in relations]
+        if unknown:
+            raise ValueError(f"Unknown include(s): {', '.join(unknown)}. "
+                             f"Available: {', '.join(relations) or 'none'}")
+        return Selection(tuple(dict.fromkeys(names)), tuple(dict.fromkeys(included)))
+
+    def select(self, selection):
+        keys = list(selection.fields)
+        selected = [self.columns[key].label(key) for key in keys]
+        children = [name for name in selection.include if name in self.children]
+        # Child rows are matched up on the primary key, even if it was not asked for
+        hidden_key = None
+        if children and self.primary_key.key not in keys:
+            hidden_key = "_key"
+            selected.append(self.primary_key.label(hidden_key))
+
+        tables = {self.columns[key].table for key in keys}
+        embedded = []
+        for name in selection.include:
+            embed = self.embeds.get(name)
+            if embed is None:
+                continue
+            embedded.append((name, list(embed.columns), len(selected)))
+            selected.extend(embed.columns.values())
+            tables.add(embed.table)
+
+        source = self.table
+        for table, onclause in self._joins.items():
+            if table in tables:
+                source = source.outerjoin(table, onclause)
+        stmt = select(*selected).select_from(source).order_by(*self.order_by)
+        return stmt, keys, embedded, children, hidden_key
+
+    def fetch(self, db: Session, *criteria, selection=None, offset=None, limit=None):
+        """List of row dicts matching criteria"""
+        if selection is None:
+            selection = self.selection()
+        stmt, keys, embedded, children, hidden_key = self.select(selection)
+        if criteria:
+            stmt = stmt.where(*criteria)
+        if offset:
+            stmt = stmt.offset(offset)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        rows = db.execute(stmt).all()
+        if not embedded and not children:
+            return [dict(zip(keys, row)) for row in rows]
+
+        result = []
+        parent_keys = []
+        for row in rows:
+            item = dict(zip(keys, row))
+            for name, embed_keys, start in embedded:
+                values = row[start:start + len(embed_keys)]
+                # NULL in the related row's key means there is no related row
+                item[name] = dict(zip(embed_keys, values)) if values[0] is not None else None
+            if children:
+                parent_keys.append(row[len(keys)] if hidden_key else item[self.primary_key.key])
+            result.append(item)
+
+        for name in children:
+            grouped = self._load_children(db, self.children[name], parent_keys)
+            for item, key in zip(result, parent_keys):
+                item[name] = grouped.get(key, [])
+        return result
+
+    def _load_children(self, db, child, parent_keys):
+        keys = list(child.columns)
+        stmt = select(child.foreign_key, *[column.label(key) for key, column in child.columns.items()])
+        stmt = stmt.order_by(*child.order_by)
+        grouped = {}
+        unique = list(dict.fromkeys(parent_keys))
+        for start in range(0, len(unique), IN_BATCH_SIZE):
+            batch = unique[start:start + IN_BATCH_SIZE]
+            for row in db.execute(stmt.where(child.foreign_key.in_(batch))):
+                grouped.setdefault(row[0], []).append(dict(zip(keys, row[1:])))
+        return grouped
+
+    def fetch_one(self, db: Session, *criteria, selection=None):
+        rows = self.fetch(db, *criteria, selection=selection, limit=1)
+        return rows[0] if rows else None
+
+
+def selection_params(projection):
+    """Dependency parsing ?fields=a,b&include=c for projection, 400 on unknown names"""
+    def dependency(
+        fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+        include: Optional[str] = Query(None, description="Comma-separated relations to embed"),
+    ):
+        try:
+            return projection.selection(fields, include)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return dependency
+
+
+def _columns(table, *names):
+    return {name: table.c[name] for name in names}
+
+
+STORAGE = Projection(
+    _storage,
+    {
+        **_columns(_storage, "id", "base_name", "defined_name_with_spec", "brand", "hsn_code", "dealer_id",
+                   "tax", "price", "current_stock", "units", "created_at", "updated_at", "change_seq"),
+        "dealer_name": _dealer.c.name,
+    },
+    embeds={"dealer": Embed(_dealer, _storage.c.dealer_id == _dealer.c.id, _columns(_dealer, "id", "name"))},
+    default_include=("dealer",),
+)
+
+DEALER = Projection(
+    _dealer,
+    _columns(_dealer, "id", "name", "address", "city", "state", "country", "pincode", "telephone", "mobile",
+             "email", "gst_no", "bank_name", "account_no", "ifsc_code", "updated_at", "change_seq"),
+)
+
+PRODUCT = Projection(
+    _product,
+    _columns(_product, "id", "product_name", "product_description", "section_name", "created_at", "updated_at"),
+    children={"product_materials": Children(
+        _product_material, _product_material.c.product_id,
+        _columns(_product_material, "storage_id", "quantity_needed"),
+    )},
+    default_include=("product_materials",),
+)
+
+_BRANCH_COLUMNS = ("id", "company_name", "branch_name", "address", "city", "state", "pincode", "gst_no",
+                   "state_code", "email", "branch_indicator")
+CONSIGNEE = Projection(_consignee, _columns(_consignee, *_BRANCH_COLUMNS))
+COMPANY_BRANCH = Projection(_company_branch, _columns(_company_branch, *_BRANCH_COLUMNS))
+
+PURCHASE_ORDER = Projection(
+    _purchase_order,
+    {
+        **_columns(_purchase_order, "po_no", "dealer_id", "date", "status", "notes", "discount",
+                   "invoice_branch_id", "consignee_id", "updated_at", "change_seq"),
+        "dealer_name": _dealer.c.name,
+    },
+    embeds={"dealer": Embed(_dealer, _purchase_order.c.dealer_id == _dealer.c.id, _columns(_dealer, "id", "name"))},
+    children={"items": Children(
+        _po_item, _po_item.c.po_no,
+        _columns(_po_item, "id", "material_id", "material_name", "spec", "brand", "dealer_name", "quantity",
+                 "price", "unit"),
+    )},
+    default_include=("dealer",),
+)
+
+MATERIAL_INWARD = Projection(
+    _material_inward,
+    _columns(_material_inward, "id", "po_no", "dealer_name", "po_date", "date_of_inward", "bill_no", "bill_date",
+             "cost", "payment_method", "status", "is_pending_inward", "updated_at", "change_seq"),
+    children={"items": Children(
+        _inward_item, _inward_item.c.material_inward_id,
+        _columns(_inward_item, "id", "po_item_id", "material_name", "spec", "brand", "ordered_quantity",
+                 "quantity_received", "unit", "status"),
+    )},
+)
@@ -0,0 +1,367 @@
+import asyncio
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload
+
+from app import models, outbox
+from app.api_read import IN_BATCH_SIZE
+from app.database import SessionLocal
+
+ENABLED = os.getenv("AUTOCOMPLETE_INDEX", "1") != "0"
+# A query word matches indexed words it equals, starts, or is this similar
+# to (trigram Jaccard), for words of letters at least FUZZY_MIN_LENGTH long
+MIN_SIMILARITY = float(os.getenv("AUTOCOMPLETE_MIN_SIMILARITY", "0.4"))
+FUZZY_MIN_LENGTH = 4
+# Prefixes this common are matched by comparing each item's words instead
+MAX_PREFIX_WORDS = 5000
+# Query words matching more items than this are checked per item, not as a set
+SET_LIMIT = 20000
+# Up to this many matching items are all scored; beyond it the best
+# CANDIDATES found walking the most selective word's matches are ranked
+SCORE_LIMIT = 1000
+CANDIDATES = 100
+MAX_QUERY_WORDS = 8
+# Changed rows are indexed this many at a time, letting searches in between
+APPLY_CHUNK = 500
+
+# Score of a matched word: exact 1, prefixes 0.5-1 by how much of the word
+# was typed, misspellings FUZZY_WEIGHT times their similarity
+PREFIX_WEIGHT = 0.5
+FUZZY_WEIGHT = 0.8
+
+SUBSCRIBER = "autocomplete"
+
+_storage = models.Storage.__table__
+_SNAPSHOT = select(_storage.c.id, _storage.c.dealer_id, _storage.c.base_name,
+                   _storage.c.defined_name_with_spec, _storage.c.brand)
+
+_WORD = re.compile(r"[^\W\d_]+|\d+")
+
+
+def words(text):
+    """Lower-case runs of letters and of digits, so "SS304", "SS 304" and "ss-304" all give ss, 304"""
+    return _WORD.findall(text.lower()) if text else []
+
+
+def _trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _prefix_score(token, word):
+    return PREFIX_WEIGHT + (1 - PREFIX_WEIGHT) * len(token) / len(word)
+
+
+class MaterialIndex:
+    """Words of every Storage item's name, spec and brand, for ranked lookups.
+
+    Each distinct word has a posting list of the items that contain it. The
+    words are also kept sorted, for prefixes, and split into trigrams, for
+    misspellings. An item matches when every query word matches one of its
+    words, and scores the sum of those matches.
+
+    Items are never updated in place: a changed item gets a new slot and the
+    old one is emptied, and the posting lists are compacted once a quarter
+    of the slots are empty.
+
+    Searches hold lock while they read. Writers take writer first, so only
+    one changes the index at a time, and hold lock only while they modify
+    it: a rebuild or compaction is made off the lock and swapped in, and
+    changes go in APPLY_CHUNK rows at a time.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.writer = threading.Lock()
+        self.ready = False
+        self.pending = set()  # storage ids changed while the index was loading
+        self._clear()
+
+    def _clear(self):
+        self.items = []  # slot -> (storage id, dealer id, word ids), or None
+        self.slots = {}  # storage id -> slot
+        self.words = []  # word id -> word
+        self.word_ids = {}
+        self.sorted_words = []
+        self.postings = []  # word id -> array of slots
+        self.trigrams = {}  # trigram -> ids of words made of letters
+        self.trigram_counts = {}  # word id -> number of trigrams
+        self.by_dealer = {}  # dealer id -> array of slots
+        self.dead = 0
+
+    def _word_id(self, word, bulk=False):
+        w = self.word_ids.get(word)
+        if w is None:
+            w = self.word_ids[word] = len(self.words)
+            self.words.append(word)
+            self.postings.append(array("i"))
+            if not bulk:
+                self.sorted_words.insert(bisect_left(self.sorted_words, word), word)
+            if word.isalpha() and len(word) >= FUZZY_MIN_LENGTH - 1:
+                trigrams = _trigrams(word)
+                self.trigram_counts[w] = len(trigrams)
+                for trigram in trigrams:
+                    self.trigrams.setdefault(trigram, []).append(w)
+        return w
+
+    def _add(self, storage_id, dealer_id, base_name, spec, brand, bulk=False):
+        self._remove(storage_id)
+        known = self.word_ids
+        word_ids = []
+        for word in dict.fromkeys(words(f"{base_name or ''} {spec or ''} {brand or ''}")):
+            w = known.get(word)
+            word_ids.append(w if w is not None else self._word_id(word, bulk))
+        word_ids = tuple(word_ids)
+        slot = len(self.items)
+        self.items.append((storage_id, dealer_id, word_ids))
+        self.slots[storage_id] = slot
+        for w in word_ids:
+            self.postings[w].append(slot)
+        self.by_dealer.setdefault(dealer_id, array("i")).append(slot)
+
+    def _remove(self, storage_id):
+        slot = self.slots.pop(storage_id, None)
+        if slot is not None:
+            self.items[slot] = None
+            self.dead += 1
+
+    def _compacted(self):
+        """(items, slots, postings, by_dealer) without the empty slots; only reads, so needs just writer"""
+        items = []
+        slots = {}
+        postings = [array("i") for _ in self.words]
+        by_dealer = {}
+        for item in self.items:
+            if item is None:
+                continue
+            storage_id, dealer_id, word_ids = item
+            slot = len(items)
+            items.append(item)
+            slots[storage_id] = slot
+            for w in word_ids:
+                postings[w].append(slot)
+            by_dealer.setdefault(dealer_id, array("i")).append(slot)
+        return items, slots, postings, by_dealer
+
+    def load(self, rows):
+        """Replace the contents with rows of (id, dealer_id, base_name, spec, brand).
+
+        Returns the ids of items changed meanwhile, which the caller reloads
+        and passes to apply().
+        """
+        fresh = MaterialIndex()
+        for row in rows:
+            fresh._add(*row, bulk=True)
+        fresh.sorted_words = sorted(fresh.words)
+        with self.writer, self.lock:
+            for name in ("items", "slots", "words", "word_ids", "sorted_words", "postings", "trigrams",
+                         "trigram_counts", "by_dealer", "dead"):
+                setattr(self, name, getattr(fresh, name))
+            self.ready = True
+            pending, self.pending = self.pending, set()
+        return pending
+
+    def apply(self, rows, removed=()):
+        """Index changed rows and drop removed ids; before load() they are only noted"""
+        with self.writer:
+            if not self.ready:
+                self.pending.update(row[0] for row in rows)
+                self.pending.update(removed)
+                return
+            # Searches get the lock between chunks, so a 50k row import
+            # holds them up for one chunk at a time
+            for start in range(0, len(rows), APPLY_CHUNK):
+                with self.lock:
+                    for row in rows[start:start + APPLY_CHUNK]:
+                        self._add(*row)
+            with self.lock:
+                for storage_id in removed:
+                    self._remove(storage_id)
+            if self.dead > 1000 and self.dead * 4 > len(self.items):
+                compacted = self._compacted()
+                with self.lock:
+                    self.items, self.slots, self.postings, self.by_dealer = compacted
+                    self.dead = 0
+
+    def _match(self, token):
+        """{word id: score} of the words token matches, or None when it is too common a prefix"""
+        lo = bisect_left(self.sorted_words, token)
+        hi = bisect_left(self.sorted_words, token + "\uffff", lo)
+        if hi - lo > MAX_PREFIX_WORDS:
+            return None
+        scores = {}
+        for word in self.sorted_words[lo:hi]:
+            scores[self.word_ids[word]] = 1.0 if word == token else _prefix_score(token, word)
+        if token.isalpha() and len(token) >= FUZZY_MIN_LENGTH:
+            trigrams = _trigrams(token)
+            shared = Counter()
+            for trigram in trigrams:
+                shared.update(self.trigrams.get(trigram, ()))
+            for w, count in shared.items():
+                similarity = count / (len(trigrams) + self.trigram_counts[w] - count)
+                if similarity >= MIN_SIMILARITY:
+                    score = FUZZY_WEIGHT * similarity
+                    if score > scores.get(w, 0):
+                        scores[w] = score
+        return scores
+
+    def _score(self, token, scores, word_ids):
+        best = 0.0
+        if scores is not None:
+            for w in word_ids:
+                score = scores.get(w)
+                if score is not None and score > best:
+                    best = score
+            return best
+        for w in word_ids:
+            word = self.words[w]
+            if word.startswith(token):
+                score = 1.0 if word == token else _prefix_score(token, word)
+                if score > best:
+                    best = score
+        return best
+
+    def search(self, query, dealer_id=None, limit=10):
+        """Storage ids best matching query, most similar first, or None until load()"""
+        if not self.ready:
+            return None
+        tokens = list(dict.fromkeys(words(query)))[:MAX_QUERY_WORDS]
+        if not tokens:
+            return []
+        with self.lock:
+            terms = []
+            for token in tokens:
+                scores = self._match(token)
+                if scores == {}:
+                    return []
+                cost = sum(len(self.postings[w]) for w in scores) if scores is not None else None
+                terms.append((token, scores, cost))
+
+            # Narrow to the items in the dealer's list and in every selective
+            # term with set intersections, which run in C
+            candidates = None
+            if dealer_id is not None:
+                candidates = set(self.by_dealer.get(dealer_id, ()))
+            selective = sorted((cost, i) for i, (_, _, cost) in enumerate(terms)
+                               if cost is not None and cost <= SET_LIMIT)
+            for cost, i in selective:
+                scores = terms[i][1]
+                if candidates is not None and len(candidates) * 8 < cost:
+                    # Cheaper to look at the few candidates than to build the set
+                    candidates = {slot for slot in candidates
+                                  if self.items[slot] is not None and not scores.keys().isdisjoint(self.items[slot][2])}
+                else:
+                    members = set()
+                    for w in scores:
+                        members.update(self.postings[w])
+                    candidates = members if candidates is None else candidates & members
+                if not candidates:
+                    return []
+
+            if candidates is not None and len(candidates) <= SCORE_LIMIT:
+                walk = candidates
+                enough = None
+            else:
+                # Too many to score them all: take the most selective term's
+                # best matching words first and stop at CANDIDATES
+                if selective:
+                    driver = terms[selective[0][1]][1]
+                    ordered = sorted(driver, key=driver.get, reverse=True)
+                    walk = (slot for w in ordered for slot in self.postings[w])
+                else:
+                    walk = range(len(self.items))
+                enough = CANDIDATES
+
+            # Terms the candidates were not narrowed by are the likeliest to fail, so go first
+            narrowed = {i for _, i in selective}
+            terms = [term for i, term in enumerate(terms) if i not in narrowed] + \
+                    [term for i, term in enumerate(terms) if i in narrowed]
+            seen = set()
+            found = []
+            for slot in walk:
+                if slot in seen or (candidates is not None and enough and slot not in candidates):
+                    continue
+                seen.add(slot)
+                item = self.items[slot]
+                if item is None:
+                    continue
+                total = 0.0
+                for token, scores, _ in terms:
+                    score = self._score(token, scores, item[2])
+                    if not score:
+                        break
+                    total += score
+                else:
+                    # Ties go to the item with fewer words, the closer match
+                    found.append((-total, len(item[2]), item[0]))
+                    if enough and len(found) >= enough:
+                        break
+        found.sort()
+        return [storage_id for _, _, storage_id in found[:limit]]
+
+
+index = MaterialIndex()
+
+
+def search(query, dealer_id=None, limit=10):
+    """Storage ids for a material picker, best match first; None when the index
+    is off or still loading and the caller should fall back to SQL"""
+    if not ENABLED:
+        return None
+    return index.search(query, dealer_id=dealer_id, limit=limit)
+
+
+def load_ranked(db: Session, storage_ids):
+    """The Storage rows for storage_ids, with their dealers, in that order"""
+    if not storage_ids:
+        return []
+    rows = db.query(models.Storage).options(joinedload(models.Storage.dealer)).filter(
+        models.Storage.id.in_(storage_ids)
+    ).all()
+    by_id = {row.id: row for row in rows}
+    return [by_id[storage_id] for storage_id in storage_ids if storage_id in by_id]
+
+
+def _refresh(storage_ids):
+    storage_ids = sorted(storage_ids)
+    rows = []
+    with SessionLocal() as db:
+        for start in range(0, len(storage_ids), IN_BATCH_SIZE):
+            batch = storage_ids[start:start + IN_BATCH_SIZE]
+            rows.extend(db.execute(_SNAPSHOT.where(_storage.c.id.in_(batch))).all())
+    found = {row[0] for row in rows}
+    index.apply(rows, [storage_id for storage_id in storage_ids if storage_id not in found])
+
+
+def build():
+    try:
+        with SessionLocal() as db:
+            rows = db.execute(_SNAPSHOT).all()
+        pending = index.load(rows)
+        if pending:
+            _refresh(pending)
+        print(f"Material autocomplete index built: {len(rows)} items, {len(index.words)} words")
+    except Exception as e:
+        print(f"Failed to build material autocomplete index: {e}")
+
+
+def start():
+    """Build the index in the background; searches use SQL until it is ready"""
+    if not ENABLED or not outbox.ENABLED:
+        return None
+    # Storage changes committed from here on reach the index through the outbox
+    outbox.start_after(SUBSCRIBER, outbox.latest_id())
+    return asyncio.get_running_loop().create_task(asyncio.to_thread(build))
+
+
+@outbox.subscribe(SUBSCRIBER)
+async def _apply_changes(events):
+    storage_ids = {row_id for e in events if e.resource == "storage" for row_id in e.row_ids}
+    if storage_ids:
+        await asyncio.to_thread(_refresh, storage_ids)
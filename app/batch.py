@@ -0,0 +1,211 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+
+from pydantic import ValidationError
+from sqlalchemy import select, insert, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.allocation import allocate_stock
+from app.pricing import record_prices, record_purchase_order_prices
+
+MAX_OPERATIONS = int(os.getenv("BATCH_MAX_OPERATIONS", "1000"))
+# Stored responses are replayed for retries within this window
+IDEMPOTENCY_TTL = timedelta(hours=float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24")))
+
+OPERATIONS = ("create", "update", "delete")
+
+_keys = models.IdempotencyKey.__table__
+
+
+class OperationError(Exception):
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class Resource:
+    """How the batch API creates, updates and deletes one kind of row.
+
+    after_write(db, obj, previous, data) runs inside the operation's
+    savepoint after the row is flushed, for the side effects the
+    resource's own /api endpoints have (price history, stock allocation).
+    """
+
+    def __init__(self, model, create_schema, update_schema, after_write=None, snapshot=None):
+        self.model = model
+        self.create_schema = create_schema
+        self.update_schema = update_schema
+        self.after_write = after_write
+        self.snapshot = snapshot or (lambda obj: None)
+        self.key = model.__mapper__.primary_key[0]
+        self.columns = [attr.key for attr in model.__mapper__.column_attrs]
+
+    def get(self, db: Session, key):
+        obj = db.get(self.model, key)
+        if obj is None:
+            raise OperationError(404, f"{self.model.__name__} {key} not found")
+        return obj
+
+    def row(self, obj):
+        return {name: getattr(obj, name) for name in self.columns}
+
+
+def _storage_snapshot(storage):
+    return storage.price, storage.tax, storage.current_stock
+
+
+def _storage_written(db, storage, previous, data):
+    price, tax, stock = previous or (None, None, None)
+    if previous is None or (storage.price, storage.tax) != (price, tax):
+        record_prices(db, [(storage.id, storage.dealer_id, storage.price, storage.tax)], "edit")
+    # Stock arrivals may satisfy BOMs that are still waiting on this item
+    if previous is not None and storage.current_stock != stock:
+        allocate_stock(db, [storage.id])
+
+
+def _purchase_order_written(db, order, previous, data):
+    items = data.get("items")
+    if items is None:
+        return
+    db.query(models.PurchaseOrderItem).filter(models.PurchaseOrderItem.po_no == order.po_no).delete()
+    db.add_all(models.PurchaseOrderItem(po_no=order.po_no, **item) for item in items)
+    db.flush()
+    record_purchase_order_prices(db, order.po_no)
+
+
+RESOURCES = {
+    "dealers": Resource(models.Dealer, schemas.DealerCreate, schemas.DealerUpdate),
+    "storage": Resource(models.Storage, schemas.StorageCreate, schemas.StorageUpdate,
+                        after_write=_storage_written, snapshot=_storage_snapshot),
+    "products": Resource(models.Product, schemas.ProductCreate, schemas.ProductUpdate),
+    "consignees": Resource(models.Consignee, schemas.ConsigneeCreate, schemas.ConsigneeUpdate),
+    "company_branches": Resource(models.CompanyBranch, schemas.CompanyBranchCreate, schemas.CompanyBranchUpdate),
+    "purchase_orders": Resource(models.PurchaseOrder, schemas.PurchaseOrderWithItemsCreate,
+                                schemas.PurchaseOrderWithItemsUpdate, after_write=_purchase_order_written),
+}
+
+
+def _validate(schema, data):
+    try:
+        return schema(**(data or {})).dict(exclude_unset=True)
+    except ValidationError as e:
+        raise OperationError(422, e.errors(include_url=False))
+
+
+def _apply(db: Session, operation):
+    resource = RESOURCES.get(operation.resource)
+    if resource is None:
+        raise OperationError(422, f"Unknown resource '{operation.resource}'; "
+                                  f"choose from {', '.join(RESOURCES)}")
+    if operation.op not in OPERATIONS:
+        raise OperationError(422, f"Unknown op '{operation.op}'; choose from {', '.join(OPERATIONS)}")
+    if operation.op != "create" and operation.id is None:
+        raise OperationError(422, f"{operation.op} needs an id")
+
+    if operation.op == "delete":
+        db.delete(resource.get(db, operation.id))
+        db.flush()
+        return 200, operation.id, None
+
+    if operation.op == "create":
+        data = _validate(resource.create_schema, operation.data)
+        obj = resource.model(**{k: v for k, v in data.items() if k != "items"})
+        db.add(obj)
+        previous = None
+        status_code = 201
+    else:
+        data = _validate(resource.update_schema, operation.data)
+        obj = resource.get(db, operation.id)
+        previous = resource.snapshot(obj)
+        for key, value in data.items():
+            if key != "items":
+                setattr(obj, key, value)
+        status_code = 200
+    db.flush()
+    if resource.after_write:
+        resource.after_write(db, obj, previous, data)
+    return status_code, getattr(obj, resource.key.key), resource.row(obj)
+
+
+def _begin(db: Session):
+    """Open the transaction explicitly on SQLite.
+
+    pysqlite only issues BEGIN before DML, so a leading SAVEPOINT would run
+    outside any transaction and its RELEASE would commit on the spot. BEGIN
+    IMMEDIATE also takes the write lock up front, as the batch will write.
+    """
+    connection = db.connection()
+    if connection.dialect.name == "sqlite" and not connection.connection.driver_connection.in_transaction:
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def run_batch(db: Session, operations, atomic=False):
+    """Apply operations in order in the session's transaction, each in its own savepoint.
+
+    A failed operation is rolled back to its savepoint and reported; the
+    others still apply. With atomic=True the first failure rolls back the
+    whole transaction and the remaining operations are not run. The caller
+    commits. Returns (committed, results).
+    """
+    _begin(db)
+    results = []
+    failed = False
+    for index, operation in enumerate(operations):
+        if failed and atomic:
+            results.append({"index": index, "status": 424, "error": "Not run; an earlier operation failed"})
+            continue
+        try:
+            with db.begin_nested():
+                status_code, key, row = _apply(db, operation)
+            results.append({"index": index, "status": status_code, "id": key, "data": row})
+        except OperationError as e:
+            failed = True
+            results.append({"index": index, "status": e.status_code, "error": e.detail})
+        except IntegrityError as e:
+            failed = True
+            results.append({"index": index, "status": 409, "error": str(e.orig)})
+        except ValueError as e:
+            failed = True
+            results.append({"index": index, "status": 422, "error": str(e)})
+    if failed and atomic:
+        db.rollback()
+        for result, operation in zip(results, operations):
+            if result["status"] < 300:
+                result["status"] = 424
+                result["error"] = "Rolled back; another operation failed"
+                result.pop("data", None)
+                if operation.op == "create":
+                    result.pop("id", None)
+        return False, results
+    return True, results
+
+
+def request_hash(batch):
+    """Stable hash of a batch body, to spot an idempotency key reused for a different request"""
+    body = json.dumps(batch.dict(), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def stored_response(db: Session, key):
+    """(request_hash, status_code, response) saved for an idempotency key, or None"""
+    return db.execute(
+        select(_keys.c.request_hash, _keys.c.status_code, _keys.c.response)
+        .where(_keys.c.key == key, _keys.c.created_at >= datetime.now() - IDEMPOTENCY_TTL)
+    ).first()
+
+
+def save_response(db: Session, key, body_hash, status_code, body):
+    """Record the response in the batch's transaction, so it exists exactly when the batch committed.
+
+    Expired keys are purged first, which also frees this key if it was
+    used more than IDEMPOTENCY_TTL ago.
+    """
+    now = datetime.now()
+    db.execute(delete(_keys).where(_keys.c.created_at < now - IDEMPOTENCY_TTL))
+    db.execute(insert(_keys).values(key=key, request_hash=body_hash, status_code=status_code,
+                                    response=body.decode(), created_at=now))
@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select, update, insert, func, or_
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal
+from app.outbox import subscribe
+from app.reorder import CLOSED_PO_STATUSES, DRAFT_STATUS
+
+# Seconds a worker serves its in-memory copy before re-reading dashboard_kpis
+CACHE_SECONDS = float(os.getenv("DASHBOARD_CACHE_SECONDS", "5"))
+# Stored values older than this are recomputed on the next read, which also
+# covers writes that never reach the outbox (raw SQL, a disabled dispatcher)
+MAX_AGE = timedelta(seconds=float(os.getenv("DASHBOARD_MAX_AGE_SECONDS", "900")))
+
+OPEN_PENDING_STATUSES = ("pending", "partially_resolved")
+
+_kpis = models.DashboardKpi.__table__
+_storage = models.Storage.__table__
+_po = models.PurchaseOrder.__table__
+_pending = models.PendingMaterial.__table__
+_inward = models.MaterialInward.__table__
+
+
+def week_start(today=None):
+    today = today or date.today()
+    return today - timedelta(days=today.weekday())
+
+
+def _open_purchase_orders(db: Session):
+    return db.execute(
+        select(func.count()).select_from(_po).where(
+            or_(_po.c.status.is_(None),
+                func.lower(_po.c.status).notin_(CLOSED_PO_STATUSES + (DRAFT_STATUS,)))
+        )
+    ).scalar()
+
+
+def _draft_purchase_orders(db: Session):
+    return db.execute(
+        select(func.count()).select_from(_po).where(func.lower(_po.c.status) == DRAFT_STATUS)
+    ).scalar()
+
+
+def _pending_materials(db: Session):
+    return db.execute(
+        select(func.count()).select_from(_pending).where(_pending.c.status.in_(OPEN_PENDING_STATUSES))
+    ).scalar()
+
+
+def _pending_quantity(db: Session):
+    return db.execute(
+        select(func.coalesce(func.sum(_pending.c.pending_quantity), 0))
+        .where(_pending.c.status.in_(OPEN_PENDING_STATUSES))
+    ).scalar()
+
+
+def _inventory_value(db: Session):
+    return db.execute(
+        select(func.coalesce(func.sum(func.coalesce(_storage.c.current_stock, 0)
+                                      * func.coalesce(_storage.c.price, 0)), 0))
+    ).scalar()
+
+
+def _inwards_this_week(db: Session):
+    return db.execute(
+        select(func.count()).select_from(_inward).where(_inward.c.date_of_inward >= week_start())
+    ).scalar()
+
+
+# name -> (outbox resources whose changes affect it, compute(db))
+KPIS = {
+    "open_purchase_orders": (("purchase_orders",), _open_purchase_orders),
+    "draft_purchase_orders": (("purchase_orders",), _draft_purchase_orders),
+    # Pending materials and their resolutions are synced as part of their inward
+    "pending_materials": (("material_inward",), _pending_materials),
+    "pending_quantity": (("material_inward",), _pending_quantity),
+    "inventory_value": (("storage",), _inventory_value),
+    "inwards_this_week": (("material_inward",), _inwards_this_week),
+}
+
+_lock = threading.Lock()
+_cache = None  # (expires at, kpis)
+
+
+def refresh(db: Session, names=None):
+    """Recompute the named KPIs (all of them by default) into dashboard_kpis.
+
+    Each KPI is one aggregate query. The caller owns the commit.
+    """
+    now = datetime.now()
+    values = {}
+    for name in names or KPIS:
+        value = float(KPIS[name][1](db) or 0)
+        if not db.execute(update(_kpis).where(_kpis.c.name == name).values(value=value, updated_at=now)).rowcount:
+            db.execute(insert(_kpis).values(name=name, value=value, updated_at=now))
+        values[name] = (value, now)
+    return values
+
+
+def invalidate():
+    """Make this worker re-read dashboard_kpis on the next page load"""
+    global _cache
+    with _lock:
+        _cache = None
+
+
+def cached_kpis():
+    """The KPIs held in memory, or None once they have expired"""
+    cached = _cache
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+    return None
+
+
+def get_kpis():
+    """The dashboard KPIs, read from dashboard_kpis and cached for CACHE_SECONDS.
+
+    KPIs that are missing, older than MAX_AGE, or counted in an earlier week
+    are recomputed first; everything else is a read of a few stored rows.
+    """
+    global _cache
+    cached = cached_kpis()
+    if cached is not None:
+        return cached
+    now = datetime.now()
+    this_week = datetime.combine(week_start(), datetime.min.time())
+    with SessionLocal() as db:
+        stored = {name: (value, updated_at) for name, value, updated_at in db.execute(select(_kpis))}
+        stale = [
+            name for name in KPIS
+            if name not in stored
+            or stored[name][1] < now - MAX_AGE
+            or (name == "inwards_this_week" and stored[name][1] < this_week)
+        ]
+        if stale:
+            stored.update(refresh(db, stale))
+            db.commit()
+    kpis = {name: stored[name][0] for name in KPIS}
+    kpis["as_of"] = min(stored[name][1] for name in KPIS)
+    with _lock:
+        _cache = (time.monotonic() + CACHE_SECONDS, kpis)
+    return kpis
+
+
+@subscribe("dashboard", durable=True)
+def _refresh_from_outbox(events):
+    """Recompute just the KPIs the committed changes can have moved"""
+    resources = {e.resource for e in events}
+    names = [name for name, (affects, _) in KPIS.items() if resources.intersection(affects)]
+    if not names:
+        return
+    with SessionLocal() as db:
+        refresh(db, names)
+        db.commit()
+    invalidate()
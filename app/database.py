@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -8,14 +8,38 @@ load_dotenv()
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./inventory.db")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# Seconds a SQLite connection waits for another writer instead of failing with "database is locked"
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))
+
+def create_db_engine(url, journal_mode=None):
+    """Create an engine, tuning SQLite connections for concurrent writers.
+
+    journal_mode (or SQLITE_JOURNAL_MODE, e.g. WAL) is applied on connect; it
+    is left alone by default because it is persisted in the database file.
+    """
+    if not url.startswith("sqlite"):
+        return create_engine(url)
+
+    db_engine = create_engine(
+        url, connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT}
+    )
+    journal_mode = journal_mode or os.getenv("SQLITE_JOURNAL_MODE")
+    if journal_mode:
+        @event.listens_for(db_engine, "connect")
+        def set_journal_mode(dbapi_connection, connection_record):
+            dbapi_connection.execute(f"PRAGMA journal_mode={journal_mode}")
+    return db_engine
+
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
 from app.models import Dealer, Product, Storage, BOM, BOMMaterial, BOMSupplyTransaction, BOMSupplyItem, CompanyBranch, Consignee, PurchaseOrder, PurchaseOrderItem, MaterialInward, MaterialOutward, Section
+# Session events that stamp change_seq on synced rows for the /api/sync feed
+# and record each commit's changes in the outbox
+import app.sync
+import app.outbox
 
 # Dependency to get DB session
 def get_db():
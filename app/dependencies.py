@@ -1,15 +1,17 @@
+from functools import partial
+
 from fastapi import Depends, Request
 from app.database import get_db
-from app.middleware import flash
+from app.middleware import flash, get_flashed_messages
 
 def get_flash(request: Request):
-    """Dependency to get flash messages"""
-    return lambda: flash(request)
+    """Dependency returning flash(message, category="info") bound to the request"""
+    return partial(flash, request)
 
 def get_template_context(request: Request, db=Depends(get_db)):
     """Dependency to provide template context"""
     return {
         "request": request,
         "db": db,
-        "flash": flash(request)
-    }
\ No newline at end of file
+        "flash_messages": get_flashed_messages(request)
+    }
@@ -0,0 +1,28 @@
+import os
+from typing import NamedTuple
+
+from fastapi import Request
+
+# Rows per page of the storage, product and dealer lists
+PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "100"))
+
+
+class Page(NamedTuple):
+    items: list
+    number: int
+    has_previous: bool
+    has_next: bool
+
+
+def page_number(request: Request):
+    """The ?page= of a list request, 1 when missing or invalid"""
+    try:
+        return max(int(request.query_params.get("page", 1)), 1)
+    except ValueError:
+        return 1
+
+
+def paginate(query, page=1, size=PAGE_SIZE):
+    """One page of an ordered query; one extra row is fetched to tell whether another page follows"""
+    rows = query.offset((page - 1) * size).limit(size + 1).all()
+    return Page(rows[:size], page, page > 1, len(rows) > size)
@@ -0,0 +1,164 @@
+import asyncio
+import json
+from collections import deque
+
+from app import models
+from app.api_read import IN_BATCH_SIZE
+from app.database import SessionLocal
+from app.outbox import subscribe
+from app.shared import templates
+
+# Messages a slow client may fall behind by before it is told to reload instead
+MAX_QUEUE = 256
+# Recent messages kept per board, replayed to clients that reconnect
+HISTORY = 1000
+# Seconds between keep-alive comments, so proxies do not close idle streams
+HEARTBEAT = 15
+
+OPEN_PENDING_STATUSES = ("pending", "partially_resolved")
+BOARDS = ("material_inward", "pending_materials")
+
+RELOAD = b"event: reload\ndata: {}\n\n"
+KEEPALIVE = b": keepalive\n\n"
+
+
+def _frame(group, html, event_id=None):
+    """One SSE message replacing the rows of group with html (nothing removes them)"""
+    data = json.dumps({"group": group, "html": html}, separators=(",", ":"))
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: patch\ndata: {data}\n\n".encode()
+
+
+class Broker:
+    """Fans row patches out to the SSE clients of each board in this process.
+
+    A message is rendered and encoded once and the same bytes are put on
+    every client's queue, so a change costs one render however many pages
+    are open. Messages carry the outbox event id they came from; a client
+    that reconnects with Last-Event-ID is replayed what it missed from
+    HISTORY, or told to reload when that is gone.
+    """
+
+    def __init__(self):
+        self.clients = {board: set() for board in BOARDS}
+        self.history = {board: deque() for board in BOARDS}  # (event id, frame)
+        # Highest event id no longer replayable, per board
+        self.evicted = {board: 0 for board in BOARDS}
+        self.position = 0  # last outbox event this process has seen
+
+    def listening(self, board):
+        return bool(self.clients[board])
+
+    def connect(self, board, since):
+        """A queue of frames for a new client, primed with what it missed after event since"""
+        queue = asyncio.Queue(MAX_QUEUE)
+        missed = [frame for event_id, frame in self.history[board] if event_id > since]
+        if since < self.evicted[board] or len(missed) >= MAX_QUEUE:
+            queue.put_nowait(RELOAD)
+        else:
+            for frame in missed:
+                queue.put_nowait(frame)
+        self.clients[board].add(queue)
+        return queue
+
+    def disconnect(self, board, queue):
+        self.clients[board].discard(queue)
+
+    def skip(self, board, event_id):
+        """Nobody was listening for event_id, so it cannot be replayed"""
+        self.evicted[board] = max(self.evicted[board], event_id)
+        self.history[board].clear()
+
+    def publish(self, board, event_id, frames):
+        history = self.history[board]
+        for frame in frames:
+            history.append((event_id, frame))
+        while len(history) > HISTORY:
+            self.evicted[board] = history.popleft()[0]
+        for queue in list(self.clients[board]):
+            for frame in frames:
+                try:
+                    queue.put_nowait(frame)
+                except asyncio.QueueFull:
+                    # Too far behind to patch; start it over
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(RELOAD)
+                    self.clients[board].discard(queue)
+                    break
+
+
+broker = Broker()
+
+
+def _batches(ids):
+    ids = sorted(ids)
+    for start in range(0, len(ids), IN_BATCH_SIZE):
+        yield ids[start:start + IN_BATCH_SIZE]
+
+
+def _render(inward_ids, boards):
+    """Row fragments for the given inwards, as {board: [(group, html), ..]}"""
+    rendered = {board: [] for board in boards}
+    with SessionLocal() as db:
+        if "material_inward" in boards:
+            row = templates.env.get_template("_material_inward_row.html")
+            found = {}
+            for batch in _batches(inward_ids):
+                for inward in db.query(models.MaterialInward).filter(models.MaterialInward.id.in_(batch)):
+                    found[inward.id] = row.render(inward=inward)
+            rendered["material_inward"] = [(f"inward-{i}", found.get(i, "")) for i in sorted(inward_ids)]
+        if "pending_materials" in boards:
+            row = templates.env.get_template("_pending_row.html")
+            grouped = {i: [] for i in inward_ids}
+            for batch in _batches(inward_ids):
+                pending = db.query(models.PendingMaterial).filter(
+                    models.PendingMaterial.original_inward_id.in_(batch),
+                    models.PendingMaterial.status.in_(OPEN_PENDING_STATUSES),
+                ).order_by(models.PendingMaterial.id)
+                for p in pending:
+                    grouped[p.original_inward_id].append(row.render(pending=p))
+            rendered["pending_materials"] = [(f"inward-{i}", "".join(rows)) for i, rows in sorted(grouped.items())]
+    return rendered
+
+
+@subscribe("live_boards")
+async def _push_changes(events):
+    """Patch the open boards with the inwards (and their shortfalls) a batch of events touched"""
+    inward_ids = set()
+    for e in events:
+        if e.resource == "material_inward":
+            inward_ids.update(e.row_ids)
+    event_id = events[-1].id
+    broker.position = event_id
+    if not inward_ids:
+        return
+    boards = [board for board in BOARDS if broker.listening(board)]
+    for board in BOARDS:
+        if board not in boards:
+            broker.skip(board, event_id)
+    if not boards:
+        return
+    rendered = await asyncio.to_thread(_render, inward_ids, boards)
+    for board, rows in rendered.items():
+        # Only the last frame carries the id, so a client that drops mid-batch gets all of it again
+        frames = [_frame(group, html) for group, html in rows[:-1]]
+        frames.append(_frame(*rows[-1], event_id=event_id))
+        broker.publish(board, event_id, frames)
+
+
+async def stream(board, since):
+    """The SSE body for one client of board; StreamingResponse cancels it on disconnect"""
+    queue = broker.connect(board, since)
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            try:
+                frame = await asyncio.wait_for(queue.get(), HEARTBEAT)
+            except asyncio.TimeoutError:
+                frame = KEEPALIVE
+            yield frame
+            if frame is RELOAD:
+                break
+    finally:
+        broker.disconnect(board, queue)
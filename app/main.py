@@ -2,13 +2,18 @@ from fastapi import FastAPI, Request, Depends
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
+import asyncio
 import os
 from datetime import datetime
 import traceback
 
+from app.metrics import MetricsMiddleware, render_metrics, instrument_engine, instrument_templates
+from app import sql_profiler, request_profiler
+from app.middleware import FlashMiddleware, get_flashed_messages
+
 app = FastAPI(
     title="Inventory Management System",
     description="A comprehensive inventory management system built with FastAPI",
@@ -23,6 +28,8 @@ templates = Jinja2Templates(directory="app/templates")
 # Mount static files
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
+app.add_middleware(FlashMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -32,6 +39,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if sql_profiler.ENABLED or sql_profiler.STRICT:
+    app.add_middleware(sql_profiler.SQLProfilerMiddleware)
+
+# Only installed when PROFILER_TOKEN is set, so it costs nothing otherwise
+if request_profiler.enabled():
+    app.add_middleware(request_profiler.RequestProfilerMiddleware)
+
+# Outermost, so latency includes the other middleware
+app.add_middleware(MetricsMiddleware)
+
 # Template filters
 def format_currency(value):
     if value is None:
@@ -54,11 +71,17 @@ def format_date(value, format='%Y-%m-%d'):
 # Add filters to main application templates
 templates.env.filters["currency"] = format_currency
 templates.env.filters["dateformat"] = format_date
+templates.env.globals["get_flashed_messages"] = get_flashed_messages
+
+def _is_api_request(request: Request):
+    # API routes live under each router's prefix, e.g. /storage/api/12
+    path = request.url.path
+    return '/api/' in path or path.endswith('/api')
 
 # Custom exception handlers
 @app.exception_handler(StarletteHTTPException)
 async def http_exception_handler(request: Request, exc: StarletteHTTPException):
-    if request.url.path.startswith('/api/'):
+    if _is_api_request(request):
         return JSONResponse(
             status_code=exc.status_code,
             content={"detail": exc.detail},
@@ -71,7 +94,7 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    if request.url.path.startswith('/api/'):
+    if _is_api_request(request):
         return JSONResponse(
             status_code=422,
             content={"detail": exc.errors(), "body": exc.body},
@@ -92,7 +115,7 @@ async def general_exception_handler(request: Request, exc: Exception):
     # Return a detailed error response
     error_detail = f"Error: {str(exc)}\n\n{traceback.format_exc()}"
     
-    if request.url.path.startswith('/api/'):
+    if _is_api_request(request):
         return JSONResponse(
             status_code=500,
             content={"deatil": "Internal Server Error", "error": str(exc)},
@@ -115,6 +138,8 @@ def template_context(request: Request):
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
     context = template_context(request)
+    # Served from memory; a database read only once the cached copy expires
+    context["kpis"] = dashboard.cached_kpis() or await asyncio.to_thread(dashboard.get_kpis)
     return templates.TemplateResponse("index.html", context)
 
 # Health check endpoint
@@ -134,20 +159,21 @@ async def api_info():
         "description": "A comprehensive inventory management system"
     }
 
+# Dashboard KPIs as JSON
+@app.get("/api/dashboard")
+async def api_dashboard():
+    return dashboard.cached_kpis() or await asyncio.to_thread(dashboard.get_kpis)
+
+# Prometheus text exposition
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/test")
 async def test_endpoint():
     return {"message": "API is working", "status": "success"}
 
 # Import and include routers after all basic routes are defined
-try:
-    from app.routers import frontend
-    app.include_router(frontend.router)
-    print("Frontend router imported successfully")
-except ImportError as e:
-    print(f"Failed to import frontend router: {e}")
-    import traceback
-    traceback.print_exc()
-
 try:
     from app.routers import dealers
     app.include_router(dealers.router, prefix="/dealers")
@@ -176,6 +202,16 @@ except ImportError as e:
     import traceback
     traceback.print_exc()    
 
+# Add BOMs router
+try:
+    from app.routers import boms
+    app.include_router(boms.router, prefix="/boms")
+    print("BOMs router imported successfully")
+except ImportError as e:
+    print(f"Failed to import BOMs router: {e}")
+    import traceback
+    traceback.print_exc()
+
 # Add Purchase Orders router
 try:
     from app.routers import purchase_orders
@@ -216,6 +252,16 @@ except ImportError as e:
     import traceback
     traceback.print_exc()
 
+# Add Material Outward router
+try:
+    from app.routers import material_outward
+    app.include_router(material_outward.router, prefix="/material_outward")
+    print("Material Outward router imported successfully")
+except ImportError as e:
+    print(f"Failed to import material outward router: {e}")
+    import traceback
+    traceback.print_exc()
+
 # Add Material Inward router
 try:
     from app.routers import pending_materials
@@ -226,6 +272,56 @@ except ImportError as e:
     import traceback
     traceback.print_exc()
 
+# Add Profiles router
+try:
+    from app.routers import profiles
+    app.include_router(profiles.router, prefix="/profiles")
+    print("Profiles router imported successfully")
+except ImportError as e:
+    print(f"Failed to import profiles router: {e}")
+    import traceback
+    traceback.print_exc()
+
+# Add Batch API router
+try:
+    from app.routers import batch
+    app.include_router(batch.router, prefix="/api/batch")
+    print("Batch router imported successfully")
+except ImportError as e:
+    print(f"Failed to import batch router: {e}")
+    import traceback
+    traceback.print_exc()
+
+# Add Sync (change feed) router
+try:
+    from app.routers import sync
+    app.include_router(sync.router, prefix="/api/sync")
+    print("Sync router imported successfully")
+except ImportError as e:
+    print(f"Failed to import sync router: {e}")
+    import traceback
+    traceback.print_exc()
+
+# Add Reorder router
+try:
+    from app.routers import reorder
+    app.include_router(reorder.router, prefix="/reorder")
+    print("Reorder router imported successfully")
+except ImportError as e:
+    print(f"Failed to import reorder router: {e}")
+    import traceback
+    traceback.print_exc()
+
+# Add Live board router
+try:
+    from app.routers import live
+    app.include_router(live.router, prefix="/live")
+    print("Live router imported successfully")
+except ImportError as e:
+    print(f"Failed to import live router: {e}")
+    import traceback
+    traceback.print_exc()
+
 # Add this after the other router imports
 try:
     from app.routers import test
@@ -244,7 +340,48 @@ try:
     # Create all tables
     models.Base.metadata.create_all(bind=engine)
     print("Database tables created successfully")
+
+    from app import shared, pdf_utils
+    instrument_engine(engine)
+    if sql_profiler.ENABLED or sql_profiler.STRICT:
+        sql_profiler.instrument(engine)
+    instrument_templates(templates, shared.templates, pdf_utils.pdf_templates)
 except ImportError as e:
     print(f"Failed to import database modules: {e}")
 except Exception as e:
     print(f"Failed to create database tables: {e}")
+
+# Deliver committed outbox events to subscribers (caches, webhooks)
+from app import outbox
+# Dashboard KPIs, refreshed by an outbox subscriber
+from app import dashboard
+# In-memory ranked search for the material pickers, kept current from the outbox
+from app import autocomplete
+
+@app.on_event("startup")
+async def build_autocomplete_index():
+    # Before the dispatcher starts, so the index's subscriber begins at the snapshot
+    app.state.autocomplete_task = autocomplete.start()
+
+@app.on_event("startup")
+async def start_outbox_dispatcher():
+    if outbox.ENABLED:
+        outbox.dispatcher.start()
+
+@app.on_event("shutdown")
+async def stop_outbox_dispatcher():
+    await outbox.dispatcher.stop()
+
+# Scheduled reorder runs, when REORDER_INTERVAL_HOURS is set
+from app import reorder as reorder_engine
+
+@app.on_event("startup")
+async def start_reorder_schedule():
+    if reorder_engine.INTERVAL_HOURS > 0:
+        app.state.reorder_task = asyncio.create_task(reorder_engine.run_on_schedule())
+
+@app.on_event("shutdown")
+async def stop_reorder_schedule():
+    task = getattr(app.state, "reorder_task", None)
+    if task is not None:
+        task.cancel()
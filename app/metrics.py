@@ -0,0 +1,271 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+
+from jinja2 import Template
+from sqlalchemy import event
+
+# Upper bounds in seconds; the last bucket is +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+UNMATCHED_ROUTE = "<unmatched>"
+BACKGROUND_ROUTE = "<background>"
+
+
+class Histogram:
+    """Cumulative histogram keyed by a single label value"""
+
+    def __init__(self, name, help_text, label, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}  # label value -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def _get_series(self, value):
+        series = self._series.get(value)
+        if series is None:
+            series = self._series.setdefault(value, [0] * (len(self.buckets) + 1) + [0.0])
+        return series
+
+    def observe(self, value, amount):
+        index = bisect_left(self.buckets, amount)
+        with self._lock:
+            series = self._get_series(value)
+            series[index] += 1
+            series[-1] += amount
+
+    def merge(self, value, counts, total):
+        """Add pre-bucketed observations (see RequestStats)"""
+        with self._lock:
+            series = self._get_series(value)
+            for i, count in enumerate(counts):
+                if count:
+                    series[i] += count
+            series[-1] += total
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(value, list(series)) for value, series in sorted(self._series.items())]
+        for value, series in snapshot:
+            label = f'{self.label}="{_escape(value)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {series[-1]}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, help_text, getter=None):
+        self.name = name
+        self.help_text = help_text
+        self.value = 0
+        self.getter = getter
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def render(self):
+        value = self.getter() if self.getter else self.value
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_SECONDS = Histogram(
+    "app_request_duration_seconds", "Request latency by route template", "route", LATENCY_BUCKETS)
+IN_FLIGHT = Gauge("app_requests_in_flight", "Requests currently being handled")
+QUERY_SECONDS = Histogram(
+    "app_db_query_duration_seconds", "SQL statement execution time by route", "route", QUERY_BUCKETS)
+QUERIES_PER_REQUEST = Histogram(
+    "app_db_queries_per_request", "SQL statements executed per request by route", "route", COUNT_BUCKETS)
+POOL_CHECKOUT_SECONDS = Histogram(
+    "app_db_pool_checkout_seconds", "Time spent waiting for a pooled connection", "pool", QUERY_BUCKETS)
+PDF_RENDER_SECONDS = Histogram(
+    "app_pdf_render_seconds", "Time spent in generate_pdf", "function", LATENCY_BUCKETS)
+TEMPLATE_RENDER_SECONDS = Histogram(
+    "app_template_render_seconds", "Jinja2 template render time", "template", LATENCY_BUCKETS)
+
+REGISTRY = [
+    REQUEST_SECONDS,
+    IN_FLIGHT,
+    QUERY_SECONDS,
+    QUERIES_PER_REQUEST,
+    POOL_CHECKOUT_SECONDS,
+    PDF_RENDER_SECONDS,
+    TEMPLATE_RENDER_SECONDS,
+]
+
+
+class RequestStats:
+    """Per-request query tally, merged into the route histograms once at the end"""
+
+    __slots__ = ("query_count", "query_time", "query_buckets")
+
+    def __init__(self):
+        self.query_count = 0
+        self.query_time = 0.0
+        self.query_buckets = [0] * (len(QUERY_BUCKETS) + 1)
+
+    def add_query(self, elapsed):
+        self.query_count += 1
+        self.query_time += elapsed
+        self.query_buckets[bisect_left(QUERY_BUCKETS, elapsed)] += 1
+
+
+# Sync endpoints run in a threadpool with a copy of the request's context,
+# so the stats object is shared with them
+_request_stats: ContextVar = ContextVar("request_stats", default=None)
+
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def route_label(scope):
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", UNMATCHED_ROUTE)
+    # Mounted apps such as /static set root_path to the mount point
+    return scope.get("root_path") or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """Record latency, in-flight requests and SQL usage per route template.
+
+    Pure ASGI so it adds no task or body copying per request; the route
+    template is read from the scope after routing has filled it in.
+    """
+
+    def __init__(self, app, exclude_paths=("/metrics",)):
+        self.app = app
+        self.exclude_paths = set(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            elapsed = time.perf_counter() - start
+            IN_FLIGHT.dec()
+            _request_stats.reset(token)
+            route = route_label(scope)
+            REQUEST_SECONDS.observe(route, elapsed)
+            QUERIES_PER_REQUEST.observe(route, stats.query_count)
+            if stats.query_count:
+                QUERY_SECONDS.merge(route, stats.query_buckets, stats.query_time)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("metrics_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.add_query(elapsed)
+    else:
+        QUERY_SECONDS.observe(BACKGROUND_ROUTE, elapsed)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    conn = exception_context.connection
+    if conn is not None:
+        starts = conn.info.get("metrics_query_start")
+        if starts:
+            starts.pop()
+
+
+def instrument_engine(engine):
+    """Time every statement and every pool checkout of an engine"""
+    if engine.pool.__dict__.get("_metrics_instrumented"):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+    # The pool has no "before checkout" event, so time the call that waits
+    # for (or opens) a connection
+    pool = engine.pool
+    connect = pool.connect
+    pool_name = type(pool).__name__
+
+    @wraps(connect)
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            POOL_CHECKOUT_SECONDS.observe(pool_name, time.perf_counter() - start)
+
+    pool.connect = timed_connect
+    pool._metrics_instrumented = True
+
+    if hasattr(pool, "checkedout"):
+        REGISTRY.append(Gauge(
+            "app_db_pool_checked_out", "Connections currently checked out of the pool", pool.checkedout))
+
+
+def timed(histogram, label=None):
+    """Decorator observing a function's run time into histogram"""
+    def decorator(func):
+        value = label or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(value, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class TimedTemplate(Template):
+    def render(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            TEMPLATE_RENDER_SECONDS.observe(self.name or "<string>", time.perf_counter() - start)
+
+
+def instrument_templates(*template_objects):
+    """Time renders of every template loaded through the given Jinja2Templates"""
+    for templates in template_objects:
+        env = templates.env
+        if env.template_class is not TimedTemplate:
+            env.template_class = TimedTemplate
+            # Templates compiled before this point would keep the old class
+            if env.cache is not None:
+                env.cache.clear()
@@ -1,28 +1,126 @@
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
+import base64
+import hashlib
+import hmac
 import json
+import os
+import secrets
+from http.cookies import SimpleCookie
+
+from fastapi import Request
+
+FLASH_COOKIE = "flash"
+# Browsers drop cookies over 4 KB; the oldest messages go first
+MAX_COOKIE_SIZE = 3800
+
+SECRET_KEY = os.getenv("SECRET_KEY")
+if not SECRET_KEY:
+    print("SECRET_KEY is not set; flash messages will not survive a restart or cross workers")
+    SECRET_KEY = secrets.token_hex(32)
+_KEY = SECRET_KEY.encode()
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def _b64decode(data):
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+def _sign(payload):
+    return _b64encode(hmac.new(_KEY, payload, hashlib.sha256).digest())
+
+
+def encode_messages(messages):
+    """Signed cookie value for a list of (category, message) pairs"""
+    payload = _b64encode(json.dumps(messages, separators=(",", ":")).encode())
+    return payload + b"." + _sign(payload)
+
+
+def decode_messages(value):
+    """Messages from a signed cookie value, or [] if it is missing, tampered with or malformed"""
+    payload, _, signature = value.partition(b".")
+    if not signature or not hmac.compare_digest(signature, _sign(payload)):
+        return []
+    try:
+        messages = json.loads(_b64decode(payload))
+    except ValueError:
+        return []
+    return [(str(category), str(message)) for category, message in messages]
+
+
+def _read_cookie(headers):
+    for key, value in headers:
+        if key == b"cookie" and FLASH_COOKIE.encode() + b"=" in value:
+            cookie = SimpleCookie()
+            cookie.load(value.decode("latin-1"))
+            if FLASH_COOKIE in cookie:
+                return cookie[FLASH_COOKIE].value.encode("latin-1")
+    return None
+
+
+def _cookie_header(value, max_age=None):
+    header = f"{FLASH_COOKIE}={value}; Path=/; HttpOnly; SameSite=Lax"
+    if max_age is not None:
+        header += f"; Max-Age={max_age}"
+    return (b"set-cookie", header.encode("latin-1"))
+
+
+class FlashMiddleware:
+    """Carry flash messages across a redirect in an HMAC-signed cookie.
+
+    Pure ASGI: requests without a flash cookie that do not flash anything
+    pass through untouched. Messages read with get_flashed_messages() are
+    dropped; unread ones (e.g. on a redirect) stay for the next request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        raw = _read_cookie(scope.get("headers", ()))
+        state = scope.setdefault("state", {})
+        state["flash_messages"] = decode_messages(raw) if raw else []
+        # An invalid cookie counts as read so it gets cleared
+        state["flash_consumed"] = raw is not None and not state["flash_messages"]
+        state["flash_outgoing"] = []
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                header = None
+                if state["flash_outgoing"]:
+                    pending = ([] if state["flash_consumed"] else state["flash_messages"]) + state["flash_outgoing"]
+                    value = encode_messages(pending)
+                    while len(value) > MAX_COOKIE_SIZE and len(pending) > 1:
+                        pending = pending[1:]
+                        value = encode_messages(pending)
+                    header = _cookie_header(value.decode("latin-1"))
+                elif state["flash_consumed"]:
+                    header = _cookie_header("", max_age=0)
+                if header is not None:
+                    message["headers"] = list(message.get("headers", [])) + [header]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
 
-class FlashMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Get flash messages from session
-        flash_messages = request.session.get('flash_messages', [])
-        
-        # Clear flash messages after reading
-        if 'flash_messages' in request.session:
-            del request.session['flash_messages']
-        
-        # Add flash messages to request state
-        request.state.flash_messages = flash_messages
-        
-        response = await call_next(request)
-        return response
 
 def flash(request: Request, message: str, category: str = "info"):
-    """Add a flash message to the session"""
-    if not hasattr(request.state, 'session'):
+    """Queue a message for the next page the user sees"""
+    outgoing = getattr(request.state, "flash_outgoing", None)
+    if outgoing is None:
+        # FlashMiddleware is not installed
         return
-    
-    flash_messages = request.state.session.get('flash_messages', [])
-    flash_messages.append((category, message))
-    request.state.session['flash_messages'] = flash_messages
\ No newline at end of file
+    outgoing.append((category, message))
+
+
+def get_flashed_messages(request: Request):
+    """(category, message) pairs for this request; reading them clears them"""
+    state = request.state
+    messages = getattr(state, "flash_messages", [])
+    if messages:
+        state.flash_consumed = True
+    return messages
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Text, Boolean, Date, DateTime, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, Float, Text, Boolean, Date, DateTime, ForeignKey, Table, Index
 from sqlalchemy.orm import relationship, backref
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime, date
@@ -23,6 +23,8 @@ class Dealer(Base):
     bank_name = Column(String(100))
     account_no = Column(String(100))
     ifsc_code = Column(String(50))
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    change_seq = Column(Integer, index=True, server_default='0')  # see app.sync
     
     materials = relationship('Storage', back_populates='dealer', lazy='dynamic')
 
@@ -64,12 +66,38 @@ class Storage(Base):
     units = Column(String(32))
     created_at = Column(DateTime, default=datetime.now)  # Make sure this exists
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)  # And this
+    change_seq = Column(Integer, index=True, server_default='0')  # see app.sync
     
     dealer = relationship('Dealer', back_populates='materials')
     product_materials = relationship('ProductMaterial', back_populates='storage')
     bom_materials = relationship('BOMMaterial', back_populates='storage')
     supply_items = relationship('BOMSupplyItem', back_populates='storage')
     po_items = relationship('PurchaseOrderItem', back_populates='material')
+    price_history = relationship('PriceHistory', back_populates='storage')
+
+    # Price lists and imports upsert on the dealer's item name
+    __table_args__ = (
+        Index('uq_storage_dealer_spec', 'dealer_id', 'defined_name_with_spec', unique=True),
+    )
+
+class PriceHistory(Base):
+    __tablename__ = 'price_history'
+    
+    id = Column(Integer, primary_key=True)
+    storage_id = Column(Integer, ForeignKey('storage.id'))
+    dealer_id = Column(Integer, ForeignKey('dealer.id'))
+    price = Column(Float)
+    tax = Column(Float)
+    source = Column(String(32))  # price_list, revision, edit, import, purchase_order
+    po_no = Column(Integer, ForeignKey('purchase_order.po_no'), index=True)  # set for purchase_order rows
+    recorded_at = Column(DateTime, default=datetime.now)
+    
+    storage = relationship('Storage', back_populates='price_history')
+
+    # Serves "last N prices" and windowed averages per material and dealer
+    __table_args__ = (
+        Index('ix_price_history_lookup', 'storage_id', 'dealer_id', 'recorded_at'),
+    )
 
 class BOM(Base):
     __tablename__ = 'bom'
@@ -79,10 +107,15 @@ class BOM(Base):
     product_quantity = Column(Integer)
     consignee = Column(String(128))
     date = Column(Date, default=date.today)
-    status = Column(String(20), default='pending')
+    status = Column(String(20), default='pending', index=True)  # pending, in_progress, completed, cancelled
     completion_date = Column(Date, nullable=True)
     notes = Column(Text)
     bom_identifier = Column(String(50), unique=True, nullable=False)
+    priority = Column(Integer, default=2)  # higher value is allocated stock first
+    due_date = Column(Date, nullable=True)
+    # Running totals over materials, kept current by the supply path (see app.allocation)
+    required_total = Column(Float, default=0)
+    provided_total = Column(Float, default=0)
     
     product = relationship('Product', back_populates='boms')
     materials = relationship('BOMMaterial', back_populates='bom', cascade='all, delete-orphan')
@@ -95,30 +128,28 @@ class BOM(Base):
     
     @property
     def total_required_materials(self):
-        return sum(m.quantity_required for m in self.materials)
+        return self.required_total or 0
     
     @property
     def total_provided_materials(self):
-        provided = 0
-        for transaction in self.supply_transactions:
-            for item in transaction.supply_items:
-                provided += item.quantity_provided
-        return provided
+        return self.provided_total or 0
     
     @property
     def progress_percentage(self):
-        if self.total_required_materials == 0:
+        required = self.total_required_materials
+        if required == 0:
             return 0
-        return (self.total_provided_materials / self.total_required_materials) * 100
+        return (self.total_provided_materials / required) * 100
 
 class BOMMaterial(Base):
     __tablename__ = 'bom_material'
     
     id = Column(Integer, primary_key=True)
-    bom_id = Column(Integer, ForeignKey('bom.id'))
-    storage_id = Column(Integer, ForeignKey('storage.id'))
+    bom_id = Column(Integer, ForeignKey('bom.id'), index=True)
+    storage_id = Column(Integer, ForeignKey('storage.id'), index=True)
     quantity_required = Column(Float)
     quantity_provided = Column(Float, default=0)
+    quantity_reserved = Column(Float, default=0)  # stock held back for this BOM by the allocator
     is_fully_provided = Column(Boolean, default=False)
     
     bom = relationship('BOM', back_populates='materials')
@@ -196,6 +227,8 @@ class PurchaseOrder(Base):
     discount = Column(Float, default=0.0)
     invoice_branch_id = Column(Integer, ForeignKey('company_branches.id'))
     consignee_id = Column(Integer, ForeignKey('consignees.id'))
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    change_seq = Column(Integer, index=True, server_default='0')  # see app.sync
     
     dealer = relationship('Dealer', backref='purchase_orders')
     invoice_branch = relationship('CompanyBranch', foreign_keys=[invoice_branch_id])
@@ -237,7 +270,7 @@ class PurchaseOrderItem(Base):
     
     id = Column(Integer, primary_key=True)
     po_no = Column(Integer, ForeignKey('purchase_order.po_no'))
-    material_id = Column(Integer, ForeignKey('storage.id'))
+    material_id = Column(Integer, ForeignKey('storage.id'), index=True)
     material_name = Column(String(256))
     spec = Column(String(256))
     brand = Column(String(128))
@@ -264,6 +297,8 @@ class MaterialInward(Base):
     payment_method = Column(String(64))
     status = Column(String(20), default='partial')  # partial, completed
     is_pending_inward = Column(Boolean, default=False)  # Flag for pending material inwards
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    change_seq = Column(Integer, index=True, server_default='0')  # see app.sync
     
     # Relationships
     items = relationship('MaterialInwardItem', back_populates='material_inward')
@@ -276,7 +311,7 @@ class MaterialInwardItem(Base):
     
     id = Column(Integer, primary_key=True)
     material_inward_id = Column(Integer, ForeignKey('material_inward.id'))
-    po_item_id = Column(Integer, ForeignKey('purchase_order_item.id'))
+    po_item_id = Column(Integer, ForeignKey('purchase_order_item.id'), index=True)
     material_name = Column(String(256))
     spec = Column(String(256))
     brand = Column(String(128))
@@ -339,11 +374,14 @@ class MaterialOutward(Base):
     __tablename__ = 'material_outward'
     
     id = Column(Integer, primary_key=True)
-    material_details = Column(String(256))
+    storage_id = Column(Integer, ForeignKey('storage.id'), index=True)
+    material_details = Column(String(256))  # snapshot of the storage name at issue time
     receiver_section = Column(String(128))
-    qty = Column(Integer)
+    qty = Column(Float)
     date = Column(Date, default=date.today)
     reason = Column(String(256))
+    
+    storage = relationship('Storage')
 
 class Section(Base):
     __tablename__ = 'section'
@@ -352,4 +390,59 @@ class Section(Base):
     section_name = Column(String(128))
     products_they_create = Column(Text)
     inventory_details = Column(Text)
-    product_development_status = Column(String(256))
\ No newline at end of file
+    product_development_status = Column(String(256))
+class IdempotencyKey(Base):
+    __tablename__ = 'idempotency_keys'
+    
+    key = Column(String(128), primary_key=True)
+    request_hash = Column(String(64), nullable=False)  # sha256 of the request body
+    status_code = Column(Integer, nullable=False)
+    response = Column(Text, nullable=False)  # stored JSON body, replayed on retries
+    created_at = Column(DateTime, default=datetime.now, index=True)
+
+class ChangeCounter(Base):
+    __tablename__ = 'change_counter'
+    
+    id = Column(Integer, primary_key=True)  # a single row, id 1
+    value = Column(Integer, nullable=False, default=0)
+
+class SyncTombstone(Base):
+    __tablename__ = 'sync_tombstones'
+    
+    id = Column(Integer, primary_key=True)
+    resource = Column(String(32), nullable=False)  # storage, dealers, purchase_orders, material_inward
+    row_id = Column(Integer, nullable=False)
+    change_seq = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        Index('ix_sync_tombstones_feed', 'resource', 'change_seq', 'row_id'),
+    )
+
+class OutboxEvent(Base):
+    __tablename__ = 'outbox_events'
+    
+    id = Column(Integer, primary_key=True)
+    resource = Column(String(32), nullable=False)  # as in app.sync.RESOURCES
+    action = Column(String(16), nullable=False)  # changed, deleted
+    change_seq = Column(Integer, nullable=False)
+    row_ids = Column(Text, nullable=False)  # JSON list
+    created_at = Column(DateTime, default=datetime.now, index=True)
+
+class OutboxCursor(Base):
+    __tablename__ = 'outbox_cursors'
+    
+    subscriber = Column(String(200), primary_key=True)
+    position = Column(Integer, nullable=False, default=0)  # id of the last event delivered
+    leased_until = Column(DateTime)  # a worker is delivering until then
+    lease_owner = Column(String(64))
+    attempts = Column(Integer, nullable=False, default=0)  # failures since the last delivery
+    last_error = Column(Text)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+class DashboardKpi(Base):
+    __tablename__ = 'dashboard_kpis'
+    
+    name = Column(String(64), primary_key=True)  # see app.dashboard.KPIS
+    value = Column(Float)
+    updated_at = Column(DateTime, default=datetime.now)
@@ -0,0 +1,377 @@
+import asyncio
+import inspect
+import json
+import os
+import socket
+import urllib.request
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import NamedTuple
+
+from sqlalchemy import select, insert, update, delete, func, literal, union_all, bindparam, event, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal
+from app.sync import RESOURCES
+
+ENABLED = os.getenv("OUTBOX_DISPATCHER", "1") != "0"
+BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+# Seconds between polls for events committed by other worker processes;
+# commits in this process wake the dispatcher straight away
+POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+# Delivered events are kept this long, then purged
+RETENTION = timedelta(days=float(os.getenv("OUTBOX_RETENTION_DAYS", "7")))
+LEASE = timedelta(seconds=float(os.getenv("OUTBOX_LEASE_SECONDS", "60")))
+MAX_BACKOFF = 60
+# Comma-separated URLs, e.g. http://127.0.0.1:9100/hooks/inventory, that
+# get every batch of events POSTed as {"events": [...]}
+WEBHOOKS = [url.strip() for url in os.getenv("OUTBOX_WEBHOOKS", "").split(",") if url.strip()]
+WEBHOOK_TIMEOUT = float(os.getenv("OUTBOX_WEBHOOK_TIMEOUT", "10"))
+MAX_IDS_PER_EVENT = 1000
+
+_events = models.OutboxEvent.__table__
+_cursors = models.OutboxCursor.__table__
+_tombstones = models.SyncTombstone.__table__
+
+
+class Event(NamedTuple):
+    id: int
+    resource: str  # as in app.sync.RESOURCES
+    action: str  # changed or deleted
+    change_seq: int
+    row_ids: list
+    created_at: datetime
+
+    def as_dict(self):
+        return {**self._asdict(), "created_at": self.created_at.isoformat() if self.created_at else None}
+
+
+def _changed_rows():
+    parts = []
+    for name, (model, _) in RESOURCES.items():
+        table = model.__table__
+        key = list(table.primary_key.columns)[0]
+        parts.append(select(literal(name), literal("changed"), key).where(table.c.change_seq == bindparam("seq")))
+        parts.append(
+            select(literal(name), literal("deleted"), _tombstones.c.row_id)
+            .where(_tombstones.c.resource == name, _tombstones.c.change_seq == bindparam("seq"))
+        )
+    return union_all(*parts)
+
+
+# Every synced row a transaction wrote carries its change_seq, so one
+# indexed lookup finds them whether they were written by the ORM or Core
+_CHANGED_ROWS = _changed_rows()
+
+
+@event.listens_for(Session, "before_commit")
+def _write_events(session):
+    """Record the transaction's changes in outbox_events as part of the same commit"""
+    if session.in_nested_transaction():
+        return
+    # Pending ORM changes are stamped on this flush
+    session.flush()
+    seq = session.info.get("change_seq")
+    if seq is None:
+        return
+    grouped = {}
+    for resource, action, row_id in session.execute(_CHANGED_ROWS, {"seq": seq}):
+        grouped.setdefault((resource, action), []).append(row_id)
+    now = datetime.now()
+    rows = []
+    for (resource, action), row_ids in grouped.items():
+        row_ids = iter(sorted(set(row_ids)))
+        while chunk := list(islice(row_ids, MAX_IDS_PER_EVENT)):
+            rows.append({"resource": resource, "action": action, "change_seq": seq,
+                         "row_ids": json.dumps(chunk), "created_at": now})
+    if rows:
+        session.execute(insert(_events), rows)
+        session.info["outbox_written"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_dispatcher(session):
+    if session.info.pop("outbox_written", None):
+        dispatcher.notify()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop("outbox_written", None)
+
+
+class Subscriber:
+    def __init__(self, name, handler, durable):
+        self.name = name
+        self.handler = handler
+        self.durable = durable
+        self.position = None  # last event delivered, for in-process subscribers
+        self.attempts = 0
+        self.retry_at = 0.0
+
+
+_subscribers = {}
+
+
+def subscribe(name, durable=False):
+    """Register handler(events) for every batch of committed outbox events.
+
+    Delivery is at least once and in event order: a batch is retried with
+    backoff until the handler returns, so handlers must be idempotent.
+    Plain functions run in a worker thread and may use their own session.
+
+    In-process subscribers (caches, in-memory indexes) get the events
+    committed by any worker from the moment this process started. A durable
+    subscriber keeps its position in outbox_cursors and is delivered by one
+    worker at a time, so nothing is missed across restarts.
+    """
+    def register(handler):
+        _subscribers[name] = Subscriber(name, handler, durable)
+        return handler
+    return register
+
+
+def latest_id():
+    """The id of the newest committed event, 0 if there are none"""
+    with SessionLocal() as db:
+        return db.execute(select(func.max(_events.c.id))).scalar() or 0
+
+
+def start_after(name, position):
+    """Deliver in-process subscriber name every event after position.
+
+    For subscribers that load a snapshot at startup: read latest_id()
+    before the snapshot and pass it here, and nothing committed while the
+    snapshot loads is missed.
+    """
+    subscriber = _subscribers[name]
+    if subscriber.position is None or position < subscriber.position:
+        subscriber.position = position
+
+
+def _state():
+    """The newest event id and the durable cursors' positions"""
+    with SessionLocal() as db:
+        latest = db.execute(select(func.max(_events.c.id))).scalar() or 0
+        positions = dict(db.execute(select(_cursors.c.subscriber, _cursors.c.position)).all())
+    return latest, positions
+
+
+def _read(after, limit):
+    with SessionLocal() as db:
+        rows = db.execute(
+            select(_events.c.id, _events.c.resource, _events.c.action, _events.c.change_seq,
+                   _events.c.row_ids, _events.c.created_at)
+            .where(_events.c.id > after).order_by(_events.c.id).limit(limit)
+        ).all()
+    return [Event(row[0], row[1], row[2], row[3], json.loads(row[4]), row[5]) for row in rows]
+
+
+def _create_cursor(name, position):
+    """A new durable subscriber starts after the events already committed"""
+    with SessionLocal() as db:
+        try:
+            db.execute(insert(_cursors).values(subscriber=name, position=position, attempts=0,
+                                               updated_at=datetime.now()))
+            db.commit()
+        except IntegrityError:
+            # Another worker created it first
+            db.rollback()
+
+
+def _claim(name, owner):
+    """Lease the subscriber's cursor and return its position, or None if another worker holds it"""
+    now = datetime.now()
+    with SessionLocal() as db:
+        claimed = db.execute(
+            update(_cursors)
+            .where(_cursors.c.subscriber == name,
+                   or_(_cursors.c.leased_until.is_(None), _cursors.c.leased_until < now,
+                       _cursors.c.lease_owner == owner))
+            .values(leased_until=now + LEASE, lease_owner=owner)
+        ).rowcount
+        position = None
+        if claimed:
+            position = db.execute(select(_cursors.c.position).where(_cursors.c.subscriber == name)).scalar()
+        db.commit()
+    return position
+
+
+def _release(name, owner, position=None, error=None):
+    """Give up the lease, moving the cursor to position or recording a failure"""
+    values = {"leased_until": None, "lease_owner": None, "updated_at": datetime.now()}
+    if error is None:
+        values.update(position=position, attempts=0, last_error=None)
+    else:
+        values.update(attempts=_cursors.c.attempts + 1, last_error=error)
+    with SessionLocal() as db:
+        db.execute(update(_cursors).where(_cursors.c.subscriber == name, _cursors.c.lease_owner == owner)
+                   .values(**values))
+        db.commit()
+
+
+def _advance(name, owner, position):
+    """Move a leased cursor forward and renew the lease"""
+    with SessionLocal() as db:
+        db.execute(update(_cursors).where(_cursors.c.subscriber == name, _cursors.c.lease_owner == owner)
+                   .values(position=position, leased_until=datetime.now() + LEASE, updated_at=datetime.now()))
+        db.commit()
+
+
+def purge(db: Session, now=None):
+    """Delete events older than RETENTION that every durable subscriber has received.
+
+    Cursors untouched for longer than RETENTION belong to subscribers that
+    are no longer configured and do not hold events back.
+    """
+    now = now or datetime.now()
+    criteria = [_events.c.created_at < now - RETENTION]
+    oldest = db.execute(
+        select(func.min(_cursors.c.position)).where(_cursors.c.updated_at >= now - RETENTION)
+    ).scalar()
+    if oldest is not None:
+        criteria.append(_events.c.id <= oldest)
+    return db.execute(delete(_events).where(*criteria)).rowcount or 0
+
+
+def _purge():
+    with SessionLocal() as db:
+        purged = purge(db)
+        db.commit()
+    return purged
+
+
+class Dispatcher:
+    """Background task on the app's event loop that delivers outbox events.
+
+    Each subscriber has its own position, so a failing webhook is retried
+    without holding back cache invalidation. The database work runs in
+    worker threads; the loop itself only waits.
+    """
+    PURGE_EVERY = 3600  # seconds
+
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.loop = None
+        self.wake = None
+        self.task = None
+        self.next_purge = 0.0
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.wake = asyncio.Event()
+        self.task = self.loop.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.task = None
+        self.loop = None
+
+    def notify(self):
+        """Wake the dispatcher; safe to call from any thread"""
+        loop = self.loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self.wake.set)
+        except RuntimeError:
+            # The loop has closed
+            pass
+
+    async def _run(self):
+        latest = await asyncio.to_thread(latest_id)
+        for subscriber in _subscribers.values():
+            if not subscriber.durable and subscriber.position is None:
+                subscriber.position = latest
+        while True:
+            self.wake.clear()
+            try:
+                await self.dispatch()
+                if self.loop.time() >= self.next_purge:
+                    self.next_purge = self.loop.time() + self.PURGE_EVERY
+                    await asyncio.to_thread(_purge)
+            except Exception as e:
+                print(f"Outbox dispatch failed: {e}")
+            try:
+                await asyncio.wait_for(self.wake.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def dispatch(self):
+        """Deliver everything committed so far to every subscriber that is not backing off"""
+        latest, positions = await asyncio.to_thread(_state)
+        for subscriber in list(_subscribers.values()):
+            if subscriber.retry_at > asyncio.get_running_loop().time():
+                continue
+            if subscriber.durable:
+                position = positions.get(subscriber.name)
+                if position is None:
+                    await asyncio.to_thread(_create_cursor, subscriber.name, latest)
+                    continue
+            else:
+                if subscriber.position is None:
+                    subscriber.position = latest
+                position = subscriber.position
+            if position < latest:
+                await self._deliver(subscriber)
+
+    async def _deliver(self, subscriber):
+        if subscriber.durable:
+            position = await asyncio.to_thread(_claim, subscriber.name, self.owner)
+            if position is None:
+                return
+        else:
+            position = subscriber.position
+        try:
+            while True:
+                events = await asyncio.to_thread(_read, position, BATCH_SIZE)
+                if not events:
+                    break
+                if inspect.iscoroutinefunction(subscriber.handler):
+                    await subscriber.handler(events)
+                else:
+                    await asyncio.to_thread(subscriber.handler, events)
+                position = events[-1].id
+                if subscriber.durable:
+                    await asyncio.to_thread(_advance, subscriber.name, self.owner, position)
+                else:
+                    subscriber.position = position
+                subscriber.attempts = 0
+                if len(events) < BATCH_SIZE:
+                    break
+        except Exception as e:
+            subscriber.attempts += 1
+            delay = min(2 ** subscriber.attempts, MAX_BACKOFF)
+            subscriber.retry_at = asyncio.get_running_loop().time() + delay
+            print(f"Outbox subscriber {subscriber.name} failed (attempt {subscriber.attempts}, "
+                  f"retrying in {delay}s): {e}")
+            if subscriber.durable:
+                await asyncio.to_thread(_release, subscriber.name, self.owner, error=str(e))
+            return
+        if subscriber.durable:
+            await asyncio.to_thread(_release, subscriber.name, self.owner, position)
+
+
+dispatcher = Dispatcher()
+
+
+def _webhook(url):
+    def post(events):
+        body = json.dumps({"events": [e.as_dict() for e in events]}).encode()
+        request = urllib.request.Request(url, data=body, method="POST",
+                                         headers={"Content-Type": "application/json"})
+        # Non-2xx responses raise, so the batch is retried
+        with urllib.request.urlopen(request, timeout=WEBHOOK_TIMEOUT) as response:
+            response.read()
+    return post
+
+
+for _url in WEBHOOKS:
+    subscribe(f"webhook:{_url}", durable=True)(_webhook(_url))
@@ -4,6 +4,8 @@ from fastapi.responses import Response
 from fastapi.templating import Jinja2Templates
 from datetime import datetime
 
+from app.metrics import timed, PDF_RENDER_SECONDS
+
 # Create a dedicated templates instance for PDF generation
 pdf_templates = Jinja2Templates(directory="app/templates")
 
@@ -53,6 +55,7 @@ pdf_templates.env.filters["dateformat"] = format_date
 pdf_templates.env.filters["default"] = default_filter
 pdf_templates.env.filters["truncate"] = truncate_text
 
+@timed(PDF_RENDER_SECONDS)
 def generate_pdf(html_content: str):
     """Generate PDF from HTML content with improved settings"""
     try:
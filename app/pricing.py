@@ -0,0 +1,338 @@
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from sqlalchemy import select, update, insert, delete, bindparam, func, literal, and_, or_
+from sqlalchemy.orm import Session
+
+from app import models
+from app.sync import change_seq
+
+BATCH_SIZE = 5000
+
+MAX_REPORTED_ERRORS = 1000
+
+_storage = models.Storage.__table__
+_history = models.PriceHistory.__table__
+
+
+def _dialect_insert(db: Session):
+    """INSERT construct with ON CONFLICT support for the bound database"""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(_storage)
+
+
+def record_history(db: Session, source, changed_at, seq, *criteria):
+    """Copy the current price of the storage rows this transaction wrote into price_history.
+
+    The rows are picked by the change_seq the transaction stamped on them
+    (see app.sync.change_seq), which no other transaction shares, rather
+    than by their updated_at, which other writes can share and some
+    databases round.
+    """
+    result = db.execute(
+        insert(_history).from_select(
+            ["storage_id", "dealer_id", "price", "tax", "source", "recorded_at"],
+            select(
+                _storage.c.id,
+                _storage.c.dealer_id,
+                _storage.c.price,
+                _storage.c.tax,
+                literal(source),
+                literal(changed_at),
+            ).where(_storage.c.change_seq == seq, *criteria),
+        )
+    )
+    return result.rowcount or 0
+
+
+def _number(value, name):
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name}: '{value}' is not a number")
+
+
+def upsert_price_list(db: Session, rows, dealer_id, batch_size=BATCH_SIZE):
+    """Apply a dealer price list to Storage.price and Storage.tax.
+
+    rows is an iterator whose first item is the normalised header (see
+    app.storage_import.iter_rows). Rows with a defined_name_with_spec are
+    upserted with INSERT .. ON CONFLICT on the dealer's item name; rows with
+    only an hsn_code reprice every item of that HSN code for the dealer.
+    Only rows whose price or tax actually changes are touched, and those are
+    copied into price_history with one INSERT .. SELECT per batch. Each batch
+    is committed on its own. Returns a report dict.
+    """
+    rows = iter(rows)
+    header = next(rows, None)
+    report = {"total": 0, "changed": 0, "failed": 0, "errors": []}
+    if header is None:
+        return report
+    if "price" not in header or not ({"defined_name_with_spec", "hsn_code"} & set(header)):
+        raise ValueError("A price list needs a price column and a defined_name_with_spec or hsn_code column")
+
+    def column(name):
+        return header.index(name) if name in header else None
+
+    spec_col, hsn_col, price_col = column("defined_name_with_spec"), column("hsn_code"), column("price")
+    tax_col, name_col, brand_col, units_col = column("tax"), column("base_name"), column("brand"), column("units")
+
+    def cell(values, index):
+        if index is None or index >= len(values):
+            return None
+        value = values[index]
+        if isinstance(value, str):
+            value = value.strip()
+        return None if value == "" else value
+
+    def error(line_no, message):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": line_no, "errors": [message]})
+
+    stmt = _dialect_insert(db)
+    upsert = stmt.on_conflict_do_update(
+        index_elements=["dealer_id", "defined_name_with_spec"],
+        set_={
+            "price": stmt.excluded.price,
+            "tax": func.coalesce(stmt.excluded.tax, _storage.c.tax),
+            "updated_at": stmt.excluded.updated_at,
+            "change_seq": stmt.excluded.change_seq,
+        },
+        # Unchanged rows keep their timestamp and stay out of the history
+        where=or_(
+            _storage.c.price.is_distinct_from(stmt.excluded.price),
+            and_(stmt.excluded.tax.isnot(None), _storage.c.tax.is_distinct_from(stmt.excluded.tax)),
+        ),
+    )
+    reprice_hsn = update(_storage).where(
+        _storage.c.dealer_id == bindparam("b_dealer_id"),
+        _storage.c.hsn_code == bindparam("b_hsn_code"),
+        or_(
+            _storage.c.price.is_distinct_from(bindparam("b_price")),
+            and_(bindparam("b_tax").isnot(None), _storage.c.tax.is_distinct_from(bindparam("b_tax"))),
+        ),
+    ).values(
+        price=bindparam("b_price"),
+        tax=func.coalesce(bindparam("b_tax"), _storage.c.tax),
+        updated_at=bindparam("b_now"),
+        change_seq=bindparam("b_seq"),
+    )
+
+    line_no = 1
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+
+        now = datetime.now()
+        by_spec = {}
+        by_hsn = {}
+        for values in batch:
+            line_no += 1
+            spec, hsn_code = cell(values, spec_col), cell(values, hsn_col)
+            if spec is None and hsn_code is None and cell(values, price_col) is None:
+                continue
+            report["total"] += 1
+            try:
+                price = _number(cell(values, price_col), "price")
+                tax = _number(cell(values, tax_col), "tax")
+            except ValueError as e:
+                error(line_no, str(e))
+                continue
+            if price is None or price < 0:
+                error(line_no, "price must be zero or more")
+                continue
+
+            if spec is not None:
+                spec = str(spec)
+                by_spec[spec] = {
+                    "base_name": str(cell(values, name_col) or spec),
+                    "defined_name_with_spec": spec,
+                    "brand": cell(values, brand_col),
+                    "units": cell(values, units_col),
+                    "dealer_id": dealer_id,
+                    "price": price,
+                    "tax": tax,
+                    "current_stock": 0,
+                    "created_at": now,
+                    "updated_at": now,
+                    "change_seq": None,
+                }
+            elif hsn_code is not None:
+                by_hsn[str(hsn_code)] = {
+                    "b_dealer_id": dealer_id,
+                    "b_hsn_code": str(hsn_code),
+                    "b_price": price,
+                    "b_tax": tax,
+                    "b_now": now,
+                    "b_seq": None,
+                }
+            else:
+                error(line_no, "Row has neither defined_name_with_spec nor hsn_code")
+
+        try:
+            if by_spec or by_hsn:
+                seq = change_seq(db)
+                for row in by_spec.values():
+                    row["change_seq"] = seq
+                for row in by_hsn.values():
+                    row["b_seq"] = seq
+                if by_spec:
+                    db.execute(upsert, list(by_spec.values()))
+                if by_hsn:
+                    db.execute(reprice_hsn, list(by_hsn.values()))
+                report["changed"] += record_history(db, "price_list", now, seq, _storage.c.dealer_id == dealer_id)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Error applying price list batch ending at row {line_no}: {e}")
+            report["failed"] += len(by_spec) + len(by_hsn)
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                report["errors"].append({"row": line_no, "errors": [f"Batch ending at this row was not saved: {e}"]})
+
+    return report
+
+
+def revise_prices(db: Session, percent=None, amount=None, dealer_id=None, brand=None, hsn_code=None):
+    """Raise or lower prices by a percentage or a fixed amount in one UPDATE.
+
+    Filters combine, e.g. percent=4, dealer_id=3, brand="Tata" is "+4% on
+    Tata items from dealer 3". Prices never go below zero. The revised rows
+    are copied into price_history; the caller owns the commit. Returns the
+    number of items revised.
+    """
+    if (percent is None) == (amount is None):
+        raise ValueError("Give either a percentage or an amount")
+
+    criteria = [_storage.c.price.isnot(None)]
+    if dealer_id is not None:
+        criteria.append(_storage.c.dealer_id == dealer_id)
+    if brand:
+        criteria.append(_storage.c.brand == brand)
+    if hsn_code:
+        criteria.append(_storage.c.hsn_code == hsn_code)
+
+    if percent is not None:
+        new_price = func.round(_storage.c.price * (1 + percent / 100.0), 2)
+    else:
+        new_price = _storage.c.price + amount
+    # max() with several arguments is the scalar max in SQLite
+    new_price = func.max(new_price, 0) if db.get_bind().dialect.name == "sqlite" else func.greatest(new_price, 0)
+
+    now = datetime.now()
+    seq = change_seq(db)
+    revised = db.execute(
+        update(_storage).where(*criteria).values(price=new_price, updated_at=now, change_seq=seq)
+    ).rowcount or 0
+    if revised:
+        record_history(db, "revision", now, seq, *criteria)
+    return revised
+
+
+def record_prices(db: Session, entries, source, recorded_at=None):
+    """Add price_history rows for (storage_id, dealer_id, price, tax) entries"""
+    recorded_at = recorded_at or datetime.now()
+    rows = [
+        {"storage_id": s_id, "dealer_id": d_id, "price": price, "tax": tax, "source": source, "recorded_at": recorded_at}
+        for s_id, d_id, price, tax in entries
+        if s_id is not None and price is not None
+    ]
+    if rows:
+        db.execute(insert(_history), rows)
+
+
+def record_purchase_order_prices(db: Session, po_no):
+    """Replace the price_history rows of a purchase order with its current lines.
+
+    Lines are dated with the PO date so history stays in the order prices
+    were agreed, not the order POs happened to be edited in.
+    """
+    item = models.PurchaseOrderItem.__table__
+    order = models.PurchaseOrder.__table__
+    db.execute(delete(_history).where(_history.c.po_no == po_no))
+    rows = db.execute(
+        select(item.c.material_id, item.c.price, order.c.dealer_id, order.c.date)
+        .join(order, order.c.po_no == item.c.po_no)
+        .where(item.c.po_no == po_no, item.c.material_id.isnot(None), item.c.price.isnot(None))
+    ).all()
+    if rows:
+        db.execute(insert(_history), [
+            {
+                "storage_id": material_id,
+                "dealer_id": dealer_id,
+                "price": price,
+                "source": "purchase_order",
+                "po_no": po_no,
+                "recorded_at": datetime.combine(po_date, time.min) if po_date else datetime.now(),
+            }
+            for material_id, price, dealer_id, po_date in rows
+        ])
+
+
+def _price_lookups(by_dealer):
+    """Prebuilt (last prices, window stats) statements; building and cache-keying
+    a statement per call costs more than the index lookups themselves"""
+    criteria = [_history.c.storage_id == bindparam("storage_id")]
+    if by_dealer:
+        criteria.append(_history.c.dealer_id == bindparam("dealer_id"))
+    last = (
+        select(
+            _history.c.price,
+            _history.c.tax,
+            _history.c.dealer_id,
+            _history.c.source,
+            _history.c.po_no,
+            _history.c.recorded_at,
+        )
+        .where(*criteria)
+        .order_by(_history.c.recorded_at.desc(), _history.c.id.desc())
+        .limit(bindparam("limit"))
+    )
+    window = select(
+        func.avg(_history.c.price),
+        func.count(),
+        func.min(_history.c.price),
+        func.max(_history.c.price),
+    ).where(*criteria, _history.c.recorded_at >= bindparam("since", type_=_history.c.recorded_at.type))
+    return last, window
+
+
+_PRICE_LOOKUPS = {True: _price_lookups(True), False: _price_lookups(False)}
+
+
+def price_summary(db: Session, storage_id, dealer_id=None, limit=5, days=365):
+    """Last `limit` prices of a material and its average over the last `days`.
+
+    Both queries walk the (storage_id, dealer_id, recorded_at) index from
+    the newest entry, so the cost does not grow with the length of the
+    history when a dealer is given.
+    """
+    last_query, window_query = _PRICE_LOOKUPS[dealer_id is not None]
+    params = {
+        "storage_id": storage_id,
+        "dealer_id": dealer_id,
+        "limit": limit,
+        "since": datetime.now() - timedelta(days=days),
+    }
+    # Straight on the connection: the ORM session's execute path costs more
+    # than the lookups
+    conn = db.connection()
+    last = conn.execute(last_query, params).mappings().all()
+    average, count, lowest, highest = conn.execute(window_query, params).one()
+
+    return {
+        "storage_id": storage_id,
+        "dealer_id": dealer_id,
+        "last": [dict(row) for row in last],
+        "window_days": days,
+        "average": average,
+        "count": count,
+        "min": lowest,
+        "max": highest,
+    }
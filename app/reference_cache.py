@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from itertools import chain
+from types import SimpleNamespace
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.outbox import subscribe
+
+UNITS_LIST = ["Nos", "Kgs", "mm", "cm", "liters", "meters", "pieces", "packs"]
+
+# Optional file whose mtime announces invalidations to other worker processes
+SYNC_FILE = os.getenv("REFERENCE_CACHE_SYNC_FILE")
+
+_CACHED_MODELS = {
+    models.Dealer: "dealers",
+    models.CompanyBranch: "company_branches",
+    models.Consignee: "consignees",
+}
+
+_lock = threading.Lock()
+_versions = {key: 0 for key in _CACHED_MODELS.values()}
+_cache = {}  # key -> (version, rows)
+# mtime of SYNC_FILE at the last check; 0 means no file yet, so the file
+# appearing counts as an invalidation like any later change
+_sync_seen = 0
+
+
+def _snapshot_query(model):
+    mapper = inspect(model)
+    columns = [attr.columns[0].label(attr.key) for attr in mapper.column_attrs]
+    return select(*columns).order_by(*mapper.primary_key)
+
+
+_QUERIES = {key: _snapshot_query(model) for model, key in _CACHED_MODELS.items()}
+
+
+def _check_sync_file():
+    """Drop everything if another process has invalidated since we last looked"""
+    global _sync_seen
+    try:
+        mtime = os.stat(SYNC_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return
+    if mtime != _sync_seen:
+        _sync_seen = mtime
+        with _lock:
+            for key in _versions:
+                _versions[key] += 1
+
+
+def _get(key, db: Session):
+    if SYNC_FILE:
+        _check_sync_file()
+    version = _versions[key]
+    cached = _cache.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    # Rows are plain attribute snapshots so they can be shared across
+    # requests without touching any session
+    rows = tuple(SimpleNamespace(**row) for row in db.execute(_QUERIES[key]).mappings())
+    with _lock:
+        # A write that landed while we were loading bumped the version, so
+        # this snapshot is stored as already stale and reloaded next time
+        _cache[key] = (version, rows)
+    return rows
+
+
+def get_dealers(db: Session):
+    return _get("dealers", db)
+
+
+def get_company_branches(db: Session):
+    return _get("company_branches", db)
+
+
+def get_consignees(db: Session):
+    return _get("consignees", db)
+
+
+def invalidate(*keys):
+    """Mark cached reference data stale here and, if configured, in other workers.
+
+    ORM writes are picked up automatically on commit; call this after
+    writing dealers, branches or consignees with Core statements or raw SQL.
+    """
+    global _sync_seen
+    keys = keys or tuple(_versions)
+    with _lock:
+        for key in keys:
+            _versions[key] += 1
+    if SYNC_FILE:
+        with open(SYNC_FILE, "w") as f:
+            f.write(str(time.time_ns()))
+        _sync_seen = os.stat(SYNC_FILE).st_mtime_ns
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed(session, flush_context):
+    touched = {
+        _CACHED_MODELS[type(obj)]
+        for obj in chain(session.new, session.dirty, session.deleted)
+        if type(obj) in _CACHED_MODELS
+    }
+    if touched:
+        session.info.setdefault("reference_cache_touched", set()).update(touched)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        mapper = orm_execute_state.bind_mapper
+        key = _CACHED_MODELS.get(mapper.class_) if mapper is not None else None
+        if key:
+            orm_execute_state.session.info.setdefault("reference_cache_touched", set()).add(key)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    touched = session.info.pop("reference_cache_touched", None)
+    if touched:
+        invalidate(*touched)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop("reference_cache_touched", None)
+
+
+@subscribe("reference_cache")
+def _invalidate_from_outbox(events):
+    """Dealer changes committed by any worker, so the cache does not need SYNC_FILE for them"""
+    if any(e.resource == "dealers" for e in events):
+        with _lock:
+            _versions["dealers"] += 1
@@ -0,0 +1,285 @@
+import asyncio
+import math
+import os
+from datetime import date, datetime, timedelta
+from typing import NamedTuple
+
+from sqlalchemy import select, insert, func, case, union_all, or_
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal
+from app.allocation import OPEN_BOM_STATUSES
+from app.sync import change_seq
+
+# Days of outward and BOM supply history the consumption rate is taken over
+WINDOW_DAYS = int(os.getenv("REORDER_WINDOW_DAYS", "90"))
+# Lead time for dealers without inward history, and how far back to measure it
+DEFAULT_LEAD_DAYS = float(os.getenv("REORDER_DEFAULT_LEAD_DAYS", "7"))
+LEAD_HISTORY_DAYS = int(os.getenv("REORDER_LEAD_HISTORY_DAYS", "365"))
+# Extra days of consumption held as safety stock, and ordered on top of the reorder point
+SAFETY_DAYS = float(os.getenv("REORDER_SAFETY_DAYS", "7"))
+COVER_DAYS = float(os.getenv("REORDER_COVER_DAYS", "30"))
+# Hours between scheduled runs; unset runs only on demand
+INTERVAL_HOURS = float(os.getenv("REORDER_INTERVAL_HOURS", "0"))
+
+DRAFT_STATUS = "draft"
+# Purchase orders in these states (in any case) no longer count as stock on order
+CLOSED_PO_STATUSES = ("received", "completed", "cancelled")
+
+_storage = models.Storage.__table__
+_dealer = models.Dealer.__table__
+_outward = models.MaterialOutward.__table__
+_supply = models.BOMSupplyTransaction.__table__
+_supply_item = models.BOMSupplyItem.__table__
+_bom = models.BOM.__table__
+_bom_material = models.BOMMaterial.__table__
+_po = models.PurchaseOrder.__table__
+_po_item = models.PurchaseOrderItem.__table__
+_inward = models.MaterialInward.__table__
+_inward_item = models.MaterialInwardItem.__table__
+
+
+class Suggestion(NamedTuple):
+    storage_id: int
+    dealer_id: int
+    dealer_name: str
+    material_name: str
+    spec: str
+    brand: str
+    unit: str
+    price: float
+    current_stock: float
+    on_order: float
+    committed: float  # still owed to open BOMs
+    daily_usage: float
+    lead_days: float
+    reorder_point: float
+    quantity: int
+
+
+def _positive(value):
+    return case((value > 0, value), else_=0)
+
+
+def _days_between(db: Session, start, end):
+    if db.get_bind().dialect.name == "sqlite":
+        return func.julianday(end) - func.julianday(start)
+    # date - date is a number of days in PostgreSQL
+    return end - start
+
+
+def _consumption(today):
+    """Storage id -> quantity issued over the window, by outward and by BOM supply"""
+    since = today - timedelta(days=WINDOW_DAYS)
+    issued = union_all(
+        select(_outward.c.storage_id, _outward.c.qty.label("qty")).where(_outward.c.date >= since),
+        select(_supply_item.c.storage_id, _supply_item.c.quantity_provided)
+        .join(_supply, _supply.c.id == _supply_item.c.transaction_id)
+        .where(_supply.c.supply_date >= since),
+    ).subquery()
+    return (
+        select(issued.c.storage_id, func.sum(issued.c.qty).label("used"))
+        .group_by(issued.c.storage_id)
+        .subquery("consumption")
+    )
+
+
+def _on_order(storage_ids):
+    """Storage id -> quantity ordered on open purchase orders and not yet received"""
+    received = (
+        select(func.sum(_inward_item.c.quantity_received))
+        .where(_inward_item.c.po_item_id == _po_item.c.id)
+        .scalar_subquery()
+    )
+    outstanding = _positive(func.coalesce(_po_item.c.quantity, 0) - func.coalesce(received, 0))
+    return (
+        select(_po_item.c.material_id.label("storage_id"), func.sum(outstanding).label("on_order"))
+        .join(_po, _po.c.po_no == _po_item.c.po_no)
+        .where(_po_item.c.material_id.in_(storage_ids),
+               or_(_po.c.status.is_(None), func.lower(_po.c.status).notin_(CLOSED_PO_STATUSES)))
+        .group_by(_po_item.c.material_id)
+        .subquery("on_order")
+    )
+
+
+def _committed():
+    """Storage id -> quantity open BOMs still need (reserved stock included)"""
+    owed = _positive(func.coalesce(_bom_material.c.quantity_required, 0)
+                     - func.coalesce(_bom_material.c.quantity_provided, 0))
+    return (
+        select(_bom_material.c.storage_id, func.sum(owed).label("committed"))
+        .join(_bom, _bom.c.id == _bom_material.c.bom_id)
+        .where(_bom.c.status.in_(OPEN_BOM_STATUSES))
+        .group_by(_bom_material.c.storage_id)
+        .subquery("committed")
+    )
+
+
+def _lead_times(db: Session, today):
+    """Dealer id -> average days from PO date to its first inward"""
+    first_inward = (
+        select(_inward.c.po_no, func.min(_inward.c.date_of_inward).label("received"))
+        .group_by(_inward.c.po_no)
+        .subquery()
+    )
+    return (
+        select(_po.c.dealer_id, func.avg(_days_between(db, _po.c.date, first_inward.c.received)).label("lead_days"))
+        .join(first_inward, first_inward.c.po_no == _po.c.po_no)
+        .where(_po.c.date >= today - timedelta(days=LEAD_HISTORY_DAYS))
+        .group_by(_po.c.dealer_id)
+        .subquery("lead_times")
+    )
+
+
+def reorder_suggestions(db: Session, dealer_id=None, today=None):
+    """Storage items whose stock position has fallen below their reorder point.
+
+    The position is stock on hand plus stock on order minus what open BOMs
+    still need. The reorder point is the daily usage over WINDOW_DAYS times
+    the dealer's lead time plus SAFETY_DAYS, and the suggested quantity
+    tops the position up to COVER_DAYS beyond that.
+
+    It is one SELECT. Stock on order can only raise the position, so items
+    are first narrowed to those below their reorder point without it, and
+    open purchase order lines are only summed for those few.
+    """
+    today = today or date.today()
+    consumption = _consumption(today)
+    committed = _committed()
+    lead_times = _lead_times(db, today)
+
+    daily_usage = func.coalesce(consumption.c.used, 0) / float(WINDOW_DAYS)
+    lead_days = func.coalesce(lead_times.c.lead_days, DEFAULT_LEAD_DAYS)
+    stock = func.coalesce(_storage.c.current_stock, 0)
+    committed_qty = func.coalesce(committed.c.committed, 0)
+    reorder_point = daily_usage * (lead_days + SAFETY_DAYS)
+    candidates = (
+        select(
+            _storage.c.id.label("storage_id"),
+            stock.label("stock"),
+            committed_qty.label("committed"),
+            daily_usage.label("daily_usage"),
+            lead_days.label("lead_days"),
+            reorder_point.label("reorder_point"),
+        )
+        .select_from(_storage)
+        .outerjoin(consumption, consumption.c.storage_id == _storage.c.id)
+        .outerjoin(committed, committed.c.storage_id == _storage.c.id)
+        .outerjoin(lead_times, lead_times.c.dealer_id == _storage.c.dealer_id)
+        .where(stock - committed_qty < reorder_point)
+    )
+    if dealer_id is not None:
+        candidates = candidates.where(_storage.c.dealer_id == dealer_id)
+    candidates = candidates.cte("candidates")
+
+    on_order = _on_order(select(candidates.c.storage_id))
+    on_order_qty = func.coalesce(on_order.c.on_order, 0)
+    position = candidates.c.stock + on_order_qty - candidates.c.committed
+    stmt = (
+        select(
+            _storage.c.id, _storage.c.dealer_id, _dealer.c.name, _storage.c.base_name,
+            _storage.c.defined_name_with_spec, _storage.c.brand, _storage.c.units, _storage.c.price,
+            candidates.c.stock, on_order_qty, candidates.c.committed,
+            candidates.c.daily_usage, candidates.c.lead_days, candidates.c.reorder_point, position,
+        )
+        .select_from(candidates)
+        .join(_storage, _storage.c.id == candidates.c.storage_id)
+        .outerjoin(_dealer, _dealer.c.id == _storage.c.dealer_id)
+        .outerjoin(on_order, on_order.c.storage_id == candidates.c.storage_id)
+        .where(position < candidates.c.reorder_point)
+        .order_by(_storage.c.dealer_id, _storage.c.id)
+    )
+
+    suggestions = []
+    for row in db.execute(stmt):
+        (storage_id, row_dealer_id, dealer_name, name, spec, brand, unit, price,
+         stock, ordered, owed, usage, lead, point, current) = row
+        target = usage * (lead + SAFETY_DAYS + COVER_DAYS)
+        quantity = math.ceil(target - current)
+        if quantity <= 0:
+            continue
+        suggestions.append(Suggestion(
+            storage_id, row_dealer_id, dealer_name, name, spec, brand, unit, price,
+            stock, ordered, owed, round(usage, 4), round(lead, 1), round(point, 2), quantity,
+        ))
+    return suggestions
+
+
+def create_draft_orders(db: Session, dealer_id=None, today=None):
+    """Draft one purchase order per dealer for every item below its reorder point.
+
+    The change sequence is taken first, which takes the write lock, so two
+    runs cannot both see the same shortfall: drafts count as stock on
+    order, and a second run finds nothing left to order. Items without a
+    dealer are reported, not ordered. The caller owns the commit. Returns
+    a report dict.
+    """
+    today = today or date.today()
+    seq = change_seq(db)
+    suggestions = reorder_suggestions(db, dealer_id=dealer_id, today=today)
+    by_dealer = {}
+    unassigned = []
+    for suggestion in suggestions:
+        if suggestion.dealer_id is None:
+            unassigned.append(suggestion.storage_id)
+        else:
+            by_dealer.setdefault(suggestion.dealer_id, []).append(suggestion)
+    report = {"orders": [], "items": 0, "unassigned": unassigned}
+    if not by_dealer:
+        return report
+
+    now = datetime.now()
+    orders = db.execute(
+        insert(_po).returning(_po.c.po_no, _po.c.dealer_id),
+        [
+            {
+                "dealer_id": d_id,
+                "date": today,
+                "status": DRAFT_STATUS,
+                "notes": f"Drafted by the reorder run on {today.isoformat()}",
+                "discount": 0.0,
+                "updated_at": now,
+                "change_seq": seq,
+            }
+            for d_id in by_dealer
+        ],
+    ).all()
+    items = [
+        {
+            "po_no": po_no,
+            "material_id": s.storage_id,
+            "material_name": s.material_name,
+            "spec": s.spec,
+            "brand": s.brand,
+            "dealer_name": s.dealer_name,
+            "quantity": s.quantity,
+            "price": s.price or 0,
+            "unit": s.unit,
+        }
+        for po_no, d_id in orders
+        for s in by_dealer[d_id]
+    ]
+    db.execute(insert(_po_item), items)
+    report["orders"] = [po_no for po_no, _ in orders]
+    report["items"] = len(items)
+    return report
+
+
+def run_once():
+    """Draft purchase orders for everything below its reorder point and commit"""
+    with SessionLocal() as db:
+        report = create_draft_orders(db)
+        db.commit()
+    print(f"Reorder run drafted {len(report['orders'])} purchase order(s) with {report['items']} item(s)")
+    return report
+
+
+async def run_on_schedule():
+    """Background task for REORDER_INTERVAL_HOURS; every worker may run it, see create_draft_orders"""
+    while True:
+        await asyncio.sleep(INTERVAL_HOURS * 3600)
+        try:
+            await asyncio.to_thread(run_once)
+        except Exception as e:
+            print(f"Scheduled reorder run failed: {e}")
@@ -0,0 +1,267 @@
+import hmac
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from urllib.parse import parse_qs
+
+import anyio.to_thread
+
+# Profiling is only possible when a token is configured; without one the
+# middleware is not installed at all
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+SAMPLE_INTERVAL = float(os.getenv("PROFILER_INTERVAL_MS", "5")) / 1000
+PROFILE_HEADER = "x-profile"
+PROFILE_PARAM = "__profile"
+
+_FILE_NAME = re.compile(r"^[\w.-]+\.speedscope\.json$")
+# Leaf frames of threads that are waiting for work rather than doing it
+_IDLE_FRAMES = {("threading.py", "wait"), ("queue.py", "get"), ("selectors.py", "select")}
+# The profiler of the request a task is working for
+_profiling: ContextVar = ContextVar("request_profiler", default=None)
+
+
+def enabled():
+    return bool(PROFILER_TOKEN)
+
+
+def check_token(token):
+    # Bytes, since compare_digest rejects str with non-ASCII characters
+    return bool(PROFILER_TOKEN) and token is not None and hmac.compare_digest(token.encode(), PROFILER_TOKEN.encode())
+
+
+class SamplingProfiler:
+    """Sample the stacks of one request's threads on a background thread.
+
+    The event loop thread is sampled while the request's coroutines are on
+    its stack (the anchor frame, the middleware's, is below them), and
+    threadpool workers while their thread id is in workers, which
+    _track_workers keeps for calls made for the request, so concurrent
+    requests stay out of the profile. Samples
+    are kept as tuples of frame indices (root first) in the shape
+    speedscope's "sampled" profile wants, one profile per thread.
+    """
+
+    def __init__(self, loop_thread_id, anchor, interval=SAMPLE_INTERVAL):
+        self.loop_thread_id = loop_thread_id
+        self.anchor = anchor
+        self.interval = interval
+        self.workers = set()  # ids of threads running a threadpool call for the request
+        self.frames = []
+        self._frame_index = {}
+        self.samples = {}  # thread name -> (stacks, weights)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self.started = self.stopped = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.stopped = time.perf_counter()
+
+    def _targets(self):
+        """{thread id: (name, is a worker)} of the threads running the request"""
+        workers = tuple(self.workers)
+        targets = {}
+        for thread in threading.enumerate():
+            if thread.ident == self.loop_thread_id:
+                targets[thread.ident] = (thread.name, False)
+            elif thread.ident in workers:
+                targets[thread.ident] = (f"{thread.name} {thread.ident}", True)
+        return targets
+
+    def _frame_id(self, code):
+        key = (code.co_filename, code.co_name, code.co_firstlineno)
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self.frames)
+            self.frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+        return index
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight = (now - last) * 1000
+            last = now
+            targets = self._targets()
+            frames = sys._current_frames()
+            for ident, (name, worker) in targets.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame)
+                    frame = frame.f_back
+                if not worker and self.anchor not in stack:
+                    continue
+                stack = [self._frame_id(frame.f_code) for frame in reversed(stack)]
+                stacks, weights = self.samples.setdefault(name, ([], []))
+                stacks.append(stack)
+                weights.append(weight)
+
+    def speedscope(self, name):
+        end = ((self.stopped or time.perf_counter()) - self.started) * 1000
+        profiles = [
+            {
+                "type": "sampled",
+                "name": thread_name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": end,
+                "samples": stacks,
+                "weights": weights,
+            }
+            for thread_name, (stacks, weights) in sorted(self.samples.items(), key=lambda item: -len(item[1][0]))
+        ]
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "inventory request profiler",
+            "activeProfileIndex": 0,
+            "shared": {"frames": self.frames},
+            "profiles": profiles,
+        }
+
+
+def _slug(text):
+    return re.sub(r"[^\w-]+", "_", text).strip("_")[:80] or "root"
+
+
+def save_profile(profiler, method, path, status_code):
+    """Write a profile to PROFILE_DIR and return its file name"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    file_name = f"{stamp}-{method}-{_slug(path)}.speedscope.json"
+    data = profiler.speedscope(f"{method} {path} ({status_code})")
+    data["request"] = {
+        "method": method,
+        "path": path,
+        "status_code": status_code,
+        "duration_ms": round((profiler.stopped - profiler.started) * 1000, 2),
+        "samples": sum(len(stacks) for stacks, _ in profiler.samples.values()),
+        "captured_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    with open(os.path.join(PROFILE_DIR, file_name), "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    return file_name
+
+
+def list_profiles():
+    """Summaries of the captured profiles, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for file_name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not _FILE_NAME.match(file_name):
+            continue
+        full = os.path.join(PROFILE_DIR, file_name)
+        try:
+            with open(full) as f:
+                info = json.load(f).get("request", {})
+        except (OSError, ValueError):
+            info = {}
+        profiles.append({"file_name": file_name, "size": os.path.getsize(full), **info})
+    return profiles
+
+
+def profile_path(file_name):
+    """Full path of a captured profile, or None for unknown or unsafe names"""
+    if not _FILE_NAME.match(file_name or ""):
+        return None
+    full = os.path.join(PROFILE_DIR, file_name)
+    return full if os.path.isfile(full) else None
+
+
+def _requested_token(scope):
+    for key, value in scope.get("headers", ()):
+        if key == PROFILE_HEADER.encode():
+            return value.decode("latin-1")
+    query = scope.get("query_string", b"")
+    if PROFILE_PARAM.encode() in query:
+        values = parse_qs(query.decode("latin-1")).get(PROFILE_PARAM)
+        return values[0] if values else None
+    return None
+
+
+def _track_workers(run_sync):
+    """Wrap anyio.to_thread.run_sync so a profiled request's calls put their
+    thread id in the profiler's workers while they run.
+
+    Starlette's run_in_threadpool and FastAPI's sync endpoints and
+    dependencies all go through it.
+    """
+    async def run_sync_tracked(func, *args, **kwargs):
+        profiler = _profiling.get()
+        if profiler is None:
+            return await run_sync(func, *args, **kwargs)
+
+        def call(*call_args):
+            ident = threading.get_ident()
+            profiler.workers.add(ident)
+            try:
+                return func(*call_args)
+            finally:
+                profiler.workers.discard(ident)
+        return await run_sync(call, *args, **kwargs)
+
+    run_sync_tracked.tracks_workers = True
+    return run_sync_tracked
+
+
+class RequestProfilerMiddleware:
+    """Profile a single request when it carries X-Profile: <PROFILER_TOKEN>
+    or ?__profile=<PROFILER_TOKEN>, and save the result for /profiles.
+
+    Requests without the header or flag pass straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        if not getattr(anyio.to_thread.run_sync, "tracks_workers", False):
+            anyio.to_thread.run_sync = _track_workers(anyio.to_thread.run_sync)
+
+    async def __call__(self, scope, receive, send):
+        # The token also authorizes the /profiles pages, which are not profiled
+        if scope["type"] != "http" or scope["path"].startswith("/profiles"):
+            await self.app(scope, receive, send)
+            return
+        token = _requested_token(scope)
+        if token is None or not check_token(token):
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        profiler = SamplingProfiler(threading.get_ident(), sys._getframe())
+        context_token = _profiling.set(profiler)
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            _profiling.reset(context_token)
+            try:
+                file_name = save_profile(profiler, scope["method"], scope["path"], status_code)
+                print(f"Saved profile {file_name}")
+            except Exception as e:
+                print(f"Error saving profile for {scope['path']}: {e}")
@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi.responses import Response
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.database import get_db
+from app import schemas
+from app.api_read import dumps
+from app.batch import run_batch, request_hash, stored_response, save_response, MAX_OPERATIONS
+
+router = APIRouter()
+
+
+def _replay(stored, key):
+    request_hash, status_code, body = stored
+    return Response(body, status_code=status_code, media_type="application/json",
+                    headers={"Idempotency-Key": key, "Idempotent-Replayed": "true"})
+
+
+@router.post("")
+def run_batch_api(batch: schemas.BatchRequest, db: Session = Depends(get_db),
+                  idempotency_key: Optional[str] = Header(None, max_length=128)):
+    """Apply create/update/delete operations across resources in one transaction.
+
+    Each operation runs in its own savepoint and gets its own result. Send
+    an Idempotency-Key header to make retries safe: a repeated key returns
+    the stored response instead of applying the batch again.
+    """
+    if len(batch.operations) > MAX_OPERATIONS:
+        raise HTTPException(status_code=413, detail=f"A batch can hold at most {MAX_OPERATIONS} operations")
+
+    body_hash = request_hash(batch) if idempotency_key else None
+    if idempotency_key:
+        stored = stored_response(db, idempotency_key)
+        if stored is not None:
+            if stored.request_hash != body_hash:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+            return _replay(stored, idempotency_key)
+
+    committed, results = run_batch(db, batch.operations, atomic=batch.atomic)
+    status_code = 200 if committed else 409
+    body = dumps({
+        "committed": committed,
+        "succeeded": sum(1 for result in results if result["status"] < 300),
+        "failed": sum(1 for result in results if result["status"] >= 300),
+        "results": results,
+    })
+    try:
+        if idempotency_key:
+            save_response(db, idempotency_key, body_hash, status_code, body)
+        db.commit()
+    except IntegrityError:
+        # The same key was committed by a concurrent request; ours is discarded
+        db.rollback()
+        stored = stored_response(db, idempotency_key) if idempotency_key else None
+        if stored is None:
+            raise
+        return _replay(stored, idempotency_key)
+
+    headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
@@ -0,0 +1,333 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Form, Query, status
+from fastapi.responses import HTMLResponse, RedirectResponse
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import select
+from typing import List
+from datetime import datetime
+import time
+
+from app.database import get_db
+from app import models, schemas
+from app.shared import templates
+from app.allocation import (
+    allocate_stock, record_supply, supply_reserved, OPEN_BOM_STATUSES, PRIORITY_CHOICES
+)
+from app.stock import InsufficientStockError
+from app.reference_cache import get_consignees
+
+router = APIRouter()
+
+BOM_STATUSES = ["pending", "in_progress", "completed", "cancelled"]
+
+
+def _create_bom(db: Session, product_id: int, product_quantity: int, consignee=None,
+                priority=2, due_date=None, notes=None):
+    """Create a BOM with materials exploded from the product definition"""
+    product = db.query(models.Product).options(
+        joinedload(models.Product.product_materials)
+    ).filter(models.Product.id == product_id).first()
+    if product is None:
+        raise ValueError(f"Product {product_id} not found")
+
+    bom = models.BOM(
+        product_id=product.id,
+        product_quantity=product_quantity,
+        consignee=consignee,
+        priority=priority,
+        due_date=due_date,
+        notes=notes,
+        status="pending"
+    )
+    for pm in product.product_materials:
+        bom.materials.append(models.BOMMaterial(
+            storage_id=pm.storage_id,
+            quantity_required=(pm.quantity_needed or 0) * product_quantity,
+            quantity_provided=0,
+            quantity_reserved=0,
+            is_fully_provided=False
+        ))
+    bom.required_total = sum(m.quantity_required for m in bom.materials)
+    bom.provided_total = 0
+    db.add(bom)
+    db.flush()
+
+    allocate_stock(db, [m.storage_id for m in bom.materials])
+    return bom
+
+
+def _parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date() if value else None
+
+
+# API Endpoints
+@router.get("/api", response_model=List[schemas.BOM])
+async def get_boms_api(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    boms = db.query(models.BOM).options(
+        selectinload(models.BOM.materials)
+    ).order_by(models.BOM.id.desc()).offset(skip).limit(limit).all()
+    return boms
+
+@router.post("/api", response_model=schemas.BOM)
+async def create_bom_api(bom: schemas.BOMCreate, db: Session = Depends(get_db)):
+    try:
+        db_bom = _create_bom(db, **bom.dict())
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=404, detail=str(e))
+    db.commit()
+    db.refresh(db_bom)
+    return db_bom
+
+@router.post("/api/allocate")
+async def allocate_stock_api(allocation: schemas.StockAllocationRequest, db: Session = Depends(get_db)):
+    started = time.perf_counter()
+    changed = allocate_stock(db, allocation.storage_ids)
+    db.commit()
+    return {
+        "changed": changed,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+@router.post("/api/supply")
+async def supply_boms_api(supply: schemas.BOMSupplyRequest, db: Session = Depends(get_db)):
+    try:
+        transaction_ids = supply_reserved(db, supply.bom_ids, notes=supply.notes)
+    except InsufficientStockError as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
+    db.commit()
+    return {"transaction_ids": transaction_ids}
+
+@router.get("/api/progress", response_model=List[schemas.BOMProgress])
+async def get_bom_progress_api(
+    status_filter: str = Query(None, alias="status"),
+    skip: int = 0,
+    limit: int = 5000,
+    db: Session = Depends(get_db)
+):
+    # One query over the running totals; no materials or supply rows are loaded
+    query = select(
+        models.BOM.id,
+        models.BOM.bom_identifier,
+        models.BOM.status,
+        models.BOM.priority,
+        models.BOM.due_date,
+        models.Product.product_name,
+        models.BOM.required_total,
+        models.BOM.provided_total,
+    ).outerjoin(models.Product, models.Product.id == models.BOM.product_id)
+    if status_filter:
+        query = query.where(models.BOM.status == status_filter)
+    query = query.order_by(models.BOM.id.desc()).offset(skip).limit(limit)
+
+    result = []
+    for row in db.execute(query):
+        required = row.required_total or 0
+        provided = row.provided_total or 0
+        result.append({
+            "id": row.id,
+            "bom_identifier": row.bom_identifier,
+            "status": row.status,
+            "priority": row.priority,
+            "due_date": row.due_date,
+            "product_name": row.product_name,
+            "required_total": required,
+            "provided_total": provided,
+            "progress_percentage": round(provided / required * 100, 2) if required else 0
+        })
+    return result
+
+@router.get("/api/{bom_id}", response_model=schemas.BOM)
+async def get_bom_api(bom_id: int, db: Session = Depends(get_db)):
+    bom = db.query(models.BOM).options(
+        selectinload(models.BOM.materials)
+    ).filter(models.BOM.id == bom_id).first()
+    if bom is None:
+        raise HTTPException(status_code=404, detail="BOM not found")
+    return bom
+
+# Frontend Routes
+@router.get("", response_class=HTMLResponse)
+async def list_boms(request: Request, db: Session = Depends(get_db)):
+    try:
+        status_filter = request.query_params.get('status', '')
+
+        # Progress comes from the running totals on BOM, so no child rows are loaded
+        query = db.query(models.BOM).options(joinedload(models.BOM.product))
+        if status_filter:
+            query = query.filter(models.BOM.status == status_filter)
+
+        boms = query.order_by(
+            models.BOM.priority.desc(),
+            models.BOM.due_date.is_(None),
+            models.BOM.due_date,
+            models.BOM.id
+        ).all()
+
+        return templates.TemplateResponse("list_bom.html", {
+            "request": request,
+            "boms": boms,
+            "statuses": BOM_STATUSES,
+            "status_filter": status_filter,
+            "priority_labels": dict(PRIORITY_CHOICES)
+        })
+    except Exception as e:
+        print(f"Error in list_boms: {e}")
+        return templates.TemplateResponse("error.html", {
+            "request": request,
+            "status_code": 500,
+            "detail": f"Error loading BOMs: {str(e)}"
+        })
+
+@router.get("/add", response_class=HTMLResponse)
+async def add_bom_form(request: Request, db: Session = Depends(get_db)):
+    products = db.query(models.Product).order_by(models.Product.product_name).all()
+    consignees = get_consignees(db)
+    return templates.TemplateResponse("add_bom.html", {
+        "request": request,
+        "products": products,
+        "consignees": consignees,
+        "priorities": PRIORITY_CHOICES
+    })
+
+@router.post("/add")
+async def add_bom(
+    request: Request,
+    product_id: int = Form(...),
+    product_quantity: int = Form(1),
+    consignee: str = Form(None),
+    priority: int = Form(2),
+    due_date: str = Form(None),
+    notes: str = Form(None),
+    db: Session = Depends(get_db)
+):
+    try:
+        bom = _create_bom(
+            db,
+            product_id=product_id,
+            product_quantity=product_quantity,
+            consignee=consignee,
+            priority=priority,
+            due_date=_parse_date(due_date),
+            notes=notes
+        )
+        db.commit()
+        return RedirectResponse(url=f"/boms/{bom.id}", status_code=status.HTTP_303_SEE_OTHER)
+    except Exception as e:
+        db.rollback()
+        print(f"Error adding BOM: {e}")
+        products = db.query(models.Product).order_by(models.Product.product_name).all()
+        consignees = get_consignees(db)
+        return templates.TemplateResponse("add_bom.html", {
+            "request": request,
+            "products": products,
+            "consignees": consignees,
+            "priorities": PRIORITY_CHOICES,
+            "error": f"Error adding BOM: {str(e)}"
+        })
+
+@router.post("/allocate")
+async def allocate_all(db: Session = Depends(get_db)):
+    try:
+        allocate_stock(db)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error allocating stock: {e}")
+    return RedirectResponse(url="/boms", status_code=status.HTTP_303_SEE_OTHER)
+
+@router.post("/edit/{bom_id}")
+async def update_bom(
+    bom_id: int,
+    priority: int = Form(2),
+    due_date: str = Form(None),
+    bom_status: str = Form(None),
+    notes: str = Form(None),
+    db: Session = Depends(get_db)
+):
+    try:
+        bom = db.query(models.BOM).filter(models.BOM.id == bom_id).first()
+        if bom is None:
+            return RedirectResponse(url="/boms", status_code=status.HTTP_303_SEE_OTHER)
+
+        bom.priority = priority
+        bom.due_date = _parse_date(due_date)
+        if bom_status in BOM_STATUSES:
+            bom.status = bom_status
+        bom.notes = notes
+        db.flush()
+
+        # Priority, due date and status all change who gets the stock
+        storage_ids = [sid for (sid,) in db.query(models.BOMMaterial.storage_id).filter(
+            models.BOMMaterial.bom_id == bom_id
+        )]
+        allocate_stock(db, storage_ids)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error updating BOM: {e}")
+    return RedirectResponse(url=f"/boms/{bom_id}", status_code=status.HTTP_303_SEE_OTHER)
+
+@router.post("/delete/{bom_id}")
+async def delete_bom(bom_id: int, db: Session = Depends(get_db)):
+    try:
+        bom = db.query(models.BOM).filter(models.BOM.id == bom_id).first()
+        if bom is None:
+            return RedirectResponse(url="/boms", status_code=status.HTTP_303_SEE_OTHER)
+
+        storage_ids = [m.storage_id for m in bom.materials]
+        db.delete(bom)
+        db.flush()
+        allocate_stock(db, storage_ids)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error deleting BOM: {e}")
+    return RedirectResponse(url="/boms", status_code=status.HTTP_303_SEE_OTHER)
+
+@router.post("/{bom_id}/supply")
+async def supply_bom(request: Request, bom_id: int, db: Session = Depends(get_db)):
+    form_data = await request.form()
+    try:
+        if form_data.get("supply_reserved"):
+            supply_reserved(db, [bom_id], notes=form_data.get("notes"))
+        else:
+            lines = []
+            for key, value in form_data.items():
+                # Quantities arrive as quantities[<bom_material_id>]
+                if key.startswith("quantities[") and value:
+                    lines.append((int(key[len("quantities["):-1]), float(value)))
+            record_supply(db, {bom_id: lines}, supply_type="manual", notes=form_data.get("notes"))
+        db.commit()
+        return RedirectResponse(url=f"/boms/{bom_id}", status_code=status.HTTP_303_SEE_OTHER)
+    except (InsufficientStockError, ValueError) as e:
+        db.rollback()
+        print(f"Error supplying BOM: {e}")
+        return templates.TemplateResponse("error.html", {
+            "request": request,
+            "status_code": 409,
+            "detail": str(e)
+        })
+
+@router.get("/{bom_id}", response_class=HTMLResponse)
+async def view_bom(request: Request, bom_id: int, db: Session = Depends(get_db)):
+    bom = db.query(models.BOM).options(
+        joinedload(models.BOM.product),
+        selectinload(models.BOM.materials).joinedload(models.BOMMaterial.storage),
+        selectinload(models.BOM.supply_transactions).selectinload(models.BOMSupplyTransaction.supply_items)
+    ).filter(models.BOM.id == bom_id).first()
+
+    if bom is None:
+        return templates.TemplateResponse("error.html", {
+            "request": request,
+            "status_code": 404,
+            "detail": f"BOM with ID {bom_id} not found"
+        })
+
+    return templates.TemplateResponse("view_bom.html", {
+        "request": request,
+        "bom": bom,
+        "statuses": BOM_STATUSES,
+        "priorities": PRIORITY_CHOICES,
+        "is_open": bom.status in OPEN_BOM_STATUSES
+    })
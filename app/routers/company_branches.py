@@ -6,21 +6,25 @@ from typing import List
 from app.database import get_db
 from app import models, schemas
 from app.shared import templates
+from app.api_read import RowsResponse, COMPANY_BRANCH, selection_params
 
 router = APIRouter()
 
 # API Endpoints (for potential future use)
+# Plain defs run in the threadpool, so fetching and serializing a large
+# page never holds up the event loop
 @router.get("/api", response_model=List[schemas.CompanyBranch])
-async def get_company_branches_api(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    company_branches = db.query(models.CompanyBranch).offset(skip).limit(limit).all()
-    return company_branches
+def get_company_branches_api(skip: int = 0, limit: int = 100, selection=Depends(selection_params(COMPANY_BRANCH)),
+                             db: Session = Depends(get_db)):
+    return RowsResponse(COMPANY_BRANCH.fetch(db, selection=selection, offset=skip, limit=limit))
 
 @router.get("/api/{branch_id}", response_model=schemas.CompanyBranch)
-async def get_company_branch_api(branch_id: int, db: Session = Depends(get_db)):
-    branch = db.query(models.CompanyBranch).filter(models.CompanyBranch.id == branch_id).first()
+def get_company_branch_api(branch_id: int, selection=Depends(selection_params(COMPANY_BRANCH)),
+                           db: Session = Depends(get_db)):
+    branch = COMPANY_BRANCH.fetch_one(db, models.CompanyBranch.id == branch_id, selection=selection)
     if branch is None:
         raise HTTPException(status_code=404, detail="Company branch not found")
-    return branch
+    return RowsResponse(branch)
 
 @router.post("/api", response_model=schemas.CompanyBranch)
 async def create_company_branch_api(branch: schemas.CompanyBranchCreate, db: Session = Depends(get_db)):
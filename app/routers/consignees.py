@@ -6,21 +6,25 @@ from typing import List
 from app.database import get_db
 from app import models, schemas
 from app.shared import templates
+from app.api_read import RowsResponse, CONSIGNEE, selection_params
 
 router = APIRouter()
 
 # API Endpoints (for potential future use)
+# Plain defs run in the threadpool, so fetching and serializing a large
+# page never holds up the event loop
 @router.get("/api", response_model=List[schemas.Consignee])
-async def get_consignees_api(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    consignees = db.query(models.Consignee).offset(skip).limit(limit).all()
-    return consignees
+def get_consignees_api(skip: int = 0, limit: int = 100, selection=Depends(selection_params(CONSIGNEE)),
+                       db: Session = Depends(get_db)):
+    return RowsResponse(CONSIGNEE.fetch(db, selection=selection, offset=skip, limit=limit))
 
 @router.get("/api/{consignee_id}", response_model=schemas.Consignee)
-async def get_consignee_api(consignee_id: int, db: Session = Depends(get_db)):
-    consignee = db.query(models.Consignee).filter(models.Consignee.id == consignee_id).first()
+def get_consignee_api(consignee_id: int, selection=Depends(selection_params(CONSIGNEE)),
+                      db: Session = Depends(get_db)):
+    consignee = CONSIGNEE.fetch_one(db, models.Consignee.id == consignee_id, selection=selection)
     if consignee is None:
         raise HTTPException(status_code=404, detail="Consignee not found")
-    return consignee
+    return RowsResponse(consignee)
 
 @router.post("/api", response_model=schemas.Consignee)
 async def create_consignee_api(consignee: schemas.ConsigneeCreate, db: Session = Depends(get_db)):
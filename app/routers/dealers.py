@@ -6,6 +6,9 @@ from app.database import get_db
 from app import models
 from app.shared import templates
 from app.schemas import Dealer, DealerCreate, DealerUpdate
+from app.api_read import RowsResponse, DEALER, selection_params
+from app.listing import paginate, page_number
+from app.sql_profiler import query_budget
 from requests import request
 from datetime import datetime
 
@@ -20,17 +23,20 @@ from app.shared import templates  # Use shared templates with filters
 router = APIRouter()
 
 # API Endpoints
+# Plain defs run in the threadpool, so fetching and serializing a large
+# page never holds up the event loop
 @router.get("/api", response_model=List[Dealer])
-async def get_dealers_api(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    dealers = db.query(models.Dealer).offset(skip).limit(limit).all()
-    return dealers
+@query_budget(5)
+def get_dealers_api(skip: int = 0, limit: int = 100, selection=Depends(selection_params(DEALER)),
+                    db: Session = Depends(get_db)):
+    return RowsResponse(DEALER.fetch(db, selection=selection, offset=skip, limit=limit))
 
 @router.get("/api/{dealer_id}", response_model=Dealer)
-async def get_dealer_api(dealer_id: int, db: Session = Depends(get_db)):
-    dealer = db.query(models.Dealer).filter(models.Dealer.id == dealer_id).first()
+def get_dealer_api(dealer_id: int, selection=Depends(selection_params(DEALER)), db: Session = Depends(get_db)):
+    dealer = DEALER.fetch_one(db, models.Dealer.id == dealer_id, selection=selection)
     if dealer is None:
         raise HTTPException(status_code=404, detail="Dealer not found")
-    return dealer
+    return RowsResponse(dealer)
 
 # Frontend Routes - ORDER IS CRITICAL: More specific routes first
 @router.get("/add", response_class=HTMLResponse)
@@ -86,21 +92,19 @@ async def dealer_details(request: Request, dealer_id: int, db: Session = Depends
             "detail": f"Error loading dealer details: {str(e)}"
         })
     
+def _dealer_page(request: Request, db: Session):
+    search_query = request.query_params.get('q', '').strip()
+    query = db.query(models.Dealer)
+    if search_query:
+        query = query.filter(models.Dealer.name.ilike(f'%{search_query}%'))
+    page = paginate(query.order_by(models.Dealer.id), page_number(request))
+    return {"request": request, "page": page, "search_query": search_query}
+
 # List dealers route
 @router.get("", response_class=HTMLResponse)
 async def list_dealers(request: Request, db: Session = Depends(get_db)):
     try:
-        search_query = request.query_params.get('q', '').strip()
-        if search_query:
-            dealers = db.query(models.Dealer).filter(models.Dealer.name.ilike(f'%{search_query}%')).all()
-        else:
-            dealers = db.query(models.Dealer).all()
-        
-        return templates.TemplateResponse("dealers.html", {
-            "request": request, 
-            "dealers": dealers,
-            "search_query": search_query
-        })
+        return templates.TemplateResponse("dealers.html", _dealer_page(request, db))
     except Exception as e:
         print(f"Error in list_dealers: {e}")
         return templates.TemplateResponse("error.html", {
@@ -109,6 +113,17 @@ async def list_dealers(request: Request, db: Session = Depends(get_db)):
             "detail": f"Error loading dealers: {str(e)}"
         })
 
+# Just the results table, for search-as-you-type and paging; a plain def,
+# so the query and template render run in the threadpool
+@router.get("/rows", response_class=HTMLResponse)
+@query_budget(3)
+def list_dealer_rows(request: Request, db: Session = Depends(get_db)):
+    try:
+        return templates.TemplateResponse("_dealer_results.html", _dealer_page(request, db))
+    except Exception as e:
+        print(f"Error in list_dealer_rows: {e}")
+        return HTMLResponse(f"Error loading dealers: {str(e)}", status_code=500)
+
 @router.post("/add")
 async def add_dealer(
     request: Request,
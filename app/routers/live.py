@@ -0,0 +1,26 @@
+from fastapi import APIRouter, HTTPException, Header, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+
+from app.live import BOARDS, stream
+
+router = APIRouter()
+
+
+@router.get("/{board}")
+async def live_board(
+    board: str,
+    since: int = Query(0, description="Outbox event id the page was rendered at"),
+    last_event_id: Optional[int] = Header(None),
+):
+    """Server-sent row patches for an open material_inward or pending_materials page"""
+    if board not in BOARDS:
+        raise HTTPException(status_code=404, detail=f"Unknown board '{board}'; choose from {', '.join(BOARDS)}")
+    # The browser sends Last-Event-ID when it reconnects
+    if last_event_id is not None:
+        since = last_event_id
+    return StreamingResponse(
+        stream(board, since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -4,17 +4,20 @@ from sqlalchemy.orm import Session, joinedload
 from datetime import datetime, date
 from typing import List, Optional
 import os
-import uuid
 
 from app.database import get_db
 from app import models
 from app.shared import templates
+from app.live import broker
+from app.uploads import store_upload, resolve_upload, UploadResponse, UploadTooLarge
 
 router = APIRouter()
 
 # List all material inwards
 @router.get("", response_class=HTMLResponse)
 async def list_material_inward(request: Request, db: Session = Depends(get_db)):
+    # Taken before the query, so the page's live stream replays anything committed while it renders
+    live_since = broker.position
     inwards = db.query(models.MaterialInward).options(
         joinedload(models.MaterialInward.items).joinedload(models.MaterialInwardItem.po_item),
         joinedload(models.MaterialInward.pending_materials_list),  # Changed from pending_materials to pending_materials_list
@@ -23,7 +26,8 @@ async def list_material_inward(request: Request, db: Session = Depends(get_db)):
     
     return templates.TemplateResponse("material_inward.html", {
         "request": request,
-        "inwards": inwards
+        "inwards": inwards,
+        "live_since": live_since
     })
 
 # Update the API endpoint to return PO details
@@ -479,35 +483,27 @@ async def resolve_pending_material(
     pending_material = db.query(models.PendingMaterial).filter(models.PendingMaterial.id == pending_id).first()
     
     if pending_material:
+        # Store the proof document first so an oversized file leaves the material unresolved
+        proof_document_path = None
+        if proof_document and proof_document.filename:
+            try:
+                proof_document_path = await store_upload(proof_document, "pending_materials")
+            except UploadTooLarge as e:
+                print(f"Error storing proof document: {e}")
+                return RedirectResponse(url="/material_inward/pending", status_code=status.HTTP_303_SEE_OTHER)
+        
         pending_material.status = "resolved"
         pending_material.resolution_bill_no = form_data.get("resolution_bill_no")
         pending_material.resolution_date = datetime.strptime(form_data.get("resolution_date"), "%Y-%m-%d").date() if form_data.get("resolution_date") else None
         
-        # Handle file upload for proof document
-        if proof_document and proof_document.filename:
-            # Create uploads directory if it doesn't exist
-            upload_dir = "uploads/pending_materials"
-            os.makedirs(upload_dir, exist_ok=True)
-            
-            # Generate unique filename
-            file_extension = proof_document.filename.split(".")[-1]
-            unique_filename = f"{uuid.uuid4()}.{file_extension}"
-            file_path = os.path.join(upload_dir, unique_filename)
-            
-            # Save the file
-            with open(file_path, "wb") as buffer:
-                content = await proof_document.read()
-                buffer.write(content)
-            
-            pending_material.proof_document_path = file_path
-        
         # Create resolution record
         resolution = models.PendingMaterialResolution(
-            material_inward_id=pending_material.material_inward_id,
+            material_inward_id=pending_material.original_inward_id,
             pending_material_id=pending_material.id,
             resolved_quantity=pending_material.pending_quantity,
             resolution_bill_no=form_data.get("resolution_bill_no"),
             resolution_date=datetime.strptime(form_data.get("resolution_date"), "%Y-%m-%d").date() if form_data.get("resolution_date") else None,
+            proof_document_path=proof_document_path,
             notes=form_data.get("notes", "")
         )
         db.add(resolution)
@@ -517,4 +513,17 @@ async def resolve_pending_material(
         
         db.commit()
     
-    return RedirectResponse(url="/material_inward/pending", status_code=status.HTTP_303_SEE_OTHER)
\ No newline at end of file
+    return RedirectResponse(url="/material_inward/pending", status_code=status.HTTP_303_SEE_OTHER)
+
+# Download the proof document of a resolution
+@router.get("/pending/resolutions/{resolution_id}/proof")
+async def download_resolution_proof(request: Request, resolution_id: int, db: Session = Depends(get_db)):
+    resolution = db.query(models.PendingMaterialResolution).filter(
+        models.PendingMaterialResolution.id == resolution_id
+    ).first()
+    path = resolve_upload(resolution.proof_document_path) if resolution else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Proof document not found")
+    
+    filename = f"proof-{resolution_id}{os.path.splitext(path)[1]}"
+    return UploadResponse(path, request.headers, filename)
@@ -0,0 +1,88 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Form, status
+from fastapi.responses import HTMLResponse, RedirectResponse
+from sqlalchemy.orm import Session
+from typing import List
+from datetime import datetime
+
+from app.database import get_db
+from app import models, schemas
+from app.middleware import flash
+from app.shared import templates
+from app.stock import issue_materials, InsufficientStockError
+
+router = APIRouter()
+
+# API Endpoints
+@router.get("/api", response_model=List[schemas.MaterialOutward])
+async def get_material_outwards_api(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    outwards = db.query(models.MaterialOutward).order_by(
+        models.MaterialOutward.id.desc()
+    ).offset(skip).limit(limit).all()
+    return outwards
+
+@router.post("/api", response_model=schemas.MaterialOutward, status_code=status.HTTP_201_CREATED)
+def issue_material_api(outward: schemas.MaterialOutwardCreate, db: Session = Depends(get_db)):
+    try:
+        outward_ids, _ = issue_materials(db, [outward.dict()])
+    except InsufficientStockError as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
+    db.commit()
+    return db.query(models.MaterialOutward).filter(models.MaterialOutward.id == outward_ids[0]).first()
+
+@router.post("/api/bulk")
+def issue_materials_bulk_api(batch: schemas.MaterialOutwardBulkCreate, db: Session = Depends(get_db)):
+    lines = [item.dict() for item in batch.items]
+    try:
+        outward_ids, rejected = issue_materials(db, lines, partial=not batch.atomic)
+    except InsufficientStockError as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail={
+            "message": "Insufficient stock; nothing was issued",
+            "shortages": [{"storage_id": sid, "qty": qty} for sid, qty in e.shortages.items()]
+        })
+    db.commit()
+    return {
+        "issued": len(outward_ids),
+        "outward_ids": outward_ids,
+        "rejected": rejected
+    }
+
+# Frontend Routes
+@router.get("", response_class=HTMLResponse)
+async def list_material_outward(request: Request, db: Session = Depends(get_db)):
+    outwards = db.query(models.MaterialOutward).order_by(
+        models.MaterialOutward.id.desc()
+    ).limit(500).all()
+    storages = db.query(models.Storage).order_by(models.Storage.base_name).all()
+    return templates.TemplateResponse("material_outward.html", {
+        "request": request,
+        "outwards": outwards,
+        "storages": storages
+    })
+
+@router.post("/add")
+def add_material_outward(
+    request: Request,
+    storage_id: int = Form(...),
+    qty: float = Form(...),
+    receiver_section: str = Form(None),
+    reason: str = Form(None),
+    date: str = Form(None),
+    db: Session = Depends(get_db)
+):
+    try:
+        issue_materials(db, [{
+            "storage_id": storage_id,
+            "qty": qty,
+            "receiver_section": receiver_section,
+            "reason": reason,
+            "date": datetime.strptime(date, "%Y-%m-%d").date() if date else None
+        }])
+        db.commit()
+        return RedirectResponse(url="/material_outward", status_code=status.HTTP_303_SEE_OTHER)
+    except (InsufficientStockError, ValueError) as e:
+        db.rollback()
+        print(f"Error issuing material: {e}")
+        flash(request, f"Could not issue the material: {e}", "error")
+        return RedirectResponse(url="/material_outward", status_code=status.HTTP_303_SEE_OTHER)
@@ -7,12 +7,15 @@ from typing import List
 from app.database import get_db
 from app import models
 from app.shared import templates
+from app.live import broker
 
 router = APIRouter()
 
 # List all pending materials
 @router.get("", response_class=HTMLResponse)
 async def list_pending_materials(request: Request, db: Session = Depends(get_db)):
+    # Taken before the query, so the page's live stream replays anything committed while it renders
+    live_since = broker.position
     pending_materials = db.query(models.PendingMaterial).options(
         joinedload(models.PendingMaterial.purchase_order),
         joinedload(models.PendingMaterial.po_item)
@@ -20,7 +23,8 @@ async def list_pending_materials(request: Request, db: Session = Depends(get_db)
     
     return templates.TemplateResponse("pending_list.html", {
         "request": request,
-        "pending_materials": pending_materials
+        "pending_materials": pending_materials,
+        "live_since": live_since
     })
 
 # Add pending materials from a material inward
@@ -9,22 +9,29 @@ from app import models
 from app.shared import templates
 from app.schemas import Product, ProductCreate, ProductUpdate, ProductWithMaterials, ProductMaterialCreate
 from app.pdf_utils import generate_pdf, create_pdf_response, render_pdf_template
-from sqlalchemy.orm import joinedload
+from app.api_read import RowsResponse, PRODUCT, selection_params
+from app.listing import paginate, page_number
+from app.sql_profiler import query_budget
+from app import autocomplete
+from sqlalchemy.orm import joinedload, selectinload
 
 router = APIRouter()
 
 # API Endpoints
+# Plain defs run in the threadpool, so fetching and serializing a large
+# page never holds up the event loop
 @router.get("/api", response_model=List[ProductWithMaterials])
-async def get_products_api(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    products = db.query(models.Product).offset(skip).limit(limit).all()
-    return products
+@query_budget(5)
+def get_products_api(skip: int = 0, limit: int = 100, selection=Depends(selection_params(PRODUCT)),
+                     db: Session = Depends(get_db)):
+    return RowsResponse(PRODUCT.fetch(db, selection=selection, offset=skip, limit=limit))
 
 @router.get("/api/{product_id}", response_model=ProductWithMaterials)
-async def get_product_api(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
+def get_product_api(product_id: int, selection=Depends(selection_params(PRODUCT)), db: Session = Depends(get_db)):
+    product = PRODUCT.fetch_one(db, models.Product.id == product_id, selection=selection)
     if product is None:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    return RowsResponse(product)
 
 @router.post("/api", response_model=Product)
 async def create_product_api(product: ProductCreate, db: Session = Depends(get_db)):
@@ -57,31 +64,23 @@ async def delete_product_api(product_id: int, db: Session = Depends(get_db)):
     db.commit()
     return {"message": "Product deleted successfully"}
 
+def _product_page(request: Request, db: Session):
+    search_query = request.query_params.get('q', '').strip()
+    query = db.query(models.Product).options(selectinload(models.Product.product_materials))
+    if search_query:
+        query = query.filter(
+            models.Product.product_name.ilike(f'%{search_query}%') |
+            models.Product.product_description.ilike(f'%{search_query}%') |
+            models.Product.section_name.ilike(f'%{search_query}%')
+        )
+    page = paginate(query.order_by(models.Product.id), page_number(request))
+    return {"request": request, "page": page, "search_query": search_query}
+
 # Frontend Routes
 @router.get("", response_class=HTMLResponse)
 async def list_products(request: Request, db: Session = Depends(get_db)):
     try:
-        search_query = request.query_params.get('q', '').strip()
-        
-        if search_query:
-            products = db.query(models.Product).filter(
-                models.Product.product_name.ilike(f'%{search_query}%') |
-                models.Product.product_description.ilike(f'%{search_query}%') |
-                models.Product.section_name.ilike(f'%{search_query}%')
-            ).all()
-        else:
-            products = db.query(models.Product).all()
-        
-        # Build storage map for efficiency
-        storages = db.query(models.Storage).all()
-        storage_map = {s.id: s for s in storages}
-        
-        return templates.TemplateResponse("list_product.html", {
-            "request": request, 
-            "products": products,
-            "storage_map": storage_map,
-            "search_query": search_query
-        })
+        return templates.TemplateResponse("list_product.html", _product_page(request, db))
     except Exception as e:
         print(f"Error in list_products: {e}")
         return templates.TemplateResponse("error.html", {
@@ -90,6 +89,17 @@ async def list_products(request: Request, db: Session = Depends(get_db)):
             "detail": f"Error loading products: {str(e)}"
         })
 
+# Just the results table, for search-as-you-type and paging; a plain def,
+# so the query and template render run in the threadpool
+@router.get("/rows", response_class=HTMLResponse)
+@query_budget(3)
+def list_product_rows(request: Request, db: Session = Depends(get_db)):
+    try:
+        return templates.TemplateResponse("_product_results.html", _product_page(request, db))
+    except Exception as e:
+        print(f"Error in list_product_rows: {e}")
+        return HTMLResponse(f"Error loading products: {str(e)}", status_code=500)
+
 @router.get("/add", response_class=HTMLResponse)
 async def add_product_form(request: Request, db: Session = Depends(get_db)):
     try:
@@ -285,17 +295,24 @@ async def delete_product(product_id: int, db: Session = Depends(get_db)):
         db.rollback()
         return RedirectResponse(url="/products", status_code=status.HTTP_303_SEE_OTHER)
 
+# A plain def runs in the threadpool, so waiting on the index lock or the
+# database never holds up the event loop
 @router.get("/search_materials")
-async def search_materials(request: Request, q: str = "", db: Session = Depends(get_db)):
+@query_budget(3)
+def search_materials(request: Request, q: str = "", db: Session = Depends(get_db)):
     try:
-        if q:
-            materials = db.query(models.Storage).filter(
+        ranked = autocomplete.search(q, limit=10) if q else None
+        if ranked is not None:
+            materials = autocomplete.load_ranked(db, ranked)
+        elif q:
+            # The index is still loading (or turned off)
+            materials = db.query(models.Storage).options(joinedload(models.Storage.dealer)).filter(
                 models.Storage.base_name.ilike(f'%{q}%') |
                 models.Storage.defined_name_with_spec.ilike(f'%{q}%') |
                 models.Storage.brand.ilike(f'%{q}%')
             ).limit(10).all()
         else:
-            materials = db.query(models.Storage).limit(10).all()
+            materials = db.query(models.Storage).options(joinedload(models.Storage.dealer)).limit(10).all()
         
         return templates.TemplateResponse("_material_options.html", {
             "request": request,
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import HTMLResponse, FileResponse
+
+from app.shared import templates
+from app import request_profiler
+
+router = APIRouter()
+
+
+def _authorize(request: Request):
+    if not request_profiler.enabled():
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = request.headers.get(request_profiler.PROFILE_HEADER) or request.query_params.get("token")
+    if not request_profiler.check_token(token):
+        raise HTTPException(status_code=403, detail="A valid profiler token is required")
+    return token
+
+
+@router.get("", response_class=HTMLResponse)
+async def list_profiles(request: Request):
+    token = _authorize(request)
+    return templates.TemplateResponse("profiles.html", {
+        "request": request,
+        "profiles": request_profiler.list_profiles(),
+        "token": token,
+        "header": request_profiler.PROFILE_HEADER,
+        "param": request_profiler.PROFILE_PARAM,
+    })
+
+
+@router.get("/{file_name}")
+async def download_profile(file_name: str, request: Request):
+    _authorize(request)
+    path = request_profiler.profile_path(file_name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json", filename=file_name)
@@ -9,22 +9,31 @@ from app.database import get_db
 from app import models
 from app.shared import templates
 from app.pdf_utils import generate_pdf, create_pdf_response, render_pdf_template
+from app.pricing import record_purchase_order_prices
+from app.reference_cache import get_dealers, get_company_branches, get_consignees
+from app.api_read import RowsResponse, PURCHASE_ORDER, selection_params
+from app.sql_profiler import query_budget
+from app import autocomplete
 from sqlalchemy import or_
 
 router = APIRouter()
 
 # API Endpoints
+# Plain defs run in the threadpool, so fetching and serializing a large
+# page never holds up the event loop
 @router.get("/api", response_model=List[dict])
-async def get_purchase_orders_api(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    purchase_orders = db.query(models.PurchaseOrder).offset(skip).limit(limit).all()
-    return purchase_orders
+@query_budget(5)
+def get_purchase_orders_api(skip: int = 0, limit: int = 100, selection=Depends(selection_params(PURCHASE_ORDER)),
+                            db: Session = Depends(get_db)):
+    return RowsResponse(PURCHASE_ORDER.fetch(db, selection=selection, offset=skip, limit=limit))
 
 @router.get("/api/{po_no}", response_model=dict)
-async def get_purchase_order_api(po_no: int, db: Session = Depends(get_db)):
-    purchase_order = db.query(models.PurchaseOrder).filter(models.PurchaseOrder.po_no == po_no).first()
+def get_purchase_order_api(po_no: int, selection=Depends(selection_params(PURCHASE_ORDER)),
+                           db: Session = Depends(get_db)):
+    purchase_order = PURCHASE_ORDER.fetch_one(db, models.PurchaseOrder.po_no == po_no, selection=selection)
     if purchase_order is None:
         raise HTTPException(status_code=404, detail="Purchase order not found")
-    return purchase_order.__dict__
+    return RowsResponse(purchase_order)
 
 @router.get("/{po_no}/details")
 def get_po_details(po_no: int, db: Session = Depends(get_db)):
@@ -73,7 +82,7 @@ async def list_purchase_orders(request: Request, db: Session = Depends(get_db)):
             query = query.filter(models.PurchaseOrder.invoice_branch_id == branch_filter)
         
         purchase_orders = query.order_by(models.PurchaseOrder.po_no.asc()).all()
-        company_branches = db.query(models.CompanyBranch).all()
+        company_branches = get_company_branches(db)
         
         return templates.TemplateResponse("purchase_orders.html", {
             "request": request, 
@@ -94,9 +103,9 @@ async def list_purchase_orders(request: Request, db: Session = Depends(get_db)):
 @router.get("/add", response_class=HTMLResponse)
 async def add_purchase_order_form(request: Request, db: Session = Depends(get_db)):
     try:
-        dealers = db.query(models.Dealer).all()
-        company_branches = db.query(models.CompanyBranch).all()
-        consignees = db.query(models.Consignee).all()
+        dealers = get_dealers(db)
+        company_branches = get_company_branches(db)
+        consignees = get_consignees(db)
         
         # Get the next PO number
         last_po = db.query(models.PurchaseOrder).order_by(models.PurchaseOrder.po_no.asc()).first()
@@ -166,6 +175,8 @@ async def add_purchase_order(
             db.add(item)
             index += 1
 
+        db.flush()
+        record_purchase_order_prices(db, purchase_order.po_no)
         db.commit()
         
         return RedirectResponse(url="/purchase_orders", status_code=status.HTTP_303_SEE_OTHER)
@@ -174,9 +185,9 @@ async def add_purchase_order(
         db.rollback()
         
         # Re-render the form with error message
-        dealers = db.query(models.Dealer).all()
-        company_branches = db.query(models.CompanyBranch).all()
-        consignees = db.query(models.Consignee).all()
+        dealers = get_dealers(db)
+        company_branches = get_company_branches(db)
+        consignees = get_consignees(db)
         
         last_po = db.query(models.PurchaseOrder).order_by(models.PurchaseOrder.po_no.asc()).first()
         next_po_number = last_po.po_no + 1 if last_po else 1
@@ -204,9 +215,9 @@ async def edit_purchase_order_form(request: Request, po_no: int, db: Session = D
         if purchase_order is None:
             return RedirectResponse(url="/purchase_orders", status_code=status.HTTP_303_SEE_OTHER)
         
-        dealers = db.query(models.Dealer).all()
-        company_branches = db.query(models.CompanyBranch).all()
-        consignees = db.query(models.Consignee).all()
+        dealers = get_dealers(db)
+        company_branches = get_company_branches(db)
+        consignees = get_consignees(db)
         
         return templates.TemplateResponse("edit_purchase_order.html", {
             "request": request, 
@@ -274,6 +285,8 @@ async def update_purchase_order(
             db.add(item)
             index += 1
 
+        db.flush()
+        record_purchase_order_prices(db, po_no)
         db.commit()
         
         return RedirectResponse(url="/purchase_orders", status_code=status.HTTP_303_SEE_OTHER)
@@ -289,9 +302,9 @@ async def update_purchase_order(
             joinedload(models.PurchaseOrder.consignee)
         ).filter(models.PurchaseOrder.po_no == po_no).first()
         
-        dealers = db.query(models.Dealer).all()
-        company_branches = db.query(models.CompanyBranch).all()
-        consignees = db.query(models.Consignee).all()
+        dealers = get_dealers(db)
+        company_branches = get_company_branches(db)
+        consignees = get_consignees(db)
         
         return templates.TemplateResponse("edit_purchase_order.html", {
             "request": request, 
@@ -309,6 +322,7 @@ async def delete_purchase_order(po_no: int, db: Session = Depends(get_db)):
         if purchase_order is None:
             return RedirectResponse(url="/purchase_orders", status_code=status.HTTP_303_SEE_OTHER)
         
+        db.query(models.PriceHistory).filter(models.PriceHistory.po_no == po_no).delete()
         db.delete(purchase_order)
         db.commit()
         
@@ -347,6 +361,50 @@ async def view_purchase_order(request: Request, po_no: int, db: Session = Depend
             "detail": f"Error viewing purchase order: {str(e)}"
         })
 
+def number_to_words(number):
+    """Spell out a whole number in the Indian system (lakh, crore)"""
+    units = ["", "One", "Two", "Three", "Four", "Five", "Six", "Seven", "Eight", "Nine"]
+    teens = ["Ten", "Eleven", "Twelve", "Thirteen", "Fourteen", "Fifteen", "Sixteen", "Seventeen", "Eighteen", "Nineteen"]
+    tens = ["", "Ten", "Twenty", "Thirty", "Forty", "Fifty", "Sixty", "Seventy", "Eighty", "Ninety"]
+    
+    if number == 0:
+        return "Zero"
+    
+    words = ""
+    
+    # Crores
+    if number >= 10000000:
+        words += number_to_words(number // 10000000) + " Crore "
+        number %= 10000000
+    
+    # Lakhs
+    if number >= 100000:
+        words += number_to_words(number // 100000) + " Lakh "
+        number %= 100000
+    
+    # Thousands
+    if number >= 1000:
+        words += number_to_words(number // 1000) + " Thousand "
+        number %= 1000
+    
+    # Hundreds
+    if number >= 100:
+        words += number_to_words(number // 100) + " Hundred "
+        number %= 100
+    
+    # Tens and units
+    if number > 0:
+        if number < 10:
+            words += units[number]
+        elif number < 20:
+            words += teens[number - 10]
+        else:
+            words += tens[number // 10]
+            if number % 10 > 0:
+                words += " " + units[number % 10]
+    
+    return words.strip()
+
 @router.get("/{po_no}/generate", response_class=HTMLResponse)
 async def generate_po_form(request: Request, po_no: int, db: Session = Depends(get_db)):
     try:
@@ -365,51 +423,6 @@ async def generate_po_form(request: Request, po_no: int, db: Session = Depends(g
                 "detail": f"Purchase order with PO number {po_no} not found"
             })
         
-        # Convert amount to words for display
-        def number_to_words(number):
-            # Implementation from your previous code
-            units = ["", "One", "Two", "Three", "Four", "Five", "Six", "Seven", "Eight", "Nine"]
-            teens = ["Ten", "Eleven", "Twelve", "Thirteen", "Fourteen", "Fifteen", "Sixteen", "Seventeen", "Eighteen", "Nineteen"]
-            tens = ["", "Ten", "Twenty", "Thirty", "Forty", "Fifty", "Sixty", "Seventy", "Eighty", "Ninety"]
-            
-            if number == 0:
-                return "Zero"
-            
-            words = ""
-            
-            # Crores
-            if number >= 10000000:
-                words += number_to_words(number // 10000000) + " Crore "
-                number %= 10000000
-            
-            # Lakhs
-            if number >= 100000:
-                words += number_to_words(number // 100000) + " Lakh "
-                number %= 100000
-            
-            # Thousands
-            if number >= 1000:
-                words += number_to_words(number // 1000) + " Thousand "
-                number %= 1000
-            
-            # Hundreds
-            if number >= 100:
-                words += number_to_words(number // 100) + " Hundred "
-                number %= 100
-            
-            # Tens and units
-            if number > 0:
-                if number < 10:
-                    words += units[number]
-                elif number < 20:
-                    words += teens[number - 10]
-                else:
-                    words += tens[number // 10]
-                    if number % 10 > 0:
-                        words += " " + units[number % 10]
-            
-            return words.strip()
-        
         amount_in_words = number_to_words(math.floor(purchase_order.grand_total)) + " Rupees"
         if purchase_order.grand_total % 1 > 0:
             paise = round((purchase_order.grand_total % 1) * 100)
@@ -432,15 +445,24 @@ async def generate_po_form(request: Request, po_no: int, db: Session = Depends(g
             "detail": f"Error loading purchase order generator: {str(e)}"
         })
 
+# def, not async def, like /products/search_materials
 @router.get("/search/materials")
-async def search_materials_po(
+@query_budget(3)
+def search_materials_po(
     request: Request, 
     q: str = "", 
     dealer_id: str = "", 
     db: Session = Depends(get_db)
 ):
     try:
-        query = db.query(models.Storage)
+        ranked = autocomplete.search(q, dealer_id=int(dealer_id) if dealer_id else None, limit=20) if q else None
+        if ranked is not None:
+            return templates.TemplateResponse("_material_options_po.html", {
+                "request": request,
+                "materials": autocomplete.load_ranked(db, ranked)
+            })
+
+        query = db.query(models.Storage).options(joinedload(models.Storage.dealer))
         
         if q:
             query = query.filter(
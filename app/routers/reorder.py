@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Depends, Request, status
+from fastapi.responses import HTMLResponse, RedirectResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.database import get_db
+from app.api_read import RowsResponse
+from app.middleware import flash
+from app.reference_cache import get_dealers
+from app.reorder import reorder_suggestions, create_draft_orders, DRAFT_STATUS
+from app.shared import templates
+
+router = APIRouter()
+
+# API Endpoints
+@router.get("/api")
+def get_reorder_suggestions_api(dealer_id: Optional[int] = None, db: Session = Depends(get_db)):
+    return RowsResponse([s._asdict() for s in reorder_suggestions(db, dealer_id=dealer_id)])
+
+@router.post("/api/run")
+def run_reorder_api(dealer_id: Optional[int] = None, db: Session = Depends(get_db)):
+    report = create_draft_orders(db, dealer_id=dealer_id)
+    db.commit()
+    return report
+
+# Frontend Routes
+@router.get("", response_class=HTMLResponse)
+def reorder_page(request: Request, dealer_id: Optional[int] = None, db: Session = Depends(get_db)):
+    suggestions = reorder_suggestions(db, dealer_id=dealer_id)
+    by_dealer = {}
+    for suggestion in suggestions:
+        by_dealer.setdefault((suggestion.dealer_id, suggestion.dealer_name), []).append(suggestion)
+    return templates.TemplateResponse("reorder.html", {
+        "request": request,
+        "by_dealer": by_dealer,
+        "total": len(suggestions),
+        "dealers": get_dealers(db),
+        "dealer_id": dealer_id,
+    })
+
+@router.post("/run")
+def run_reorder(request: Request, dealer_id: Optional[int] = None, db: Session = Depends(get_db)):
+    try:
+        report = create_draft_orders(db, dealer_id=dealer_id)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error running reorder: {e}")
+        flash(request, f"Reorder run failed: {e}", "error")
+        return RedirectResponse(url="/reorder", status_code=status.HTTP_303_SEE_OTHER)
+    if report["orders"]:
+        flash(request, f"Drafted {len(report['orders'])} purchase order(s) with {report['items']} item(s).", "success")
+    else:
+        flash(request, "Nothing to reorder.", "info")
+    if report["unassigned"]:
+        flash(request, f"{len(report['unassigned'])} item(s) have no dealer and were not ordered.", "warning")
+    return RedirectResponse(url=f"/purchase_orders?status={DRAFT_STATUS}", status_code=status.HTTP_303_SEE_OTHER)
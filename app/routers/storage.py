@@ -1,11 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Form, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Form, File, UploadFile, status
 from fastapi.responses import HTMLResponse, RedirectResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.exc import IntegrityError
 from typing import List
 from app.database import get_db
 from app import models
 from app.shared import templates
-from app.schemas import Storage, StorageCreate, StorageUpdate, StorageWithDealer
+from app.schemas import Storage, StorageCreate, StorageUpdate, StorageWithDealer, PriceRevision, PriceSummary
+from app.allocation import allocate_stock
+from app.storage_import import import_storage, iter_rows
+from app.reference_cache import get_dealers, UNITS_LIST
+from app.pricing import upsert_price_list, revise_prices, record_prices, price_summary
+from app.api_read import RowsResponse, STORAGE, selection_params
+from app.listing import paginate, page_number
+from app.sql_profiler import query_budget
+from app.middleware import flash
 
 from app.pdf_utils import generate_pdf, create_pdf_response, render_pdf_template
 from fastapi import Query
@@ -17,51 +26,95 @@ from fastapi import Form
 router = APIRouter()
 
 # API Endpoints
+# Plain defs run in the threadpool, so fetching and serializing a large
+# page never holds up the event loop
 @router.get("/api", response_model=List[StorageWithDealer])
-async def get_storage_api(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    storages = db.query(models.Storage).offset(skip).limit(limit).all()
-    
-    # Add dealer information to each storage item
-    result = []
-    for storage in storages:
-        storage_dict = storage.__dict__
-        if storage.dealer:
-            storage_dict["dealer_name"] = storage.dealer.name
-            storage_dict["dealer"] = {"id": storage.dealer.id, "name": storage.dealer.name}
-        result.append(storage_dict)
-    
-    return result
+@query_budget(5)
+def get_storage_api(skip: int = 0, limit: int = 100, selection=Depends(selection_params(STORAGE)),
+                    db: Session = Depends(get_db)):
+    return RowsResponse(STORAGE.fetch(db, selection=selection, offset=skip, limit=limit))
 
 @router.get("/api/{storage_id}", response_model=StorageWithDealer)
-async def get_storage_api(storage_id: int, db: Session = Depends(get_db)):
-    storage = db.query(models.Storage).filter(models.Storage.id == storage_id).first()
+def get_storage_item_api(storage_id: int, selection=Depends(selection_params(STORAGE)),
+                         db: Session = Depends(get_db)):
+    storage = STORAGE.fetch_one(db, models.Storage.id == storage_id, selection=selection)
     if storage is None:
         raise HTTPException(status_code=404, detail="Storage item not found")
-    
-    storage_dict = storage.__dict__
-    if storage.dealer:
-        storage_dict["dealer_name"] = storage.dealer.name
-        storage_dict["dealer"] = {"id": storage.dealer.id, "name": storage.dealer.name}
-    
-    return storage_dict
+    return RowsResponse(storage)
 
 @router.post("/api", response_model=Storage)
 async def create_storage_api(storage: StorageCreate, db: Session = Depends(get_db)):
     db_storage = models.Storage(**storage.dict())
     db.add(db_storage)
+    db.flush()
+    record_prices(db, [(db_storage.id, db_storage.dealer_id, db_storage.price, db_storage.tax)], "edit")
     db.commit()
     db.refresh(db_storage)
     return db_storage
 
+@router.post("/api/import")
+def import_storage_api(
+    file: UploadFile = File(...),
+    dealer_id: Optional[int] = Form(None),
+    update_existing: bool = Form(True),
+    db: Session = Depends(get_db)
+):
+    try:
+        return import_storage(db, iter_rows(file.file, file.filename), dealer_id, update_existing)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/api/price_list")
+def upload_price_list_api(
+    file: UploadFile = File(...),
+    dealer_id: int = Form(...),
+    db: Session = Depends(get_db)
+):
+    if db.query(models.Dealer.id).filter(models.Dealer.id == dealer_id).first() is None:
+        raise HTTPException(status_code=404, detail="Dealer not found")
+    try:
+        return upsert_price_list(db, iter_rows(file.file, file.filename), dealer_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/api/price_revision")
+def revise_prices_api(revision: PriceRevision, db: Session = Depends(get_db)):
+    try:
+        revised = revise_prices(db, **revision.dict())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    db.commit()
+    return {"revised": revised}
+
+@router.get("/api/{storage_id}/prices", response_model=PriceSummary)
+def get_storage_prices_api(
+    storage_id: int,
+    dealer_id: Optional[int] = None,
+    limit: int = Query(5, ge=1, le=50),
+    days: int = Query(365, ge=1),
+    db: Session = Depends(get_db)
+):
+    return price_summary(db, storage_id, dealer_id, limit, days)
+
 @router.put("/api/{storage_id}", response_model=Storage)
 async def update_storage_api(storage_id: int, storage: StorageUpdate, db: Session = Depends(get_db)):
     db_storage = db.query(models.Storage).filter(models.Storage.id == storage_id).first()
     if db_storage is None:
         raise HTTPException(status_code=404, detail="Storage item not found")
     
+    previous_stock = db_storage.current_stock
+    previous_price = (db_storage.price, db_storage.tax)
     for key, value in storage.dict(exclude_unset=True).items():
         setattr(db_storage, key, value)
     
+    if (db_storage.price, db_storage.tax) != previous_price:
+        record_prices(db, [(storage_id, db_storage.dealer_id, db_storage.price, db_storage.tax)], "edit")
+    
+    # Stock arrivals may satisfy BOMs that are still waiting on this item
+    if db_storage.current_stock != previous_stock:
+        db.flush()
+        allocate_stock(db, [storage_id])
+    
     db.commit()
     db.refresh(db_storage)
     return db_storage
@@ -76,25 +129,23 @@ async def delete_storage_api(storage_id: int, db: Session = Depends(get_db)):
     db.commit()
     return {"message": "Storage item deleted successfully"}
 
+def _storage_page(request: Request, db: Session):
+    search_query = request.query_params.get('q', '').strip()
+    query = db.query(models.Storage).options(joinedload(models.Storage.dealer))
+    if search_query:
+        query = query.filter(
+            models.Storage.base_name.ilike(f'%{search_query}%') |
+            models.Storage.defined_name_with_spec.ilike(f'%{search_query}%') |
+            models.Storage.brand.ilike(f'%{search_query}%')
+        )
+    page = paginate(query.order_by(models.Storage.id), page_number(request))
+    return {"request": request, "page": page, "search_query": search_query}
+
 # Frontend Routes
 @router.get("", response_class=HTMLResponse)
 async def list_storage(request: Request, db: Session = Depends(get_db)):
     try:
-        search_query = request.query_params.get('q', '').strip()
-        if search_query:
-            storages = db.query(models.Storage).filter(
-                models.Storage.base_name.ilike(f'%{search_query}%') |
-                models.Storage.defined_name_with_spec.ilike(f'%{search_query}%') |
-                models.Storage.brand.ilike(f'%{search_query}%')
-            ).all()
-        else:
-            storages = db.query(models.Storage).all()
-        
-        return templates.TemplateResponse("list_storage.html", {
-            "request": request, 
-            "storages": storages,
-            "search_query": search_query
-        })
+        return templates.TemplateResponse("list_storage.html", _storage_page(request, db))
     except Exception as e:
         print(f"Error in list_storage: {e}")
         return templates.TemplateResponse("error.html", {
@@ -103,16 +154,30 @@ async def list_storage(request: Request, db: Session = Depends(get_db)):
             "detail": f"Error loading storage items: {str(e)}"
         })
 
+# Just the results table, for search-as-you-type and paging; a plain def,
+# so the query and template render run in the threadpool
+@router.get("/rows", response_class=HTMLResponse)
+@query_budget(3)
+def list_storage_rows(request: Request, db: Session = Depends(get_db)):
+    try:
+        return templates.TemplateResponse("_storage_results.html", _storage_page(request, db))
+    except Exception as e:
+        print(f"Error in list_storage_rows: {e}")
+        return HTMLResponse(f"Error loading storage items: {str(e)}", status_code=500)
+
+def _duplicate_message(spec):
+    # uq_storage_dealer_spec: a dealer lists each item name once
+    return f"This dealer already has an item named '{spec}'. Edit that item instead."
+
 @router.get("/add", response_class=HTMLResponse)
 async def add_storage_form(request: Request, db: Session = Depends(get_db)):
     try:
-        dealers = db.query(models.Dealer).all()
-        units_list = ["Nos", "Kgs", "mm", "cm", "liters", "meters", "pieces", "packs"]
+        dealers = get_dealers(db)
         
         return templates.TemplateResponse("add_storage.html", {
             "request": request,
             "dealers": dealers,
-            "units_list": units_list
+            "units_list": UNITS_LIST
         })
     except Exception as e:
         print(f"Error loading add storage form: {e}")
@@ -149,12 +214,109 @@ async def add_storage(
         )
         
         db.add(storage)
+        db.flush()
+        record_prices(db, [(storage.id, storage.dealer_id, storage.price, storage.tax)], "edit")
         db.commit()
         
         return RedirectResponse(url="/storage", status_code=status.HTTP_303_SEE_OTHER)
+    except IntegrityError as e:
+        db.rollback()
+        print(f"Error adding storage: {e}")
+        flash(request, _duplicate_message(defined_name_with_spec), "error")
+        return RedirectResponse(url="/storage/add", status_code=status.HTTP_303_SEE_OTHER)
     except Exception as e:
+        db.rollback()
         print(f"Error adding storage: {e}")
-        return RedirectResponse(url="/storage", status_code=status.HTTP_303_SEE_OTHER)
+        flash(request, f"Could not add the item: {e}", "error")
+        return RedirectResponse(url="/storage/add", status_code=status.HTTP_303_SEE_OTHER)
+
+@router.get("/import", response_class=HTMLResponse)
+async def import_storage_form(request: Request, db: Session = Depends(get_db)):
+    dealers = get_dealers(db)
+    return templates.TemplateResponse("import_storage.html", {
+        "request": request,
+        "dealers": dealers
+    })
+
+@router.post("/import", response_class=HTMLResponse)
+def import_storage_upload(
+    request: Request,
+    file: UploadFile = File(...),
+    dealer_id: str = Form(None),
+    update_existing: bool = Form(False),
+    db: Session = Depends(get_db)
+):
+    dealers = get_dealers(db)
+    try:
+        dealer_id_int = int(dealer_id) if dealer_id and dealer_id != "None" else None
+        report = import_storage(db, iter_rows(file.file, file.filename), dealer_id_int, update_existing)
+        return templates.TemplateResponse("import_storage.html", {
+            "request": request,
+            "dealers": dealers,
+            "report": report
+        })
+    except Exception as e:
+        print(f"Error importing storage: {e}")
+        return templates.TemplateResponse("import_storage.html", {
+            "request": request,
+            "dealers": dealers,
+            "error": str(e)
+        })
+
+def _price_page(request: Request, db: Session, **context):
+    dealers = get_dealers(db)
+    brands = [b for (b,) in db.query(models.Storage.brand).filter(models.Storage.brand.isnot(None)).distinct().order_by(models.Storage.brand)]
+    return templates.TemplateResponse("storage_prices.html", {
+        "request": request,
+        "dealers": dealers,
+        "brands": brands,
+        **context
+    })
+
+@router.get("/prices", response_class=HTMLResponse)
+async def storage_prices_form(request: Request, db: Session = Depends(get_db)):
+    return _price_page(request, db)
+
+@router.post("/prices/upload", response_class=HTMLResponse)
+def upload_price_list(
+    request: Request,
+    file: UploadFile = File(...),
+    dealer_id: int = Form(...),
+    db: Session = Depends(get_db)
+):
+    try:
+        report = upsert_price_list(db, iter_rows(file.file, file.filename), dealer_id)
+        return _price_page(request, db, report=report)
+    except Exception as e:
+        print(f"Error applying price list: {e}")
+        return _price_page(request, db, error=str(e))
+
+@router.post("/prices/revise", response_class=HTMLResponse)
+def revise_prices_form(
+    request: Request,
+    change_type: str = Form(...),
+    change: float = Form(...),
+    dealer_id: str = Form(None),
+    brand: str = Form(None),
+    hsn_code: str = Form(None),
+    db: Session = Depends(get_db)
+):
+    try:
+        dealer_id_int = int(dealer_id) if dealer_id and dealer_id != "None" else None
+        revised = revise_prices(
+            db,
+            percent=change if change_type == "percent" else None,
+            amount=change if change_type == "amount" else None,
+            dealer_id=dealer_id_int,
+            brand=brand or None,
+            hsn_code=hsn_code or None
+        )
+        db.commit()
+        return _price_page(request, db, revised=revised)
+    except Exception as e:
+        db.rollback()
+        print(f"Error revising prices: {e}")
+        return _price_page(request, db, error=str(e))
 
 @router.get("/edit/{storage_id}", response_class=HTMLResponse)
 async def edit_storage_form(request: Request, storage_id: int, db: Session = Depends(get_db)):
@@ -163,14 +325,13 @@ async def edit_storage_form(request: Request, storage_id: int, db: Session = Dep
         if storage is None:
             return RedirectResponse(url="/storage", status_code=status.HTTP_303_SEE_OTHER)
         
-        dealers = db.query(models.Dealer).all()
-        units_list = ["Nos", "Kgs", "mm", "cm", "liters", "meters", "pieces", "packs"]
+        dealers = get_dealers(db)
         
         return templates.TemplateResponse("edit_storage.html", {
             "request": request, 
             "storage": storage,
             "dealers": dealers,
-            "units_list": units_list
+            "units_list": UNITS_LIST
         })
     except Exception as e:
         print(f"Error loading edit form: {e}")
@@ -204,17 +365,34 @@ async def update_storage(
         storage.brand = brand
         storage.hsn_code = hsn_code
         storage.dealer_id = dealer_id_int
+        price_changed = (storage.price, storage.tax) != (price, tax)
         storage.tax = tax
         storage.price = price
+        stock_changed = storage.current_stock != current_stock
         storage.current_stock = current_stock
         storage.units = units
         
+        if price_changed:
+            record_prices(db, [(storage_id, dealer_id_int, price, tax)], "edit")
+        
+        # Stock arrivals may satisfy BOMs that are still waiting on this item
+        if stock_changed:
+            db.flush()
+            allocate_stock(db, [storage_id])
+        
         db.commit()
         
         return RedirectResponse(url="/storage", status_code=status.HTTP_303_SEE_OTHER)
+    except IntegrityError as e:
+        db.rollback()
+        print(f"Error updating storage: {e}")
+        flash(request, _duplicate_message(defined_name_with_spec), "error")
+        return RedirectResponse(url=f"/storage/edit/{storage_id}", status_code=status.HTTP_303_SEE_OTHER)
     except Exception as e:
+        db.rollback()
         print(f"Error updating storage: {e}")
-        return RedirectResponse(url="/storage", status_code=status.HTTP_303_SEE_OTHER)
+        flash(request, f"Could not update the item: {e}", "error")
+        return RedirectResponse(url=f"/storage/edit/{storage_id}", status_code=status.HTTP_303_SEE_OTHER)
 
 @router.post("/delete/{storage_id}")
 async def delete_storage(storage_id: int, db: Session = Depends(get_db)):
@@ -257,7 +435,7 @@ async def storage_details(request: Request, storage_id: int, db: Session = Depen
 # Add these routes to your storage router
 @router.get("/export", response_class=HTMLResponse)
 async def export_storage_form(request: Request, db: Session = Depends(get_db)):
-    dealers = db.query(models.Dealer).all()
+    dealers = get_dealers(db)
     return templates.TemplateResponse("export_storage.html", {
         "request": request,
         "dealers": dealers
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.database import get_db
+from app.api_read import RowsResponse
+from app.sync import RESOURCES, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, changes_since
+
+router = APIRouter()
+
+
+@router.get("/{resource}")
+def get_changes_api(
+    resource: str,
+    since: Optional[str] = Query(None, description="The next token of the previous response; omit for a full sync"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    include: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Rows of resource created, updated or deleted since a sync token.
+
+    Keep calling with the returned next token while has_more is true;
+    store the last one and send it next time to get only what changed.
+    """
+    if resource not in RESOURCES:
+        raise HTTPException(status_code=404, detail=f"Unknown resource '{resource}'; "
+                                                    f"choose from {', '.join(RESOURCES)}")
+    _, projection = RESOURCES[resource]
+    try:
+        selection = projection.selection(fields, include)
+        return RowsResponse(changes_since(db, resource, since, limit, selection))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional
 from datetime import datetime, date
+import datetime as dt
 
 # Dealer Schemas
 class DealerBase(BaseModel):
@@ -69,6 +70,32 @@ class StorageWithDealer(Storage):
     class Config:
         orm_mode = True
 
+# Mass price revision, e.g. +4% for one dealer and brand
+class PriceRevision(BaseModel):
+    percent: Optional[float] = None
+    amount: Optional[float] = None
+    dealer_id: Optional[int] = None
+    brand: Optional[str] = None
+    hsn_code: Optional[str] = None
+
+class PriceHistoryEntry(BaseModel):
+    price: Optional[float] = None
+    tax: Optional[float] = None
+    dealer_id: Optional[int] = None
+    source: Optional[str] = None
+    po_no: Optional[int] = None
+    recorded_at: datetime
+
+class PriceSummary(BaseModel):
+    storage_id: int
+    dealer_id: Optional[int] = None
+    last: List[PriceHistoryEntry]
+    window_days: int
+    average: Optional[float] = None
+    count: int
+    min: Optional[float] = None
+    max: Optional[float] = None
+
 # Product Schemas
 class ProductBase(BaseModel):
     product_name: str
@@ -223,4 +250,114 @@ class MaterialInward(MaterialInwardBase):
     id: int
 
     class Config:
-        orm_mode = True        
\ No newline at end of file
+        orm_mode = True        
+
+# BOM Schemas
+class BOMBase(BaseModel):
+    product_id: int
+    product_quantity: int = 1
+    consignee: Optional[str] = None
+    priority: Optional[int] = 2
+    due_date: Optional[date] = None
+    notes: Optional[str] = None
+
+class BOMCreate(BOMBase):
+    pass
+
+class BOMMaterial(BaseModel):
+    id: int
+    storage_id: Optional[int] = None
+    quantity_required: Optional[float] = 0
+    quantity_provided: Optional[float] = 0
+    quantity_reserved: Optional[float] = 0
+    is_fully_provided: Optional[bool] = False
+
+    class Config:
+        orm_mode = True
+        from_attributes = True
+
+class BOM(BOMBase):
+    id: int
+    bom_identifier: str
+    status: Optional[str] = None
+    required_total: Optional[float] = 0
+    provided_total: Optional[float] = 0
+    completion_date: Optional[date] = None
+    materials: List[BOMMaterial] = []
+    date: Optional[dt.date] = None
+
+    class Config:
+        orm_mode = True
+        from_attributes = True
+
+class BOMProgress(BaseModel):
+    id: int
+    bom_identifier: str
+    status: Optional[str] = None
+    priority: Optional[int] = None
+    due_date: Optional[date] = None
+    product_name: Optional[str] = None
+    required_total: float = 0
+    provided_total: float = 0
+    progress_percentage: float = 0
+
+class StockAllocationRequest(BaseModel):
+    storage_ids: Optional[List[int]] = None
+
+class BOMSupplyRequest(BaseModel):
+    bom_ids: List[int]
+    notes: Optional[str] = None
+
+
+# Material Outward Schemas
+class MaterialOutwardBase(BaseModel):
+    receiver_section: Optional[str] = None
+    reason: Optional[str] = None
+    date: Optional[dt.date] = None
+
+class MaterialOutwardCreate(MaterialOutwardBase):
+    storage_id: int
+    qty: float = Field(..., gt=0)
+
+class MaterialOutward(MaterialOutwardBase):
+    id: int
+    # Rows issued before storage_id existed have none
+    storage_id: Optional[int] = None
+    qty: Optional[float] = None
+    material_details: Optional[str] = None
+
+    class Config:
+        orm_mode = True
+        from_attributes = True
+
+class MaterialOutwardBulkCreate(BaseModel):
+    items: List[MaterialOutwardCreate]
+    atomic: bool = True  # reject the whole batch if any line is short
+
+
+# Batch API Schemas
+class PurchaseOrderItemCreate(BaseModel):
+    material_id: Optional[int] = None
+    material_name: Optional[str] = None
+    spec: Optional[str] = None
+    brand: Optional[str] = None
+    dealer_name: Optional[str] = None
+    quantity: int = Field(..., gt=0)
+    price: Optional[float] = None
+    unit: Optional[str] = None
+
+class PurchaseOrderWithItemsCreate(PurchaseOrderCreate):
+    items: List[PurchaseOrderItemCreate] = []
+
+class PurchaseOrderWithItemsUpdate(PurchaseOrderUpdate):
+    items: Optional[List[PurchaseOrderItemCreate]] = None  # replaces the lines when given
+
+class BatchOperation(BaseModel):
+    op: str  # create, update or delete
+    resource: str  # see app.batch.RESOURCES
+    id: Optional[int] = None  # required for update and delete
+    data: Optional[dict] = None
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+    atomic: bool = False  # roll everything back if any operation fails
@@ -1,6 +1,8 @@
 from fastapi.templating import Jinja2Templates
 from datetime import datetime
 
+from app.middleware import get_flashed_messages
+
 templates = Jinja2Templates(directory="app/templates")
 
 def format_currency(value):
@@ -25,4 +27,5 @@ def format_date(value, format='%Y-%m-%d'):
 
 # Add filters to templates
 templates.env.filters["currency"] = format_currency
-templates.env.filters["dateformat"] = format_date
\ No newline at end of file
+templates.env.filters["dateformat"] = format_date
+templates.env.globals["get_flashed_messages"] = get_flashed_messages
\ No newline at end of file
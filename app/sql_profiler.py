@@ -0,0 +1,246 @@
+import os
+import re
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# SQL_PROFILER=1 counts, times and groups the statements of every request,
+# reporting repeated shapes (N+1) and slow statements with their plan.
+# SQL_PROFILER_STRICT=1 (for the test suite) also raises on relationship
+# lazy loads and on routes that go over their query budget.
+ENABLED = os.getenv("SQL_PROFILER", "").lower() in ("1", "true", "yes")
+STRICT = os.getenv("SQL_PROFILER_STRICT", "").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "100"))
+# Executions of one statement shape in a request that count as N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+# Query budget for routes without their own; 0 means no limit
+DEFAULT_QUERY_BUDGET = int(os.getenv("SQL_QUERY_BUDGET", "0"))
+
+_WHITESPACE = re.compile(r"\s+")
+_PARAM_LIST = re.compile(r"\((?:\s*(?:\?|%s|:\w+)\s*,)+\s*(?:\?|%s|:\w+)\s*\)")
+
+
+class LazyLoadError(Exception):
+    """Raised in strict mode when a relationship is lazy loaded during a request"""
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised in strict mode when a route runs more statements than its budget"""
+
+
+def query_budget(limit):
+    """Declare the most statements a route may run per request.
+
+    Goes under the router decorator:
+
+        @router.get("/api")
+        @query_budget(3)
+        def list_things(...):
+    """
+    def decorator(func):
+        func.__query_budget__ = limit
+        return func
+    return decorator
+
+
+def statement_shape(statement):
+    """Normalise a statement so executions that differ only in IN-list length group together"""
+    return _PARAM_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class RequestProfile:
+    def __init__(self, scope):
+        self.scope = scope
+        self.count = 0
+        self.total_time = 0.0
+        self.shapes = {}  # shape -> [count, total seconds]
+        self.lazy_loads = {}  # "Model.attribute" -> count
+        self.slow = []
+        self.over_budget_reported = False
+        # Strict mode errors, kept here because routes catch what is raised
+        self.violations = []
+
+    @property
+    def label(self):
+        route = self.scope.get("route")
+        path = getattr(route, "path", None) or self.scope.get("path", "")
+        return f"{self.scope.get('method', '')} {path}"
+
+    @property
+    def budget(self):
+        route = self.scope.get("route")
+        endpoint = getattr(route, "endpoint", None)
+        return getattr(endpoint, "__query_budget__", None) or DEFAULT_QUERY_BUDGET
+
+    def n_plus_one(self):
+        """Statement shapes executed often enough in this request to look like N+1"""
+        return sorted(
+            ((shape, count, total) for shape, (count, total) in self.shapes.items() if count >= N_PLUS_ONE_THRESHOLD),
+            key=lambda item: -item[1],
+        )
+
+    def report(self):
+        budget = self.budget
+        suspects = self.n_plus_one()
+        if not (suspects or self.lazy_loads or (budget and self.count > budget)):
+            return
+        print(f"[sql-profiler] {self.label}: {self.count} statements in {self.total_time * 1000:.1f} ms"
+              + (f" (budget {budget})" if budget else ""))
+        for shape, count, total in suspects:
+            print(f"[sql-profiler]   N+1? {count}x {total * 1000:.1f} ms: {shape[:300]}")
+        for attribute, count in sorted(self.lazy_loads.items(), key=lambda item: -item[1]):
+            print(f"[sql-profiler]   lazy load {attribute} x{count}")
+
+
+_current: ContextVar = ContextVar("sql_profile", default=None)
+
+
+def current_profile():
+    return _current.get()
+
+
+class SQLProfilerMiddleware:
+    """Attach a RequestProfile to each request and report it when the request ends.
+
+    Adds a Server-Timing header with the statement count and time spent
+    in the database up to the start of the response. In strict mode a
+    request that lazy loaded or went over its budget gets a 500 listing
+    the violations instead of its own response: routes render templates
+    inside try/except blocks, so the raised error alone would only turn
+    into an error page with status 200.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope)
+        token = _current.set(profile)
+        replaced = False
+
+        async def send_with_timing(message):
+            nonlocal replaced
+            if replaced:
+                return
+            if message["type"] == "http.response.start":
+                if STRICT and profile.violations:
+                    replaced = True
+                    body = "\n".join(str(v) for v in profile.violations).encode()
+                    await send({"type": "http.response.start", "status": 500, "headers": [
+                        (b"content-type", b"text/plain; charset=utf-8"),
+                        (b"content-length", str(len(body)).encode("latin-1")),
+                    ]})
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                timing = f'db;dur={profile.total_time * 1000:.2f};desc="{profile.count} queries"'
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", timing.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            profile.report()
+        if STRICT and profile.violations and not replaced:
+            # Raised after the response had started (a streamed body)
+            raise profile.violations[0]
+
+
+def _explain(conn, statement, parameters):
+    """Query plan rows for a statement, or [] if it cannot be explained"""
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    # A raw DBAPI cursor, so the plan query is not itself profiled
+    cursor = conn.connection.driver_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return [" ".join(str(col) for col in row) for row in cursor.fetchall()]
+    except Exception as e:
+        return [f"(no plan: {e})"]
+    finally:
+        cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("sql_profiler_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    starts = conn.info.get("sql_profiler_start")
+    if profile is None or not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+
+    profile.count += 1
+    profile.total_time += elapsed
+    shape = statement_shape(statement)
+    tally = profile.shapes.get(shape)
+    if tally is None:
+        profile.shapes[shape] = [1, elapsed]
+    else:
+        tally[0] += 1
+        tally[1] += elapsed
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        plan = _explain(conn, statement, parameters) if not executemany and shape.upper().startswith("SELECT") else []
+        profile.slow.append((shape, elapsed))
+        print(f"[sql-profiler] slow query {elapsed * 1000:.1f} ms in {profile.label}: {shape[:500]}")
+        for line in plan:
+            print(f"[sql-profiler]   plan: {line}")
+
+    budget = profile.budget
+    if budget and profile.count > budget and not profile.over_budget_reported:
+        profile.over_budget_reported = True
+        if STRICT:
+            error = QueryBudgetExceeded(f"{profile.label} ran more than its budget of {budget} statements")
+            profile.violations.append(error)
+            raise error
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None:
+        starts = conn.info.get("sql_profiler_start")
+        if starts:
+            starts.pop()
+
+
+def _check_lazy_load(orm_execute_state):
+    profile = _current.get()
+    if profile is None or not orm_execute_state.is_select:
+        return
+    state = orm_execute_state.lazy_loaded_from
+    if state is None:
+        return
+    # The relationship being loaded is the last element of the load path
+    path = orm_execute_state.loader_strategy_path
+    prop = path[-1] if path is not None and len(path) else None
+    attribute = f"{state.class_.__name__}.{getattr(prop, 'key', '?')}"
+    profile.lazy_loads[attribute] = profile.lazy_loads.get(attribute, 0) + 1
+    if STRICT:
+        error = LazyLoadError(
+            f"{profile.label} lazy loaded {attribute}; load it eagerly with "
+            f"selectinload()/joinedload() or mark the query with raiseload()"
+        )
+        profile.violations.append(error)
+        raise error
+
+
+def instrument(engine):
+    """Profile statements on engine and lazy loads on every Session"""
+    # event.listen does not deduplicate, and the Session listener is global,
+    # so each one is added only if it is not there yet
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+    if not event.contains(Session, "do_orm_execute", _check_lazy_load):
+        event.listen(Session, "do_orm_execute", _check_lazy_load)
@@ -26,17 +26,111 @@ document.addEventListener('DOMContentLoaded', function() {
         })
     })
     
-    // Enable live search
+    // Enable live search; lists with a fragment endpoint swap in just their results
     const searchInputs = document.querySelectorAll('input[type="search"]')
     searchInputs.forEach(input => {
+        if (input.form && input.form.dataset.fragment) {
+            connectLiveSearch(input.form, input)
+            return
+        }
         input.addEventListener('input', debounce(function() {
             if (this.value.length > 2 || this.value.length === 0) {
                 this.form.submit()
             }
         }, 500))
     })
+    
+    // Patch live tables in place from their server-sent event stream
+    document.querySelectorAll('tbody[data-live]').forEach(connectLiveTable)
 })
 
+// Keep a table body current from /live/<board>: each "patch" event replaces
+// the rows of one group (e.g. every row of inward 12) with fresh HTML
+function connectLiveTable(tbody) {
+    const source = new EventSource(tbody.dataset.live)
+    
+    source.addEventListener('patch', function(e) {
+        const patch = JSON.parse(e.data)
+        const template = document.createElement('template')
+        template.innerHTML = patch.html
+        const oldRows = tbody.querySelectorAll(`tr[data-live-group="${patch.group}"]`)
+        let anchor = oldRows.length ? oldRows[0] : null
+        if (!anchor && tbody.dataset.liveInsert === 'top') {
+            anchor = tbody.firstElementChild
+        }
+        if (template.content.childElementCount) {
+            tbody.querySelectorAll('tr[data-live-empty]').forEach(row => row.remove())
+        }
+        tbody.insertBefore(template.content, anchor)
+        oldRows.forEach(row => row.remove())
+    })
+    
+    // The stream fell too far behind to patch
+    source.addEventListener('reload', function() {
+        source.close()
+        window.location.reload()
+    })
+    
+    window.addEventListener('beforeunload', () => source.close())
+}
+
+// Search and page a list through its fragment endpoint (e.g. /storage/rows),
+// replacing only the results; a newer request aborts the one in flight
+function connectLiveSearch(form, input) {
+    const results = document.querySelector(form.dataset.results)
+    let controller = null
+    
+    function load(params) {
+        if (controller) {
+            controller.abort()
+        }
+        controller = new AbortController()
+        const query = new URLSearchParams(params).toString()
+        fetch(`${form.dataset.fragment}?${query}`, { signal: controller.signal })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`${response.status} ${response.statusText}`)
+                }
+                return response.text()
+            })
+            .then(html => {
+                results.innerHTML = html
+                // Keep the address bar in step, so reload and back show the same results
+                history.replaceState(null, '', `${form.getAttribute('action')}?${query}`)
+            })
+            .catch(error => {
+                if (error.name !== 'AbortError') {
+                    showFlashMessage(`Search failed: ${error.message}`, 'danger')
+                }
+            })
+    }
+    
+    input.addEventListener('input', debounce(function() {
+        if (this.value.length > 2 || this.value.length === 0) {
+            load(new FormData(form))
+        }
+    }, 300))
+    
+    form.addEventListener('submit', function(e) {
+        e.preventDefault()
+        load(new FormData(form))
+    })
+    
+    results.addEventListener('click', function(e) {
+        const link = e.target.closest('a[data-page]')
+        if (!link) {
+            return
+        }
+        e.preventDefault()
+        if (link.closest('.disabled')) {
+            return
+        }
+        const params = new FormData(form)
+        params.set('page', link.dataset.page)
+        load(params)
+    })
+}
+
 // Debounce function to limit how often a function can run
 function debounce(func, wait) {
     let timeout
@@ -0,0 +1,115 @@
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import select, update, insert, bindparam, func
+from sqlalchemy.orm import Session
+
+from app import models
+from app.sync import change_seq
+
+
+class InsufficientStockError(Exception):
+    """Raised when taking stock would push one or more storage items below what is reserved for BOMs"""
+
+    def __init__(self, shortages):
+        # shortages maps storage_id -> quantity that could not be taken
+        self.shortages = dict(shortages)
+        detail = ", ".join(f"{sid} (requested {qty})" for sid, qty in self.shortages.items())
+        super().__init__(f"Insufficient unreserved stock for storage item(s) {detail}")
+
+
+_storage = models.Storage.__table__
+_material = models.BOMMaterial.__table__
+
+# Stock held for BOM lines other than the ones being supplied ("own")
+_reserved_by_others = (
+    select(func.coalesce(func.sum(_material.c.quantity_reserved), 0))
+    .where(_material.c.storage_id == _storage.c.id,
+           _material.c.quantity_reserved > 0,
+           _material.c.id.notin_(bindparam("own", expanding=True)))
+    .scalar_subquery()
+)
+
+# Check and decrement in one statement: the row only changes if the stock is
+# still there, net of other BOMs' reservations, when the write lock is held,
+# so concurrent issues cannot interleave a read and a write and oversell.
+_decrement = update(_storage).where(
+    _storage.c.id == bindparam("sid"),
+    _storage.c.current_stock - _reserved_by_others >= bindparam("qty"),
+).values(current_stock=_storage.c.current_stock - bindparam("qty"), change_seq=bindparam("seq"))
+
+
+def take_stock(db: Session, quantities, partial=False, own=()):
+    """Atomically decrement Storage.current_stock for each storage item.
+
+    quantities maps storage_id -> quantity. Stock reserved for open BOMs is
+    not available, except what is reserved for the BOM material ids in own,
+    which the caller is supplying. Without partial, any shortage raises
+    InsufficientStockError and the caller must roll back. With partial,
+    items that could be taken are taken and the shortages are returned.
+    """
+    shortages = {}
+    seq = change_seq(db)
+    own = list(own)
+    for storage_id, qty in quantities.items():
+        if db.execute(_decrement, {"sid": storage_id, "qty": qty, "seq": seq, "own": own}).rowcount != 1:
+            shortages[storage_id] = qty
+    if shortages and not partial:
+        raise InsufficientStockError(shortages)
+    return shortages
+
+
+def issue_materials(db: Session, lines, partial=False):
+    """Issue stock to sections and record MaterialOutward rows in one batch.
+
+    Each line is a dict with storage_id, qty and optionally receiver_section,
+    reason and date. Only stock no BOM has reserved can be issued. Stock is
+    taken before anything is read so the write lock is acquired first, then
+    the outward rows are bulk inserted. With partial, lines whose storage
+    item is short are skipped and returned as rejected instead of failing
+    the whole batch. Returns (outward_ids, rejected_lines).
+    """
+    for line in lines:
+        if not line.get("qty") or line["qty"] <= 0:
+            raise ValueError(f"Quantity for storage item {line.get('storage_id')} must be positive")
+
+    per_storage = defaultdict(float)
+    for line in lines:
+        per_storage[line["storage_id"]] += line["qty"]
+
+    shortages = take_stock(db, per_storage, partial=partial)
+    accepted = [line for line in lines if line["storage_id"] not in shortages]
+    rejected = [line for line in lines if line["storage_id"] in shortages]
+    if not accepted:
+        return [], rejected
+
+    accepted_ids = {line["storage_id"] for line in accepted}
+    names = {
+        row.id: " - ".join(part for part in (row.base_name, row.defined_name_with_spec) if part)
+        for row in db.execute(
+            select(_storage.c.id, _storage.c.base_name, _storage.c.defined_name_with_spec)
+            .where(_storage.c.id.in_(accepted_ids))
+        )
+    }
+
+    today = date.today()
+    outward_ids = db.execute(
+        insert(models.MaterialOutward).returning(models.MaterialOutward.id),
+        [
+            {
+                "storage_id": line["storage_id"],
+                "material_details": names.get(line["storage_id"]),
+                "receiver_section": line.get("receiver_section"),
+                "qty": line["qty"],
+                "date": line.get("date") or today,
+                "reason": line.get("reason"),
+            }
+            for line in accepted
+        ],
+    ).scalars().all()
+
+    # Issued stock is no longer available to BOMs holding reservations on it
+    from app.allocation import allocate_stock
+    allocate_stock(db, accepted_ids)
+
+    return outward_ids, rejected
@@ -0,0 +1,286 @@
+import csv
+import io
+from datetime import datetime
+from itertools import islice
+
+from pydantic import ValidationError
+from sqlalchemy import select, insert
+from sqlalchemy.orm import Session
+
+from app import models
+from app.schemas import StorageCreate
+from app.allocation import allocate_stock
+from app.api_read import IN_BATCH_SIZE
+from app.pricing import record_history
+from app.sync import change_seq
+
+BATCH_SIZE = 5000
+
+# Errors kept in the report; later ones are only counted
+MAX_REPORTED_ERRORS = 1000
+
+STORAGE_FIELDS = list(StorageCreate.model_fields)
+
+# Spreadsheet headers people actually use, mapped to Storage columns
+HEADER_ALIASES = {
+    "name": "base_name",
+    "material": "base_name",
+    "material_name": "base_name",
+    "spec": "defined_name_with_spec",
+    "specification": "defined_name_with_spec",
+    "defined_name": "defined_name_with_spec",
+    "hsn": "hsn_code",
+    "stock": "current_stock",
+    "qty": "current_stock",
+    "unit": "units",
+    "dealer": "dealer_name",
+    "gst": "gst_no",
+    "dealer_gst": "gst_no",
+    "gstin": "gst_no",
+}
+
+
+def _normalise_header(header):
+    key = (header or "").strip().lower().replace(" ", "_").replace("-", "_")
+    return HEADER_ALIASES.get(key, key)
+
+
+def iter_csv_rows(fileobj):
+    """Yield (header, values) rows from a binary CSV file without loading it"""
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.reader(text)
+        header = next(reader, None)
+        if header is None:
+            return
+        yield [_normalise_header(h) for h in header]
+        yield from reader
+    finally:
+        # Leave the underlying upload open for its owner
+        text.detach()
+
+
+def iter_xlsx_rows(fileobj):
+    """Yield rows from the first sheet of an XLSX file in read-only mode"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("XLSX import needs openpyxl; install it or upload a CSV file")
+
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        yield [_normalise_header(str(h) if h is not None else "") for h in header]
+        for row in rows:
+            yield ["" if v is None else v for v in row]
+    finally:
+        workbook.close()
+
+
+def iter_rows(fileobj, filename):
+    if (filename or "").lower().endswith((".xlsx", ".xlsm")):
+        return iter_xlsx_rows(fileobj)
+    return iter_csv_rows(fileobj)
+
+
+class _DealerResolver:
+    """Resolve dealer_id / dealer_name / gst_no columns against one prebuilt map"""
+
+    def __init__(self, db: Session, default_dealer_id=None):
+        dealer = models.Dealer.__table__
+        self.ids = set()
+        self.by_name = {}
+        self.by_gst = {}
+        for d_id, name, gst_no in db.execute(select(dealer.c.id, dealer.c.name, dealer.c.gst_no)):
+            self.ids.add(d_id)
+            if name:
+                self.by_name.setdefault(name.strip().lower(), d_id)
+            if gst_no:
+                self.by_gst.setdefault(gst_no.strip().upper(), d_id)
+        self.default_dealer_id = default_dealer_id
+
+    def resolve(self, record):
+        """Return (dealer_id, error) for a dict of the row's dealer cells"""
+        dealer_id = record.get("dealer_id")
+        if dealer_id not in (None, ""):
+            try:
+                dealer_id = int(float(dealer_id))
+            except (TypeError, ValueError):
+                return None, f"dealer_id '{dealer_id}' is not a number"
+            if dealer_id not in self.ids:
+                return None, f"Dealer {dealer_id} does not exist"
+            return dealer_id, None
+
+        gst_no = str(record.get("gst_no") or "").strip().upper()
+        if gst_no:
+            if gst_no in self.by_gst:
+                return self.by_gst[gst_no], None
+            return None, f"No dealer with GST number {gst_no}"
+
+        name = str(record.get("dealer_name") or "").strip()
+        if name:
+            if name.lower() in self.by_name:
+                return self.by_name[name.lower()], None
+            return None, f"No dealer named '{name}'"
+
+        return self.default_dealer_id, None
+
+
+def _existing_keys(db: Session):
+    """Map (dealer_id, defined_name_with_spec) -> storage id for upserts"""
+    storage = models.Storage.__table__
+    return {
+        (dealer_id, spec): s_id
+        for s_id, dealer_id, spec in db.execute(
+            select(storage.c.id, storage.c.dealer_id, storage.c.defined_name_with_spec)
+            .where(storage.c.defined_name_with_spec.isnot(None))
+        )
+    }
+
+
+def import_storage(db: Session, rows, default_dealer_id=None, update_existing=True, batch_size=BATCH_SIZE):
+    """Create or update Storage items from an iterator of rows.
+
+    The first row is the (normalised) header, the rest are value lists, so a
+    50k line file is never held in memory. Each row is validated against
+    StorageCreate; its dealer is resolved from dealer_id, gst_no or
+    dealer_name (falling back to default_dealer_id). Rows matching an existing
+    item on (dealer_id, defined_name_with_spec) update their non-blank cells,
+    others are inserted; a row repeating an earlier row's key replaces it and
+    counts as an update. Valid rows are written and committed every
+    batch_size rows, so a bad row only costs itself. Returns a report dict
+    whose inserted, updated and failed add up to total.
+    """
+    rows = iter(rows)
+    header = next(rows, None)
+    report = {"total": 0, "inserted": 0, "updated": 0, "failed": 0, "errors": []}
+    if header is None:
+        return report
+
+    missing = [f for f in ("base_name",) if f not in header]
+    if missing:
+        raise ValueError(f"Missing required column(s): {', '.join(missing)}")
+
+    dealers = _DealerResolver(db, default_dealer_id)
+    existing = _existing_keys(db)
+    # Columns an update may touch; the dealer is part of the key
+    update_fields = [f for f in STORAGE_FIELDS if f in header and f not in ("dealer_id",)]
+
+    storage = models.Storage.__table__
+    mark = "%s" if db.get_bind().dialect.paramstyle in ("format", "pyformat") else "?"
+    insert_columns = STORAGE_FIELDS + ["created_at", "updated_at", "change_seq"]
+    # New keys must resolve to updates if the file repeats them in a later batch
+    insert_stmt = insert(storage).returning(
+        storage.c.id, storage.c.dealer_id, storage.c.defined_name_with_spec, storage.c.price
+    )
+    update_sql = (
+        # Blank cells leave the stored value alone
+        f"UPDATE {storage.name} SET {''.join(f'{f} = COALESCE({mark}, {f}), ' for f in update_fields)}"
+        f"updated_at = {mark}, change_seq = {mark} WHERE id = {mark}"
+    )
+
+    def error(line_no, messages, count=1):
+        report["failed"] += count
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": line_no, "errors": messages})
+
+    # Column positions are resolved once; rows are plain lists from here on
+    field_columns = [(f, header.index(f)) for f in STORAGE_FIELDS if f in header and f != "dealer_id"]
+    dealer_columns = [(f, header.index(f)) for f in ("dealer_id", "gst_no", "dealer_name") if f in header]
+    width = len(header)
+
+    line_no = 1
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+
+        now = datetime.now()
+        inserts = {}
+        updates = {}
+        superseded = 0  # rows replaced by a later row with the same key
+        stock_changed = []
+        priced = set()  # updated items whose price or tax the file sets
+        for values in batch:
+            line_no += 1
+            if len(values) < width:
+                values = list(values) + [""] * (width - len(values))
+
+            data = {}
+            for f, i in field_columns:
+                value = values[i]
+                if isinstance(value, str):
+                    value = value.strip()
+                if value is not None and value != "":
+                    data[f] = value
+            dealer_cells = {f: values[i] for f, i in dealer_columns if values[i] not in (None, "")}
+            if not data and not dealer_cells:
+                continue
+            report["total"] += 1
+
+            dealer_id, dealer_error = dealers.resolve(dealer_cells)
+            if dealer_error:
+                error(line_no, [dealer_error])
+                continue
+
+            data["dealer_id"] = dealer_id
+            try:
+                item = StorageCreate(**data)
+            except ValidationError as e:
+                error(line_no, [f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()])
+                continue
+
+            key = (item.dealer_id, item.defined_name_with_spec)
+            s_id = existing.get(key) if item.defined_name_with_spec else None
+            if s_id is not None:
+                if update_existing:
+                    superseded += s_id in updates
+                    updates[s_id] = tuple(getattr(item, f) if f in data else None for f in update_fields) + (now, s_id)
+                    if "current_stock" in data:
+                        stock_changed.append(s_id)
+                    if "price" in data or "tax" in data:
+                        priced.add(s_id)
+                else:
+                    error(line_no, [f"'{item.defined_name_with_spec}' already exists for this dealer"])
+            elif item.defined_name_with_spec and key in inserts and not update_existing:
+                error(line_no, [f"'{item.defined_name_with_spec}' appears more than once for this dealer"])
+            elif item.defined_name_with_spec:
+                # Later duplicates in the same file win over earlier ones
+                superseded += key in inserts
+                inserts[key] = tuple(getattr(item, f) for f in STORAGE_FIELDS) + (now, now)
+            else:
+                inserts[(item.dealer_id, None, line_no)] = tuple(getattr(item, f) for f in STORAGE_FIELDS) + (now, now)
+
+        try:
+            conn = db.connection()
+            seq = change_seq(db)
+            if inserts:
+                inserted = conn.execute(
+                    insert_stmt, [dict(zip(insert_columns, values + (seq,))) for values in inserts.values()]
+                ).all()
+                new_keys = {(dealer_id, spec): s_id for s_id, dealer_id, spec, _ in inserted if spec is not None}
+                priced.update(s_id for s_id, _, _, price in inserted if price is not None)
+            if updates and update_fields:
+                conn.exec_driver_sql(update_sql, [values[:-1] + (seq, values[-1]) for values in updates.values()])
+            # Imported prices belong in the history like any other price change
+            priced = sorted(priced)
+            for start in range(0, len(priced), IN_BATCH_SIZE):
+                record_history(db, "import", now, seq, storage.c.id.in_(priced[start:start + IN_BATCH_SIZE]))
+            if stock_changed:
+                allocate_stock(db, stock_changed)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Error importing storage batch ending at row {line_no}: {e}")
+            error(line_no, [f"Batch ending at this row was not saved: {e}"], len(inserts) + len(updates) + superseded)
+            continue
+
+        report["inserted"] += len(inserts)
+        report["updated"] += len(updates) + superseded
+        if inserts:
+            existing.update(new_keys)
+
+    return report
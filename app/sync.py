@@ -0,0 +1,190 @@
+from datetime import datetime
+from itertools import chain
+
+from sqlalchemy import select, update, insert, and_, or_, literal, union_all, event, inspect
+from sqlalchemy.orm import Session
+
+from app import models
+from app.api_read import STORAGE, DEALER, PURCHASE_ORDER, MATERIAL_INWARD, IN_BATCH_SIZE
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+_counter = models.ChangeCounter.__table__
+_tombstones = models.SyncTombstone.__table__
+
+# resource name -> (model, projection)
+RESOURCES = {
+    "storage": (models.Storage, STORAGE),
+    "dealers": (models.Dealer, DEALER),
+    "purchase_orders": (models.PurchaseOrder, PURCHASE_ORDER),
+    "material_inward": (models.MaterialInward, MATERIAL_INWARD),
+}
+_RESOURCE_BY_MODEL = {model: name for name, (model, _) in RESOURCES.items()}
+# Child rows are synced as part of their parent:
+# (model, parent model, foreign key attribute, relationship to the parent)
+_CHILDREN = {
+    models.PurchaseOrderItem: (models.PurchaseOrder, "po_no", "purchase_order"),
+    models.MaterialInwardItem: (models.MaterialInward, "material_inward_id", "material_inward"),
+    # Shortfalls and their resolutions belong to the inward that came short
+    models.PendingMaterial: (models.MaterialInward, "original_inward_id", "original_inward"),
+    models.PendingMaterialResolution: (models.MaterialInward, "material_inward_id", "material_inward"),
+}
+
+
+def change_seq(db: Session):
+    """The change number of the session's current transaction, taken on first use.
+
+    Every transaction that writes a synced row takes the next number from
+    the one-row change_counter table and stamps it into the rows'
+    change_seq. The counter UPDATE holds the write lock until commit, so
+    numbers become visible in commit order and a client that has read up to
+    N never misses a later commit numbered N or lower.
+
+    ORM writes are stamped by the session events below, and ORM deletes
+    leave a sync_tombstones row. Core statements that write synced tables
+    must set change_seq=change_seq(db) themselves.
+    """
+    seq = db.info.get("change_seq")
+    if seq is None:
+        conn = db.connection()
+        if not conn.execute(update(_counter).where(_counter.c.id == 1).values(value=_counter.c.value + 1)).rowcount:
+            # Databases built with create_all start without the counter row
+            conn.execute(insert(_counter).values(id=1, value=1))
+        seq = db.info["change_seq"] = conn.execute(select(_counter.c.value).where(_counter.c.id == 1)).scalar()
+    return seq
+
+
+def _parent_ids(obj, key, relation):
+    """Ids of the parents a child row belongs to, or belonged to before this flush.
+
+    A child added through the parent's collection (po.items.append(...))
+    has no foreign key until the flush sets it, so parents are also read
+    from the relationship. Parents still pending get stamped as new rows.
+    """
+    state = inspect(obj)
+    ids = {getattr(obj, key)}
+    ids.update(state.attrs[key].history.deleted)
+    for parent in chain(*state.attrs[relation].history):
+        if parent is not None and inspect(parent).identity:
+            ids.add(inspect(parent).identity[0])
+    ids.discard(None)
+    return ids
+
+
+@event.listens_for(Session, "before_flush")
+def _stamp_changes(session, flush_context, instances):
+    seq = None
+    parents = {}
+    for obj in chain(session.new, session.dirty, session.deleted):
+        model = type(obj)
+        if model in _CHILDREN:
+            parent_model, key, relation = _CHILDREN[model]
+            parents.setdefault(parent_model, set()).update(_parent_ids(obj, key, relation))
+            continue
+        if model not in _RESOURCE_BY_MODEL:
+            continue
+        if obj in session.deleted:
+            if obj in session.new:
+                continue
+            seq = seq or change_seq(session)
+            session.connection().execute(insert(_tombstones).values(
+                resource=_RESOURCE_BY_MODEL[model], row_id=inspect(obj).identity[0],
+                change_seq=seq, deleted_at=datetime.now(),
+            ))
+        elif obj in session.new or session.is_modified(obj, include_collections=False):
+            seq = seq or change_seq(session)
+            obj.change_seq = seq
+
+    for parent_model, parent_ids in parents.items():
+        if not parent_ids:
+            continue
+        seq = seq or change_seq(session)
+        table = parent_model.__table__
+        key = list(table.primary_key.columns)[0]
+        session.connection().execute(
+            update(table).where(key.in_(parent_ids)).values(change_seq=seq, updated_at=datetime.now())
+        )
+
+
+@event.listens_for(Session, "after_commit")
+def _end_transaction(session):
+    session.info.pop("change_seq", None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _end_rolled_back(session):
+    session.info.pop("change_seq", None)
+
+
+def parse_token(token):
+    """(change_seq, id) from a sync token; None or "" starts from the beginning"""
+    if not token:
+        return 0, 0
+    try:
+        seq, _, row_id = token.partition("-")
+        return int(seq), int(row_id or 0)
+    except ValueError:
+        raise ValueError(f"Invalid sync token '{token}'")
+
+
+def make_token(seq, row_id):
+    return f"{seq}-{row_id}"
+
+
+def changes_since(db: Session, resource, token=None, limit=DEFAULT_PAGE_SIZE, selection=None):
+    """One page of the change feed for resource after token.
+
+    Live rows and tombstones are merged in (change_seq, id) order, so a page
+    can end in the middle of a large transaction and the next token picks up
+    exactly where it stopped. Returns a dict with the changed rows, the ids
+    deleted, the token to send next time and whether more pages are waiting.
+    """
+    model, projection = RESOURCES[resource]
+    seq, row_id = parse_token(token)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    table = model.__table__
+    key = list(table.primary_key.columns)[0]
+
+    live = select(table.c.change_seq.label("seq"), key.label("row_id"), literal(0).label("deleted")).where(
+        or_(table.c.change_seq > seq, and_(table.c.change_seq == seq, key > row_id))
+    )
+    dead = select(_tombstones.c.change_seq, _tombstones.c.row_id, literal(1)).where(
+        _tombstones.c.resource == resource,
+        or_(_tombstones.c.change_seq > seq, and_(_tombstones.c.change_seq == seq, _tombstones.c.row_id > row_id)),
+    )
+    feed = union_all(live, dead).subquery()
+    page = db.execute(
+        select(feed.c.seq, feed.c.row_id, feed.c.deleted)
+        .order_by(feed.c.seq, feed.c.row_id, feed.c.deleted)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    if selection is None:
+        selection = projection.selection()
+    # Rows are matched to the feed on their key, even if fields= left it out
+    hidden_key = key.key not in selection.fields
+    if hidden_key:
+        selection = selection._replace(fields=(key.key,) + selection.fields)
+    changed_ids = [r_id for _, r_id, deleted in page if not deleted]
+    rows = {}
+    for start in range(0, len(changed_ids), IN_BATCH_SIZE):
+        batch = changed_ids[start:start + IN_BATCH_SIZE]
+        for row in projection.fetch(db, key.in_(batch), selection=selection):
+            rows[row.pop(key.key) if hidden_key else row[key.key]] = row
+
+    if page:
+        next_token = make_token(page[-1][0], page[-1][1])
+    else:
+        next_token = make_token(seq, row_id)
+    return {
+        "resource": resource,
+        # A row can change again after this page was read; it then shows up
+        # in a later page too, which clients apply as a plain upsert
+        "changes": [rows[r_id] for r_id in changed_ids if r_id in rows],
+        "deleted": [r_id for _, r_id, deleted in page if deleted],
+        "next": next_token,
+        "has_more": has_more,
+    }
@@ -0,0 +1,187 @@
+import hashlib
+import os
+import re
+import stat
+import uuid
+from email.utils import formatdate
+from mimetypes import guess_type
+
+import aiofiles
+import aiofiles.os
+from fastapi import UploadFile
+from starlette.responses import Response
+
+UPLOAD_ROOT = os.getenv("UPLOAD_DIR", "uploads")
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(20 * 1024 * 1024)))
+CHUNK_SIZE = 256 * 1024
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds the configured size limit"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        super().__init__(f"File is larger than the {round(limit / (1024 * 1024), 1):g} MB limit")
+
+
+def _extension(filename):
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if re.fullmatch(r"\.[a-z0-9]{1,10}", ext) else ""
+
+
+async def store_upload(upload: UploadFile, namespace, max_size=MAX_UPLOAD_SIZE):
+    """Stream an upload into content-addressed storage and return its path.
+
+    The file is copied in chunks while being hashed, so it is never held in
+    memory, and lands at <root>/<namespace>/ab/cd/<sha256><ext>. Uploading
+    the same content twice stores it once.
+    """
+    if upload.size is not None and upload.size > max_size:
+        raise UploadTooLarge(max_size)
+
+    base = os.path.join(UPLOAD_ROOT, namespace)
+    await aiofiles.os.makedirs(os.path.join(base, "tmp"), exist_ok=True)
+    tmp_path = os.path.join(base, "tmp", f"{uuid.uuid4().hex}.part")
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as out:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge(max_size)
+                digest.update(chunk)
+                await out.write(chunk)
+
+        name = digest.hexdigest()
+        directory = os.path.join(base, name[:2], name[2:4])
+        path = os.path.join(directory, name + _extension(upload.filename))
+        if await aiofiles.os.path.exists(path):
+            await aiofiles.os.remove(tmp_path)
+        else:
+            await aiofiles.os.makedirs(directory, exist_ok=True)
+            await aiofiles.os.replace(tmp_path, path)
+        return path
+    except BaseException:
+        if await aiofiles.os.path.exists(tmp_path):
+            await aiofiles.os.remove(tmp_path)
+        raise
+
+
+def resolve_upload(path):
+    """Absolute path of a stored upload, or None if it is missing or outside the store"""
+    if not path:
+        return None
+    root = os.path.realpath(UPLOAD_ROOT)
+    full = os.path.realpath(path)
+    if os.path.commonpath([root, full]) != root or not os.path.isfile(full):
+        return None
+    return full
+
+
+class UploadResponse(Response):
+    """Serve a stored upload with Range, ETag and zero-copy send support.
+
+    Content-addressed files never change, so the hash in the file name is
+    a strong ETag. Single byte ranges get a 206; multi-range requests get
+    the whole file. When the server offers the ASGI zero-copy send
+    extension the body goes out with sendfile, otherwise it is streamed in
+    chunks.
+    """
+
+    def __init__(self, path, request_headers, filename=None):
+        self.path = path
+        self.request_headers = request_headers
+        self.filename = filename or os.path.basename(path)
+        super().__init__(media_type=guess_type(self.filename)[0] or "application/octet-stream")
+
+    async def __call__(self, scope, receive, send):
+        stat_result = await aiofiles.os.stat(self.path)
+        if not stat.S_ISREG(stat_result.st_mode):
+            raise RuntimeError(f"File at path {self.path} is not a file.")
+        size = stat_result.st_size
+        etag = f'"{os.path.splitext(os.path.basename(self.path))[0]}"'
+
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+            "cache-control": "private, max-age=31536000, immutable",
+            "content-disposition": f'inline; filename="{self.filename}"',
+            "content-type": self.media_type,
+        }
+
+        if self.request_headers.get("if-none-match") == etag:
+            await self._send_head(send, 304, headers)
+            return
+
+        start, end = 0, size - 1
+        status_code = 200
+        range_header = self.request_headers.get("range")
+        if_range = self.request_headers.get("if-range")
+        if range_header and (if_range is None or if_range == etag):
+            match = _RANGE.match(range_header.strip())
+            first, last = match.groups() if match else ("", "")
+            # A malformed or reversed range (bytes=500-100) is invalid, and
+            # an invalid Range header is ignored (RFC 9110 14.2)
+            if (first or last) and not (first and last and int(last) < int(first)):
+                if first:
+                    start = int(first)
+                    end = min(int(last), size - 1) if last else size - 1
+                else:
+                    start = max(size - int(last), 0)
+                if start >= size:
+                    headers["content-range"] = f"bytes */{size}"
+                    headers["content-length"] = "0"
+                    await self._send_head(send, 416, headers)
+                    return
+                status_code = 206
+                headers["content-range"] = f"bytes {start}-{end}/{size}"
+
+        length = end - start + 1 if size else 0
+        headers["content-length"] = str(length)
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()],
+        })
+        if scope.get("method") == "HEAD" or length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.fileno(),
+                    "offset": start,
+                    "count": length,
+                    "more_body": False,
+                })
+            return
+
+        async with aiofiles.open(self.path, "rb") as file:
+            await file.seek(start)
+            remaining = length
+            while remaining:
+                chunk = await file.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def _send_head(self, send, status_code, headers):
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()],
+        })
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -0,0 +1,369 @@
+"""HTTP load benchmark for app.main:app against a seeded dataset.
+
+    python -m benchmarks.load                       # in-process, seeds bench.db if empty
+    BENCH_DATABASE_URL=sqlite:////tmp/big.db python -m benchmarks.load --scale 1
+    python -m benchmarks.load --url http://127.0.0.1:8000 --database sqlite:///bench.db
+    python -m benchmarks.load --save-baseline       # record the current numbers
+
+Each scenario sends --requests requests with --concurrency in flight and
+reports p50/p95/p99 latency and throughput. Results are compared with
+benchmarks/baselines.json; a scenario whose p95 grows, or whose
+throughput drops, by more than --tolerance is a regression and makes
+the run exit non-zero, as does any response that is not what the route
+sends on success (see EXPECTED). Baselines are only meaningful on the machine and
+dataset they were recorded with; the create_po and post_inward scenarios
+add rows, so reseed (delete bench.db) before recording one. sync_batch
+sends BATCH_OPERATIONS storage updates per request where sync_single
+sends one, so compare its req/s times BATCH_OPERATIONS.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import date, datetime
+
+import httpx
+from sqlalchemy import create_engine, func, select
+
+DEFAULT_DATABASE = "sqlite:///bench.db"
+BENCH_DATABASE = os.getenv("BENCH_DATABASE_URL", DEFAULT_DATABASE)
+# app.database reads DATABASE_URL when it is first imported; pointing it at
+# the benchmark database here keeps in-process runs off the real one
+os.environ["DATABASE_URL"] = BENCH_DATABASE
+
+from app import models
+from benchmarks.seed import MATERIALS, seed
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baselines.json")
+DEFAULT_SCALE = 0.05  # list pages render every row, so keep the load dataset modest
+
+SEARCH_TERMS = sorted({name.split()[-1][:4].lower() for name, _, _ in MATERIALS} | {"ss", "m8", "inch", "tata"})
+
+
+class Context:
+    """Ids from the seeded database that scenarios build requests from"""
+
+    def __init__(self, database_url, sample=500, seed=7):
+        engine = create_engine(database_url)
+        storage = models.Storage.__table__
+        order = models.PurchaseOrder.__table__
+        item = models.PurchaseOrderItem.__table__
+        with engine.connect() as conn:
+            self.storage_by_dealer = {}
+            for s_id, dealer_id, base_name, spec, brand, price, unit in conn.execute(
+                select(storage.c.id, storage.c.dealer_id, storage.c.base_name, storage.c.defined_name_with_spec,
+                       storage.c.brand, storage.c.price, storage.c.units)
+                .where(storage.c.dealer_id.isnot(None))
+            ):
+                self.storage_by_dealer.setdefault(dealer_id, []).append((s_id, base_name, spec, brand, price, unit))
+            max_po = conn.execute(select(func.max(order.c.po_no))).scalar() or 0
+            rng = random.Random(seed)
+            po_nos = sorted(rng.sample(range(1, max_po + 1), min(sample, max_po)))
+            self.purchase_orders = {}
+            for po_no, dealer_id, po_date, item_id, quantity in conn.execute(
+                select(order.c.po_no, order.c.dealer_id, order.c.date, item.c.id, item.c.quantity)
+                .join(item, item.c.po_no == order.c.po_no)
+                .where(order.c.po_no.in_(po_nos))
+            ):
+                entry = self.purchase_orders.setdefault(po_no, {"dealer_id": dealer_id, "date": po_date, "items": []})
+                entry["items"].append((item_id, quantity))
+            self.branch_ids = [row[0] for row in conn.execute(select(models.CompanyBranch.__table__.c.id))]
+            self.consignee_ids = [row[0] for row in conn.execute(select(models.Consignee.__table__.c.id))]
+        engine.dispose()
+        self.dealer_ids = sorted(self.storage_by_dealer)
+        self.po_nos = sorted(self.purchase_orders)
+        if not self.dealer_ids or not self.po_nos:
+            raise SystemExit("The benchmark database has no storage items or purchase orders; seed it first")
+
+
+def browse_lists(client, rng, ctx):
+    path = rng.choice([
+        "/storage", "/purchase_orders", "/material_inward", "/dealers", "/products", "/pending_materials",
+        f"/storage?q={rng.choice(SEARCH_TERMS)}", f"/purchase_orders/{rng.choice(ctx.po_nos)}",
+    ])
+    return client.get(path)
+
+
+def live_search(client, rng, ctx):
+    term = rng.choice(SEARCH_TERMS)
+    if rng.random() < 0.5:
+        return client.get("/purchase_orders/search/materials",
+                          params={"q": term, "dealer_id": rng.choice(ctx.dealer_ids)})
+    return client.get("/products/search_materials", params={"q": term})
+
+
+def create_po(client, rng, ctx):
+    dealer_id = rng.choice(ctx.dealer_ids)
+    candidates = ctx.storage_by_dealer[dealer_id]
+    form = {
+        "dealer_id": dealer_id,
+        "invoice_branch_id": rng.choice(ctx.branch_ids) if ctx.branch_ids else "",
+        "consignee_id": rng.choice(ctx.consignee_ids) if ctx.consignee_ids else "",
+        "date": date.today().isoformat(),
+        "status": "Draft",
+        "discount": "0",
+    }
+    for index, (s_id, base_name, spec, brand, price, unit) in enumerate(rng.sample(candidates, min(3, len(candidates)))):
+        form.update({
+            f"items[{index}][material_id]": s_id,
+            f"items[{index}][material_name]": base_name or "",
+            f"items[{index}][spec]": spec or "",
+            f"items[{index}][brand]": brand or "",
+            f"items[{index}][price]": price or 0,
+            f"items[{index}][unit]": unit or "",
+            f"items[{index}][quantity]": rng.randrange(1, 50),
+        })
+    return client.post("/purchase_orders/add", data=form)
+
+
+def post_inward(client, rng, ctx):
+    po_no = rng.choice(ctx.po_nos)
+    po = ctx.purchase_orders[po_no]
+    form = {
+        "po_no": po_no,
+        "po_date": po["date"].isoformat() if po["date"] else "",
+        "date_of_inward": date.today().isoformat(),
+        "bill_no": f"LOAD-{rng.randrange(10 ** 6)}",
+        "bill_date": date.today().isoformat(),
+        "cost": "0",
+        "payment_method": "NEFT",
+    }
+    for index, (item_id, quantity) in enumerate(po["items"]):
+        form.update({
+            f"items[{index}][id]": item_id,
+            f"items[{index}][received]": "on",
+            f"items[{index}][quantity_received]": quantity or 1,
+        })
+    return client.post("/material_inward/add", data=form)
+
+
+def export_pdf(client, rng, ctx):
+    return client.post("/storage/export/pdf",
+                       data={"export_option": "by_dealer", "dealer_id": rng.choice(ctx.dealer_ids)})
+
+
+def _price_update(rng, ctx):
+    dealer_id = rng.choice(ctx.dealer_ids)
+    s_id, base_name, spec, brand, price, unit = rng.choice(ctx.storage_by_dealer[dealer_id])
+    return s_id, {"base_name": base_name, "price": round((price or 10) * rng.uniform(0.95, 1.05), 2)}
+
+
+def sync_single(client, rng, ctx):
+    # What an integration does today: one PUT per changed item
+    s_id, data = _price_update(rng, ctx)
+    return client.put(f"/storage/api/{s_id}", json=data)
+
+
+def sync_batch(client, rng, ctx):
+    # The same updates, BATCH_OPERATIONS to a request
+    operations = []
+    for _ in range(BATCH_OPERATIONS):
+        s_id, data = _price_update(rng, ctx)
+        operations.append({"op": "update", "resource": "storage", "id": s_id, "data": data})
+    return client.post("/api/batch", json={"operations": operations})
+
+
+BATCH_OPERATIONS = 50
+
+# Routes here render error.html (or re-render their form) with a 200 when
+# they fail, so a status check alone would count a broken page as a fast success
+ERROR_MARKERS = ("Oops! Something went wrong.", "Error loading", "Error searching")
+
+
+def _page_ok(response):
+    return response.status_code == 200 and not any(marker in response.text for marker in ERROR_MARKERS)
+
+
+def _redirects_to(prefix, suffix=""):
+    def check(response):
+        location = response.headers.get("location", "")
+        return response.status_code == 303 and location.startswith(prefix) and location.endswith(suffix)
+    return check
+
+
+def _batch_ok(response):
+    return response.status_code == 200 and response.json()["failed"] == 0
+
+
+# request builder -> whether its response is what a working route sends back
+EXPECTED = {
+    browse_lists: _page_ok,
+    live_search: _page_ok,
+    create_po: _redirects_to("/purchase_orders"),
+    post_inward: _redirects_to("/material_inward/", "/add_pending"),
+    export_pdf: lambda response: (response.status_code == 200
+                                  and response.headers.get("content-type", "").startswith("application/pdf")),
+    sync_single: lambda response: response.status_code == 200,
+    sync_batch: _batch_ok,
+}
+
+# name -> [(weight, request builder)]
+SCENARIOS = {
+    "browse_lists": [(1, browse_lists)],
+    "live_search": [(1, live_search)],
+    "create_po": [(1, create_po)],
+    "post_inward": [(1, post_inward)],
+    "export_pdf": [(1, export_pdf)],
+    "mixed": [(50, browse_lists), (30, live_search), (8, create_po), (7, post_inward), (5, export_pdf)],
+    "sync_single": [(1, sync_single)],
+    "sync_batch": [(1, sync_batch)],
+}
+# Slow scenarios run a fraction of --requests so a full run stays in minutes
+REQUEST_SHARE = {"browse_lists": 0.5, "export_pdf": 0.2, "mixed": 0.5}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def run_scenario(client, name, ctx, requests, concurrency, seed):
+    rng = random.Random(f"{seed}:{name}")
+    builders = SCENARIOS[name]
+    weights = [weight for weight, _ in builders]
+    plan = [rng.choices(builders, weights)[0][1] for _ in range(requests)]
+    latencies = []
+    errors = 0
+    queue = iter(plan)
+
+    async def worker():
+        nonlocal errors
+        for builder in queue:
+            started = time.perf_counter()
+            try:
+                response = await builder(client, rng, ctx)
+                if not EXPECTED[builder](response):
+                    errors += 1
+            except (httpx.HTTPError, ValueError, KeyError):
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def compare(results, baselines, tolerance):
+    """Return lines describing each scenario against its baseline, and whether any regressed"""
+    lines = []
+    regressed = False
+    header = f"{'scenario':14} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} {'errors':>7}  vs baseline"
+    lines.append(header)
+    for name, result in results.items():
+        base = baselines.get(name)
+        note = "no baseline"
+        if base:
+            p95_change = (result["p95_ms"] - base["p95_ms"]) / base["p95_ms"] if base["p95_ms"] else 0.0
+            rps_change = ((result["throughput_rps"] - base["throughput_rps"]) / base["throughput_rps"]
+                          if base["throughput_rps"] else 0.0)
+            note = f"p95 {p95_change:+.0%}, req/s {rps_change:+.0%}"
+            if p95_change > tolerance or rps_change < -tolerance:
+                note += "  REGRESSION"
+                regressed = True
+        if result["errors"]:
+            note += f"  ({result['errors']} errors)"
+        lines.append(f"{name:14} {result['p50_ms']:9.1f} {result['p95_ms']:9.1f} {result['p99_ms']:9.1f} "
+                     f"{result['throughput_rps']:8.1f} {result['errors']:7d}  {note}")
+    return lines, regressed
+
+
+def _client(url):
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=120)
+    # Imported here so DATABASE_URL is already pointing at the benchmark database
+    from app.main import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120)
+
+
+async def run(args):
+    ctx = Context(args.database)
+    results = {}
+    async with _client(args.url) as client:
+        for name in args.scenarios:
+            # One untimed request per scenario so first-use costs stay out of the numbers
+            await run_scenario(client, name, ctx, 1, 1, args.seed)
+            requests = max(1, int(args.requests * REQUEST_SHARE.get(name, 1)))
+            results[name] = await run_scenario(client, name, ctx, requests, args.concurrency, args.seed)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP load benchmark for app.main:app")
+    parser.add_argument("--database", default=BENCH_DATABASE,
+                        help="SQLAlchemy URL of the benchmark database (in-process runs: set BENCH_DATABASE_URL)")
+    parser.add_argument("--scale", type=float, default=DEFAULT_SCALE, help="seed scale if the database is empty")
+    parser.add_argument("--url", help="benchmark a running server instead of the app in-process")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative p95/throughput change")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    if not args.url:
+        if args.database != BENCH_DATABASE:
+            parser.error("in-process runs use BENCH_DATABASE_URL; set it instead of --database")
+        engine = create_engine(args.database)
+        models.Base.metadata.create_all(engine)
+        with engine.connect() as conn:
+            empty = not conn.execute(select(func.count()).select_from(models.Storage.__table__)).scalar()
+        engine.dispose()
+        if empty:
+            print(f"Seeding {args.database} at scale {args.scale}")
+            seed(args.database, scale=args.scale)
+
+    results = asyncio.run(run(args))
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    lines, regressed = compare(results, baselines.get("scenarios", {}), args.tolerance)
+    print("\n".join(lines))
+
+    record = {
+        "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        "machine": f"{platform.system()} {platform.machine()} / Python {platform.python_version()}",
+        "database": args.database if not args.url else None,
+        "url": args.url,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "scenarios": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(record, f, indent=2)
+    if args.save_baseline:
+        if baselines.get("scenarios"):
+            # Keep baselines of scenarios that were not run this time
+            record["scenarios"] = {**baselines["scenarios"], **results}
+        with open(args.baseline, "w") as f:
+            json.dump(record, f, indent=2)
+            f.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
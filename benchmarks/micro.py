@@ -0,0 +1,435 @@
+"""Micro-benchmarks for hot functions and the list/search queries.
+
+    python -m benchmarks.micro                          # all benchmarks, all sizes
+    python -m benchmarks.micro -k storage --sizes 1000 10000
+    python -m benchmarks.micro --output before.json
+    python -m benchmarks.micro --output after.json --compare before.json
+
+Query benchmarks run against seeded databases with 1k, 10k and 100k
+storage items (built once with benchmarks.seed and kept in
+--data-dir). Each benchmark is timed over repeated rounds; one extra,
+untimed call runs under tracemalloc for its peak memory. Results are
+written as JSON keyed by "name[size]", so two files from different
+commits can be diffed with --compare.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+DATA_DIR = os.getenv("BENCH_DATA_DIR", "bench-data")
+# app.database builds its engine from DATABASE_URL on import; nothing here
+# uses it, but point it away from the real database anyway
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(DATA_DIR, 'unused.db')}"
+
+from sqlalchemy import create_engine, or_
+from sqlalchemy.orm import sessionmaker, joinedload
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import PlainTextResponse
+
+from typing import List
+
+from pydantic import TypeAdapter
+
+from app import models
+from app.database import create_db_engine
+from app.api_read import STORAGE, PURCHASE_ORDER, dumps
+from app.middleware import FlashMiddleware, encode_messages
+from app.schemas import StorageWithDealer
+from app.pdf_utils import generate_pdf, render_pdf_template
+from app.routers.material_inward import get_po_details
+from app.routers.purchase_orders import number_to_words
+from app.reorder import reorder_suggestions
+from app.stock import issue_materials
+from benchmarks.seed import BASE_COUNTS, START_DATE, DAYS, seed
+
+SIZES = (1000, 10000, 100000)
+# Part of the dataset file names; bump it when benchmarks.seed or the
+# schema changes so stale datasets are rebuilt
+DATASET_VERSION = 2
+# Rendering PDFs is far slower than anything else, so it gets its own sizes
+PDF_SIZES = (10, 100, 500)
+
+
+class Benchmark:
+    def __init__(self, name, setup, sizes, needs_db=False):
+        self.name = name
+        self.setup = setup  # (size, session or None) -> zero-argument callable
+        self.sizes = sizes
+        self.needs_db = needs_db
+
+
+BENCHMARKS = []
+
+
+def benchmark(name, sizes=SIZES, needs_db=False):
+    def decorator(setup):
+        BENCHMARKS.append(Benchmark(name, setup, sizes, needs_db))
+        return setup
+    return decorator
+
+
+def _storage_rows(size):
+    dealer = models.Dealer(id=1, name="Benchmark Traders")
+    return [
+        models.Storage(id=i, base_name=f"Hex Bolt {i}", defined_name_with_spec=f"Hex Bolt M8x{i % 90} SS304",
+                       brand="Tata", hsn_code="7318", dealer=dealer, dealer_id=1, tax=18.0,
+                       price=round(10 + i % 500 * 1.5, 2), current_stock=float(i % 300), units="Nos")
+        for i in range(1, size + 1)
+    ]
+
+
+def _export_context(size):
+    storages = _storage_rows(size)
+    return {
+        "storages": storages,
+        "title": "All Storage Items",
+        "export_date": datetime(2024, 1, 1),
+        "total_count": len(storages),
+        "total_value": sum(s.price * s.current_stock for s in storages),
+    }
+
+
+@benchmark("render_pdf_template", sizes=(100, 1000, 10000))
+def bench_render_pdf_template(size, db):
+    context = _export_context(size)
+    return lambda: render_pdf_template("export_storage_list.html", context)
+
+
+@benchmark("generate_pdf", sizes=PDF_SIZES)
+def bench_generate_pdf(size, db):
+    html = render_pdf_template("export_storage_list.html", _export_context(size))
+    return lambda: generate_pdf(html)
+
+
+@benchmark("number_to_words", sizes=(1000, 10000))
+def bench_number_to_words(size, db):
+    # Spread over every magnitude up to tens of crores
+    values = [(i * 7919 * 104729) % 999999999 for i in range(size)]
+    return lambda: [number_to_words(v) for v in values]
+
+
+@benchmark("purchase_order_totals", sizes=(10, 100, 1000))
+def bench_purchase_order_totals(size, db):
+    po = models.PurchaseOrder(po_no=1, discount=5.0, date=date(2024, 1, 1))
+    po.items = [models.PurchaseOrderItem(id=i, quantity=i % 40 + 1, price=12.5 + i % 17) for i in range(size)]
+
+    def totals():
+        # What the PO pages and generate_po_form read
+        return po.total_quantity, po.subtotal, po.tax_amount, po.discount_amount, po.grand_total
+    return totals
+
+
+@benchmark("get_po_details", needs_db=True)
+def bench_get_po_details(size, db):
+    po_nos = [row[0] for row in db.query(models.PurchaseOrder.po_no).order_by(models.PurchaseOrder.po_no).limit(50)]
+    position = [0]
+
+    def call():
+        position[0] = (position[0] + 1) % len(po_nos)
+        result = get_po_details(po_nos[position[0]], db)
+        db.expunge_all()
+        return result
+    return call
+
+
+def _query_benchmark(name, build):
+    @benchmark(name, needs_db=True)
+    def setup(size, db):
+        def run():
+            result = build(db).all()
+            db.expunge_all()
+            return result
+        return run
+    return setup
+
+
+# The queries the list and search pages run
+_query_benchmark("query.storage_list", lambda db: db.query(models.Storage))
+_query_benchmark("query.storage_search", lambda db: db.query(models.Storage).filter(
+    models.Storage.base_name.ilike("%bolt%") |
+    models.Storage.defined_name_with_spec.ilike("%bolt%") |
+    models.Storage.brand.ilike("%bolt%")
+))
+_query_benchmark("query.po_material_search", lambda db: db.query(models.Storage).filter(
+    or_(models.Storage.defined_name_with_spec.ilike("%m8%"), models.Storage.base_name.ilike("%m8%")),
+    models.Storage.dealer_id == 1,
+).limit(20))
+_query_benchmark("query.purchase_order_list", lambda db: db.query(models.PurchaseOrder).options(
+    joinedload(models.PurchaseOrder.dealer),
+    joinedload(models.PurchaseOrder.invoice_branch),
+    joinedload(models.PurchaseOrder.items),
+).order_by(models.PurchaseOrder.po_no.desc()))
+_query_benchmark("query.material_inward_list", lambda db: db.query(models.MaterialInward).options(
+    joinedload(models.MaterialInward.items).joinedload(models.MaterialInwardItem.po_item),
+    joinedload(models.MaterialInward.pending_materials_list),
+    joinedload(models.MaterialInward.resolution_history),
+).order_by(models.MaterialInward.id.desc()))
+_query_benchmark("query.pending_materials", lambda db: db.query(models.PendingMaterial).filter(
+    models.PendingMaterial.status.in_(["pending", "partially_resolved"])
+))
+_query_benchmark("query.dealer_list", lambda db: db.query(models.Dealer))
+
+
+@benchmark("api.storage_list_orm", needs_db=True)
+def bench_api_storage_list_orm(size, db):
+    # The /storage/api read path before api_read: ORM instances, a lazy load
+    # per dealer, then FastAPI's response_model validation and json.dumps
+    adapter = TypeAdapter(List[StorageWithDealer])
+
+    def call():
+        result = []
+        for storage in db.query(models.Storage).limit(size).all():
+            storage_dict = storage.__dict__
+            if storage.dealer:
+                storage_dict["dealer_name"] = storage.dealer.name
+                storage_dict["dealer"] = {"id": storage.dealer.id, "name": storage.dealer.name}
+            result.append(storage_dict)
+        body = json.dumps(adapter.dump_python(adapter.validate_python(result), mode="json")).encode()
+        db.expunge_all()
+        return body
+    return call
+
+
+@benchmark("api.storage_list", needs_db=True)
+def bench_api_storage_list(size, db):
+    return lambda: dumps(STORAGE.fetch(db, limit=size))
+
+
+@benchmark("api.storage_list_narrow", needs_db=True)
+def bench_api_storage_list_narrow(size, db):
+    # ?fields=id,base_name,current_stock&include=
+    selection = STORAGE.selection("id,base_name,current_stock", "")
+    return lambda: dumps(STORAGE.fetch(db, selection=selection, limit=size))
+
+
+@benchmark("api.purchase_order_list", needs_db=True)
+def bench_api_purchase_order_list(size, db):
+    return lambda: dumps(PURCHASE_ORDER.fetch(db, limit=size))
+
+
+@benchmark("reorder.suggestions", needs_db=True)
+def bench_reorder_suggestions(size, db):
+    # The seeded history ends DAYS after START_DATE
+    today = START_DATE + timedelta(days=DAYS)
+    return lambda: reorder_suggestions(db, today=today)
+
+
+ISSUES_PER_THREAD = 100
+
+
+@benchmark("stock.concurrent_issues", sizes=(1, 8))
+def bench_concurrent_issues(size, db):
+    # `size` threads each commit ISSUES_PER_THREAD one-unit issues of the
+    # same item, as in test_material_outward; requests/s is
+    # size * ISSUES_PER_THREAD / median
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, "micro-issues.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    engine = create_db_engine(f"sqlite:///{path}", journal_mode="WAL")
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with Session() as setup_db:
+        setup_db.add(models.Storage(id=1, base_name="Bolt", defined_name_with_spec="M8", current_stock=10 ** 9))
+        setup_db.commit()
+
+    def worker():
+        with Session() as session:
+            for _ in range(ISSUES_PER_THREAD):
+                issue_materials(session, [{"storage_id": 1, "qty": 1}])
+                session.commit()
+
+    def issue():
+        threads = [threading.Thread(target=worker) for _ in range(size)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    return issue
+
+
+async def _plain_app(scope, receive, send):
+    await PlainTextResponse("ok")(scope, receive, send)
+
+
+class _PassthroughMiddleware(BaseHTTPMiddleware):
+    # What the old BaseHTTPMiddleware-based FlashMiddleware cost before doing any work
+    async def dispatch(self, request, call_next):
+        return await call_next(request)
+
+
+def _middleware_benchmark(name, app, cookie=None):
+    headers = [(b"host", b"bench")]
+    if cookie:
+        headers.append((b"cookie", b"flash=" + cookie))
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": "/", "raw_path": b"/", "root_path": "", "query_string": b"",
+             "headers": headers, "client": ("127.0.0.1", 1), "server": ("bench", 80)}
+
+    async def send(message):
+        pass
+
+    @benchmark(name, sizes=(1000,))
+    def setup(size, db):
+        async def requests():
+            for _ in range(size):
+                received = []
+
+                async def receive():
+                    # Like a server: the body once, then wait for a disconnect that never comes
+                    if received:
+                        await asyncio.Event().wait()
+                    received.append(True)
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                await app(dict(scope), receive, send)
+        loop = asyncio.new_event_loop()
+        return lambda: loop.run_until_complete(requests())
+    return setup
+
+
+# Per-request middleware cost, `size` requests per round
+_middleware_benchmark("middleware.none", _plain_app)
+_middleware_benchmark("middleware.base_http", _PassthroughMiddleware(_plain_app))
+_middleware_benchmark("middleware.flash", FlashMiddleware(_plain_app))
+_middleware_benchmark("middleware.flash_cookie", FlashMiddleware(_plain_app),
+                      cookie=encode_messages([("success", "Purchase order created")]))
+
+
+def dataset_url(size, data_dir=DATA_DIR):
+    """Seeded database with `size` storage items, built on first use"""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"micro-v{DATASET_VERSION}-{size}.db")
+    url = f"sqlite:///{path}"
+    if not os.path.exists(path):
+        print(f"Seeding {path}")
+        seed(url, scale=size / BASE_COUNTS["storage"])
+    return url
+
+
+def measure(func, min_time=0.5, min_rounds=3, max_rounds=1000):
+    """Time func over repeated rounds and take the peak memory of one more call"""
+    func()  # warm up caches and compiled statements
+    times = []
+    started = time.perf_counter()
+    while len(times) < min_rounds or (time.perf_counter() - started < min_time and len(times) < max_rounds):
+        gc.disable()
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+        gc.enable()
+
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "rounds": len(times),
+        "min_ms": round(min(times) * 1000, 4),
+        "median_ms": round(statistics.median(times) * 1000, 4),
+        "mean_ms": round(statistics.fmean(times) * 1000, 4),
+        "stdev_ms": round(statistics.stdev(times) * 1000, 4) if len(times) > 1 else 0.0,
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(selected, sizes=None, min_time=0.5, data_dir=DATA_DIR):
+    results = {}
+    sessions = {}
+    try:
+        for bench in selected:
+            for size in bench.sizes:
+                if sizes and size not in sizes:
+                    continue
+                db = None
+                if bench.needs_db:
+                    if size not in sessions:
+                        engine = create_engine(dataset_url(size, data_dir))
+                        sessions[size] = sessionmaker(bind=engine)()
+                    db = sessions[size]
+                key = f"{bench.name}[{size}]"
+                results[key] = measure(bench.setup(size, db), min_time=min_time)
+                r = results[key]
+                print(f"{key:40} median {r['median_ms']:10.3f} ms  min {r['min_ms']:10.3f} ms  "
+                      f"peak {r['peak_kib']:10.1f} KiB  ({r['rounds']} rounds)")
+    finally:
+        for db in sessions.values():
+            bind = db.get_bind()
+            db.close()
+            bind.dispose()
+    return results
+
+
+def compare(results, previous, threshold=0.1):
+    """Lines comparing median time and peak memory with an earlier results file"""
+    lines = [f"{'benchmark':40} {'median':>12} {'change':>8} {'peak KiB':>12} {'change':>8}"]
+    for key, result in results.items():
+        before = previous.get(key)
+        if not before:
+            lines.append(f"{key:40} {result['median_ms']:12.3f} {'new':>8} {result['peak_kib']:12.1f}")
+            continue
+        time_change = (result["median_ms"] - before["median_ms"]) / before["median_ms"] if before["median_ms"] else 0
+        mem_change = (result["peak_kib"] - before["peak_kib"]) / before["peak_kib"] if before["peak_kib"] else 0
+        flag = "  slower" if time_change > threshold else "  faster" if time_change < -threshold else ""
+        lines.append(f"{key:40} {result['median_ms']:12.3f} {time_change:+8.0%} "
+                     f"{result['peak_kib']:12.1f} {mem_change:+8.0%}{flag}")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for hot functions and queries")
+    parser.add_argument("-k", dest="keyword", help="only run benchmarks whose name contains this")
+    parser.add_argument("--sizes", type=int, nargs="+", help="only run these data sizes")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds to spend timing each case")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="where the seeded databases are kept")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="compare with an earlier JSON results file")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks and exit")
+    args = parser.parse_args(argv)
+
+    selected = [b for b in BENCHMARKS if not args.keyword or args.keyword in b.name]
+    if args.list:
+        for bench in selected:
+            print(f"{bench.name:32} sizes {', '.join(map(str, bench.sizes))}")
+        return 0
+
+    results = run(selected, args.sizes, args.min_time, args.data_dir)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "commit": _git_commit(),
+                "recorded_at": datetime.now().isoformat(timespec="seconds"),
+                "machine": f"{platform.system()} {platform.machine()} / Python {platform.python_version()}",
+                "results": results,
+            }, f, indent=2)
+            f.write("\n")
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f).get("results", {})
+        print("\n".join(compare(results, previous)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
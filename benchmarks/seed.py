@@ -0,0 +1,344 @@
+"""Generate a large, referentially consistent dataset for benchmarking.
+
+    python -m benchmarks.seed --database sqlite:///bench.db --scale 1 --seed 42 --reset
+
+Scale 1 is about 1.2 million rows (50k storage items, 50k purchase
+orders with 400k lines, their inwards, pending materials and
+resolutions, the matching price history, and 200k material outwards). The same seed and scale always produce the
+same rows, ids included, so numbers from different runs are comparable.
+Rows go in through DBAPI executemany in large batches.
+"""
+import argparse
+import random
+import string
+import sys
+import time
+from datetime import date, datetime, timedelta, time as dt_time
+
+from sqlalchemy import create_engine, func, select
+
+from app import models
+
+BATCH_SIZE = 20000
+
+# Row counts at scale 1
+BASE_COUNTS = {
+    "dealers": 500,
+    "company_branches": 5,
+    "consignees": 50,
+    "storage": 50000,
+    "products": 2000,
+    "purchase_orders": 50000,
+    "outwards": 200000,
+}
+MATERIALS_PER_PRODUCT = (3, 15)
+ITEMS_PER_PO = (3, 13)
+INWARD_SHARE = 0.8  # purchase orders that have been received
+SHORT_SHARE = 0.1  # received lines that came in short
+RESOLVED_SHARE = 0.5  # shortfalls later resolved
+
+START_DATE = date(2023, 1, 1)
+DAYS = 730
+
+CITIES = [
+    ("Mumbai", "Maharashtra", "27"), ("Pune", "Maharashtra", "27"), ("Chennai", "Tamil Nadu", "33"),
+    ("Coimbatore", "Tamil Nadu", "33"), ("Bengaluru", "Karnataka", "29"), ("Hyderabad", "Telangana", "36"),
+    ("Ahmedabad", "Gujarat", "24"), ("Surat", "Gujarat", "24"), ("Delhi", "Delhi", "07"),
+    ("Kolkata", "West Bengal", "19"), ("Jaipur", "Rajasthan", "08"), ("Ludhiana", "Punjab", "03"),
+]
+DEALER_WORDS = ["Sri", "Balaji", "Ganesh", "National", "Bharat", "Star", "Royal", "United", "Modern", "Precision"]
+DEALER_KINDS = ["Traders", "Enterprises", "Industries", "Agencies", "Hardware", "Electricals", "Steels", "Suppliers"]
+MATERIALS = [
+    ("Hex Bolt", "M{0}x{1} SS304", "7318"), ("Hex Nut", "M{0} Gr 8.8", "7318"), ("Washer", "M{0} Spring", "7318"),
+    ("Copper Cable", "{0} sqmm {1}m", "8544"), ("GI Pipe", "{0} inch Class {1}", "7306"),
+    ("Ball Valve", "{0} inch PN{1}", "8481"), ("Ball Bearing", "62{0}{1} ZZ", "8482"),
+    ("Induction Motor", "{0} HP {1} RPM", "8501"), ("MCB", "{0}A {1}P", "8536"), ("Relay", "{0}V {1}A", "8536"),
+    ("MS Sheet", "{0}mm x {1}mm", "7208"), ("SS Rod", "{0}mm dia {1}mm", "7222"), ("V Belt", "B{0}{1}", "4010"),
+    ("Paint", "{0}L Grade {1}", "3208"), ("Grease", "{0}kg EP{1}", "3403"),
+]
+BRANDS = ["Tata", "JSW", "Havells", "Polycab", "SKF", "Siemens", "ABB", "L&T", "Kirloskar", "Asian Paints", "Finolex"]
+UNITS = ["Nos", "Kgs", "meters", "liters", "pieces", "packs"]
+TAX_RATES = [5.0, 12.0, 18.0, 28.0]
+SECTIONS = ["Assembly", "Fabrication", "Electrical", "Machining", "Paint Shop", "Maintenance"]
+PAYMENT_METHODS = ["NEFT", "RTGS", "Cheque", "Credit"]
+
+
+def _gst_no(rng, state_code):
+    letters = "".join(rng.choice(string.ascii_uppercase) for _ in range(5))
+    return f"{state_code}{letters}{rng.randrange(1000, 9999)}{rng.choice(string.ascii_uppercase)}1Z{rng.randrange(10)}"
+
+
+def _day(rng, low=0, high=DAYS):
+    return START_DATE + timedelta(days=rng.randrange(low, high))
+
+
+class Seeder:
+    def __init__(self, conn, seed, scale, batch_size=BATCH_SIZE):
+        self.conn = conn
+        self.rng = random.Random(seed)
+        self.counts = {name: max(1, int(count * scale)) for name, count in BASE_COUNTS.items()}
+        self.batch_size = batch_size
+        self.mark = "%s" if conn.dialect.paramstyle in ("format", "pyformat") else "?"
+        self.report = {}
+
+    def insert(self, model, columns, rows):
+        """executemany rows (tuples in column order) into model's table in batches"""
+        table = model.__table__
+        sql = f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join([self.mark] * len(columns))})"
+        started = time.perf_counter()
+        batch = []
+        total = 0
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.conn.exec_driver_sql(sql, batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            self.conn.exec_driver_sql(sql, batch)
+            total += len(batch)
+        self.report[table.name] = (total, time.perf_counter() - started)
+
+    def run(self):
+        self.seed_dealers()
+        self.seed_branches_and_consignees()
+        self.seed_storage()
+        self.seed_products()
+        self.seed_purchase_orders()
+        self.seed_inwards()
+        self.seed_outwards()
+        return self.report
+
+    def seed_dealers(self):
+        rng = self.rng
+        self.dealers = []
+        rows = []
+        for d_id in range(1, self.counts["dealers"] + 1):
+            city, state, code = rng.choice(CITIES)
+            name = f"{rng.choice(DEALER_WORDS)} {rng.choice(DEALER_KINDS)} {d_id}"
+            self.dealers.append(name)
+            rows.append((
+                d_id, name, f"{rng.randrange(1, 400)}, Industrial Estate", city, state, "India",
+                str(rng.randrange(400000, 700000)), f"0{rng.randrange(20, 80)}-{rng.randrange(2000000, 9999999)}",
+                f"9{rng.randrange(100000000, 999999999)}", f"sales{d_id}@example.com", _gst_no(rng, code),
+                "State Bank of India", str(rng.randrange(10 ** 10, 10 ** 11)), f"SBIN000{rng.randrange(1000, 9999)}",
+            ))
+        self.insert(models.Dealer, [
+            "id", "name", "address", "city", "state", "country", "pincode", "telephone", "mobile", "email",
+            "gst_no", "bank_name", "account_no", "ifsc_code",
+        ], rows)
+
+    def seed_branches_and_consignees(self):
+        rng = self.rng
+        columns = ["id", "company_name", "branch_name", "address", "city", "state", "pincode",
+                   "gst_no", "state_code", "email", "branch_indicator"]
+
+        def rows(count, company):
+            for i in range(1, count + 1):
+                city, state, code = rng.choice(CITIES)
+                yield (
+                    i, company, f"{city} {i}", f"Plot {rng.randrange(1, 200)}, MIDC", city, state,
+                    str(rng.randrange(400000, 700000)), _gst_no(rng, code), code, f"branch{i}@example.com",
+                    string.ascii_uppercase[i % 26],
+                )
+
+        self.insert(models.CompanyBranch, columns, rows(self.counts["company_branches"], "Example Engineering Pvt Ltd"))
+        self.insert(models.Consignee, columns, rows(self.counts["consignees"], "Example Projects Ltd"))
+
+    def seed_storage(self):
+        rng = self.rng
+        now = datetime.combine(START_DATE, dt_time.min)
+        self.storage = []  # index s_id - 1 -> (dealer_id, base_name, spec, brand, price, unit)
+        self.storage_by_dealer = {}
+        rows = []
+        for s_id in range(1, self.counts["storage"] + 1):
+            dealer_id = rng.randrange(1, self.counts["dealers"] + 1)
+            base_name, spec_format, hsn_code = rng.choice(MATERIALS)
+            # The id keeps (dealer, spec) unique, as uq_storage_dealer_spec requires
+            spec = f"{base_name} {spec_format.format(rng.randrange(2, 60), rng.randrange(1, 9) * 10)} #{s_id}"
+            brand = rng.choice(BRANDS)
+            price = round(rng.lognormvariate(5, 1.2), 2)
+            unit = rng.choice(UNITS)
+            self.storage.append((dealer_id, base_name, spec, brand, price, unit))
+            self.storage_by_dealer.setdefault(dealer_id, []).append(s_id)
+            rows.append((
+                s_id, base_name, spec, brand, hsn_code, dealer_id, rng.choice(TAX_RATES), price,
+                float(rng.randrange(0, 500)), unit, now, now,
+            ))
+        self.insert(models.Storage, [
+            "id", "base_name", "defined_name_with_spec", "brand", "hsn_code", "dealer_id", "tax", "price",
+            "current_stock", "units", "created_at", "updated_at",
+        ], rows)
+
+    def seed_products(self):
+        rng = self.rng
+        now = datetime.combine(START_DATE, dt_time.min)
+        products = []
+        materials = []
+        for p_id in range(1, self.counts["products"] + 1):
+            section = rng.choice(SECTIONS)
+            products.append((p_id, f"Assembly {p_id:05d}", f"{section} assembly, revision {rng.randrange(1, 6)}",
+                             section, now, now))
+            count = min(rng.randrange(*MATERIALS_PER_PRODUCT), self.counts["storage"])
+            for s_id in rng.sample(range(1, self.counts["storage"] + 1), count):
+                materials.append((p_id, s_id, rng.randrange(1, 20)))
+        self.insert(models.Product, ["id", "product_name", "product_description", "section_name",
+                                     "created_at", "updated_at"], products)
+        self.insert(models.ProductMaterial, ["product_id", "storage_id", "quantity_needed"], materials)
+
+    def seed_purchase_orders(self):
+        rng = self.rng
+        dealer_ids = sorted(self.storage_by_dealer)
+        orders = []
+        items = []
+        history = []
+        self.po_items = {}  # po_no -> [(item_id, s_id, quantity, price)]
+        self.po_dates = {}
+        item_id = 0
+        for po_no in range(1, self.counts["purchase_orders"] + 1):
+            dealer_id = rng.choice(dealer_ids)
+            po_date = _day(rng)
+            self.po_dates[po_no] = (dealer_id, po_date)
+            orders.append((
+                po_no, dealer_id, po_date, rng.choice(["Draft", "Sent", "Sent", "Completed"]),
+                None, rng.choice([0.0, 0.0, 0.0, 2.5, 5.0]),
+                rng.randrange(1, self.counts["company_branches"] + 1),
+                rng.randrange(1, self.counts["consignees"] + 1),
+            ))
+            candidates = self.storage_by_dealer[dealer_id]
+            lines = []
+            for s_id in rng.sample(candidates, min(rng.randrange(*ITEMS_PER_PO), len(candidates))):
+                item_id += 1
+                _, base_name, spec, brand, list_price, unit = self.storage[s_id - 1]
+                quantity = rng.randrange(1, 200)
+                # Agreed prices drift around the list price
+                price = round(list_price * rng.uniform(0.85, 1.15), 2)
+                lines.append((item_id, s_id, quantity, price))
+                items.append((item_id, po_no, s_id, base_name, spec, brand, self.dealers[dealer_id - 1],
+                              quantity, price, unit))
+                history.append((s_id, dealer_id, price, "purchase_order", po_no,
+                                datetime.combine(po_date, dt_time.min)))
+            self.po_items[po_no] = lines
+        self.insert(models.PurchaseOrder, ["po_no", "dealer_id", "date", "status", "notes", "discount",
+                                           "invoice_branch_id", "consignee_id"], orders)
+        self.insert(models.PurchaseOrderItem, ["id", "po_no", "material_id", "material_name", "spec", "brand",
+                                               "dealer_name", "quantity", "price", "unit"], items)
+        self.insert(models.PriceHistory, ["storage_id", "dealer_id", "price", "source", "po_no", "recorded_at"],
+                    history)
+
+    def seed_inwards(self):
+        rng = self.rng
+        inwards = []
+        inward_items = []
+        pending = []
+        resolutions = []
+        inward_id = inward_item_id = pending_id = resolution_id = 0
+        for po_no, lines in self.po_items.items():
+            if rng.random() >= INWARD_SHARE:
+                continue
+            dealer_id, po_date = self.po_dates[po_no]
+            inward_id += 1
+            inward_date = po_date + timedelta(days=rng.randrange(3, 45))
+            cost = 0.0
+            short = False
+            for item_id, s_id, quantity, price in lines:
+                _, base_name, spec, brand, _, unit = self.storage[s_id - 1]
+                received = quantity
+                if rng.random() < SHORT_SHARE:
+                    received = rng.randrange(0, quantity)
+                cost += received * price
+                inward_item_id += 1
+                inward_items.append((inward_item_id, inward_id, item_id, base_name, spec, brand, quantity,
+                                     received, unit, "completed" if received == quantity else "partial"))
+                if received == quantity:
+                    continue
+
+                short = True
+                pending_id += 1
+                shortfall = quantity - received
+                status = "pending"
+                if rng.random() < RESOLVED_SHARE:
+                    resolved = rng.randrange(1, shortfall + 1)
+                    resolution_id += 1
+                    resolutions.append((resolution_id, inward_id, pending_id,
+                                        inward_date + timedelta(days=rng.randrange(1, 60)),
+                                        f"RB-{resolution_id:06d}", resolved, None, "Balance supplied"))
+                    received += resolved
+                    status = "resolved" if received == quantity else "partially_resolved"
+                pending.append((pending_id, po_no, item_id, base_name, spec, brand, quantity, received,
+                                quantity - received, unit, status, inward_id))
+
+            inwards.append((inward_id, po_no, self.dealers[dealer_id - 1], po_date, inward_date,
+                            f"B-{inward_id:06d}", inward_date - timedelta(days=rng.randrange(0, 5)),
+                            round(cost, 2), rng.choice(PAYMENT_METHODS), "partial" if short else "completed", False))
+
+        self.insert(models.MaterialInward, ["id", "po_no", "dealer_name", "po_date", "date_of_inward", "bill_no",
+                                            "bill_date", "cost", "payment_method", "status", "is_pending_inward"],
+                    inwards)
+        self.insert(models.MaterialInwardItem, ["id", "material_inward_id", "po_item_id", "material_name", "spec",
+                                                "brand", "ordered_quantity", "quantity_received", "unit", "status"],
+                    inward_items)
+        self.insert(models.PendingMaterial, ["id", "po_no", "po_item_id", "material_name", "spec", "brand",
+                                             "ordered_quantity", "received_quantity", "pending_quantity", "unit",
+                                             "status", "original_inward_id"], pending)
+        self.insert(models.PendingMaterialResolution, ["id", "material_inward_id", "pending_material_id",
+                                                       "resolution_date", "resolution_bill_no", "resolved_quantity",
+                                                       "proof_document_path", "notes"], resolutions)
+
+    def seed_outwards(self):
+        rng = self.rng
+        storage_count = self.counts["storage"]
+        # A tenth of the items move most of the stock
+        fast_movers = max(1, storage_count // 10)
+        rows = []
+        for outward_id in range(1, self.counts["outwards"] + 1):
+            s_id = rng.randrange(1, fast_movers + 1) if rng.random() < 0.7 else rng.randrange(1, storage_count + 1)
+            _, _, spec, _, _, _ = self.storage[s_id - 1]
+            rows.append((outward_id, s_id, spec, rng.choice(SECTIONS), float(rng.randrange(1, 40)),
+                         _day(rng), "Production"))
+        self.insert(models.MaterialOutward, ["id", "storage_id", "material_details", "receiver_section", "qty",
+                                             "date", "reason"], rows)
+
+
+def seed(database_url, scale=1.0, seed=42, reset=False, batch_size=BATCH_SIZE):
+    """Build the dataset in database_url and return {table: (rows, seconds)}"""
+    engine = create_engine(database_url)
+    if reset:
+        models.Base.metadata.drop_all(engine)
+    models.Base.metadata.create_all(engine)
+
+    with engine.begin() as conn:
+        if conn.execute(select(func.count()).select_from(models.Dealer.__table__)).scalar():
+            raise SystemExit("The database already has data; use --reset to rebuild it")
+        if conn.dialect.name == "sqlite":
+            # Only for the duration of the load; a crash means reseeding anyway
+            conn.exec_driver_sql("PRAGMA synchronous = OFF")
+            conn.exec_driver_sql("PRAGMA cache_size = -200000")
+        report = Seeder(conn, seed, scale, batch_size).run()
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as conn:
+            conn.exec_driver_sql("ANALYZE")
+    engine.dispose()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--database", default="sqlite:///bench.db", help="SQLAlchemy URL to seed")
+    parser.add_argument("--scale", type=float, default=1.0, help="1.0 is about a million rows")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="drop and recreate all tables first")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    report = seed(args.database, args.scale, args.seed, args.reset, args.batch_size)
+    total = 0
+    for table, (rows, seconds) in report.items():
+        total += rows
+        print(f"{table:30} {rows:>10,} rows  {seconds:7.2f} s")
+    print(f"{'total':30} {total:>10,} rows  {time.perf_counter() - started:7.2f} s")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
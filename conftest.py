@@ -0,0 +1,49 @@
+import os
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+# app.database builds its engine from DATABASE_URL on first import; keep the
+# tests, and app.main when one imports it, off the real inventory.db
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'inventory-tests.db')}")
+
+from app.database import create_db_engine, get_db
+from app import models
+
+
+@pytest.fixture
+def journal_mode():
+    """Override in a module that needs another SQLite journal mode, e.g. WAL"""
+    return None
+
+
+@pytest.fixture
+def tmp_engine(tmp_path, journal_mode):
+    """An engine on a new SQLite file with every table created"""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}", journal_mode=journal_mode)
+    models.Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(tmp_engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=tmp_engine)
+
+
+@pytest.fixture
+def make_client(session_factory):
+    """make_client(app) -> TestClient whose requests use the test database"""
+    def make(app):
+        def test_db():
+            session = session_factory()
+            try:
+                yield session
+            finally:
+                session.close()
+
+        app.dependency_overrides[get_db] = test_db
+        return TestClient(app)
+    return make
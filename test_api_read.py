@@ -0,0 +1,72 @@
+import pytest
+
+from app import models
+from app.api_read import STORAGE, PURCHASE_ORDER
+from app.main import app
+
+ITEM_KEYS = ["id", "material_id", "material_name", "spec", "brand", "dealer_name", "quantity", "price", "unit"]
+
+
+@pytest.fixture
+def client(session_factory, make_client):
+    with session_factory() as db:
+        db.add_all([
+            models.Dealer(id=1, name="Acme"),
+            models.Storage(id=1, base_name="Bolt", defined_name_with_spec="M8", dealer_id=1, price=10),
+            models.Storage(id=2, base_name="Nut", defined_name_with_spec="M8", price=2),
+            models.PurchaseOrder(po_no=1, dealer_id=1, status="Draft"),
+            models.PurchaseOrderItem(id=1, po_no=1, material_id=1, material_name="Bolt", quantity=5, price=10),
+            models.PurchaseOrderItem(id=2, po_no=1, material_id=2, material_name="Nut", quantity=9, price=2),
+        ])
+        db.commit()
+    yield make_client(app)
+    app.dependency_overrides.clear()
+
+
+def test_storage_default_selection(client):
+    rows = client.get("/storage/api").json()
+    assert [list(row) for row in rows] == [list(STORAGE.columns) + ["dealer"]] * 2
+    assert [row["dealer"] for row in rows] == [{"id": 1, "name": "Acme"}, None]
+    assert [row["dealer_name"] for row in rows] == ["Acme", None]
+
+
+def test_storage_narrow_selection(client):
+    # The default dealer embed comes along unless include= turns it off
+    rows = client.get("/storage/api", params={"fields": "id,price"}).json()
+    assert rows == [{"id": 1, "price": 10.0, "dealer": {"id": 1, "name": "Acme"}},
+                    {"id": 2, "price": 2.0, "dealer": None}]
+
+    rows = client.get("/storage/api", params={"fields": "price,id,price", "include": ""}).json()
+    assert rows == [{"price": 10.0, "id": 1}, {"price": 2.0, "id": 2}]
+
+    # dealer_name alone still joins dealer
+    rows = client.get("/storage/api", params={"fields": "base_name,dealer_name", "include": ""}).json()
+    assert rows == [{"base_name": "Bolt", "dealer_name": "Acme"}, {"base_name": "Nut", "dealer_name": None}]
+
+
+def test_purchase_order_selections(client):
+    (row,) = client.get("/purchase_orders/api").json()
+    assert list(row) == list(PURCHASE_ORDER.columns) + ["dealer"]
+
+    # Items are matched to their order on po_no, which is not returned
+    (row,) = client.get("/purchase_orders/api", params={"fields": "status", "include": "items"}).json()
+    assert list(row) == ["status", "items"]
+    assert [list(item) for item in row["items"]] == [ITEM_KEYS] * 2
+    assert [item["quantity"] for item in row["items"]] == [5, 9]
+
+    row = client.get("/purchase_orders/api/1", params={"fields": "po_no", "include": "dealer,items"}).json()
+    assert list(row) == ["po_no", "dealer", "items"]
+
+
+@pytest.mark.parametrize("path", ["/storage/api", "/purchase_orders/api", "/storage/api/1"])
+def test_unknown_names_are_json_400s(client, path):
+    response = client.get(path, params={"fields": "nope"})
+    assert response.status_code == 400
+    assert response.headers["content-type"] == "application/json"
+    assert response.json()["detail"].startswith("Unknown field(s): nope. Available: ")
+
+    response = client.get(path, params={"include": "items,owner"})
+    assert response.status_code == 400
+    detail = response.json()["detail"]
+    assert detail.startswith("Unknown include(s): ")
+    assert "owner" in detail
@@ -0,0 +1,32 @@
+import threading
+
+from app.autocomplete import MaterialIndex
+
+
+def make_index(count):
+    index = MaterialIndex()
+    index.load([(i, i % 3, "Bolt", f"M{i}", "Tata") for i in range(count)])
+    return index
+
+
+def test_changes_and_compaction_keep_results():
+    index = make_index(3000)
+    # Re-index 2000 items, leaving enough empty slots to compact
+    index.apply([(i, i % 3, "Nut", f"M{i}", "Tata") for i in range(2000)], removed=[2999])
+    assert index.dead == 0
+    assert len(index.items) == 2999
+    assert index.search("nut m15")[0] == 15
+    assert index.search("bolt m2500") == [2500]
+    assert index.search("bolt m2999") == []
+    assert set(index.search("nut", dealer_id=1, limit=5000)) == {i for i in range(2000) if i % 3 == 1}
+
+
+def test_search_does_not_wait_for_a_writer_building_changes():
+    index = make_index(100)
+    # A writer building a rebuild or compaction holds only writer
+    with index.writer:
+        result = []
+        searcher = threading.Thread(target=lambda: result.append(index.search("bolt m42")))
+        searcher.start()
+        searcher.join(timeout=5)
+        assert result == [[42]]
@@ -0,0 +1,85 @@
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import select, func
+
+from app import models
+from app.routers import batch
+
+
+@pytest.fixture
+def client(session_factory, make_client):
+    with session_factory() as db:
+        db.add(models.Dealer(id=1, name="Acme"))
+        db.commit()
+    app = FastAPI()
+    app.include_router(batch.router, prefix="/api/batch")
+    return make_client(app)
+
+
+def dealer_names(session_factory):
+    with session_factory() as db:
+        return sorted(db.scalars(select(models.Dealer.name)))
+
+
+def test_failed_operation_does_not_undo_the_others(client, session_factory):
+    response = client.post("/api/batch", json={"operations": [
+        {"op": "create", "resource": "dealers", "data": {"name": "Bolt House"}},
+        {"op": "update", "resource": "dealers", "id": 99, "data": {"name": "Missing"}},
+        {"op": "create", "resource": "dealers", "data": {"city": "No name"}},
+        {"op": "update", "resource": "dealers", "id": 1, "data": {"name": "Acme Fasteners"}},
+    ]})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["committed"] is True
+    assert [result["status"] for result in body["results"]] == [201, 404, 422, 200]
+    assert (body["succeeded"], body["failed"]) == (2, 2)
+    assert dealer_names(session_factory) == ["Acme Fasteners", "Bolt House"]
+
+
+def test_atomic_batch_rolls_back_everything(client, session_factory):
+    # The first operation's savepoint is released before the failure; it
+    # must still be inside the transaction that gets rolled back
+    response = client.post("/api/batch", json={"atomic": True, "operations": [
+        {"op": "create", "resource": "dealers", "data": {"name": "Bolt House"}},
+        {"op": "update", "resource": "dealers", "id": 1, "data": {"name": "Acme Fasteners"}},
+        {"op": "delete", "resource": "dealers", "id": 99},
+        {"op": "create", "resource": "dealers", "data": {"name": "Never run"}},
+    ]})
+    assert response.status_code == 409
+    body = response.json()
+    assert body["committed"] is False
+    assert [result["status"] for result in body["results"]] == [424, 424, 404, 424]
+    assert "id" not in body["results"][0]
+    assert dealer_names(session_factory) == ["Acme"]
+
+
+def test_same_key_and_body_replays_the_stored_response(client, session_factory):
+    payload = {"operations": [{"op": "create", "resource": "dealers", "data": {"name": "Bolt House"}}]}
+    first = client.post("/api/batch", json=payload, headers={"Idempotency-Key": "sync-1"})
+    assert first.status_code == 200
+    assert "Idempotent-Replayed" not in first.headers
+
+    again = client.post("/api/batch", json=payload, headers={"Idempotency-Key": "sync-1"})
+    assert again.status_code == 200
+    assert again.headers["Idempotent-Replayed"] == "true"
+    assert again.json() == first.json()
+    assert dealer_names(session_factory) == ["Acme", "Bolt House"]
+
+    # A failed atomic batch is stored too, and replays as the same 409
+    payload = {"atomic": True, "operations": [{"op": "delete", "resource": "dealers", "id": 99}]}
+    assert client.post("/api/batch", json=payload, headers={"Idempotency-Key": "sync-2"}).status_code == 409
+    replay = client.post("/api/batch", json=payload, headers={"Idempotency-Key": "sync-2"})
+    assert replay.status_code == 409
+    assert replay.headers["Idempotent-Replayed"] == "true"
+
+
+def test_same_key_with_a_different_body_is_rejected(client, session_factory):
+    payload = {"operations": [{"op": "create", "resource": "dealers", "data": {"name": "Bolt House"}}]}
+    assert client.post("/api/batch", json=payload, headers={"Idempotency-Key": "sync-1"}).status_code == 200
+
+    payload["operations"][0]["data"]["name"] = "Nut House"
+    response = client.post("/api/batch", json=payload, headers={"Idempotency-Key": "sync-1"})
+    assert response.status_code == 422
+    assert dealer_names(session_factory) == ["Acme", "Bolt House"]
+    with session_factory() as db:
+        assert db.scalar(select(func.count()).select_from(models.IdempotencyKey)) == 1
@@ -0,0 +1,78 @@
+import pytest
+
+from app import models
+from app.allocation import allocate_stock, record_supply
+from app.stock import issue_materials, InsufficientStockError
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    # 10 bolts in stock; the urgent BOM needs 8 of them, the low priority one 5
+    session.add_all([
+        models.Storage(id=1, base_name="Bolt", defined_name_with_spec="M8", current_stock=10),
+        models.BOM(id=1, bom_identifier="BOM-A", priority=4, status="pending", required_total=8),
+        models.BOM(id=2, bom_identifier="BOM-B", priority=1, status="pending", required_total=5),
+        models.BOMMaterial(id=1, bom_id=1, storage_id=1, quantity_required=8, quantity_provided=0),
+        models.BOMMaterial(id=2, bom_id=2, storage_id=1, quantity_required=5, quantity_provided=0),
+    ])
+    session.commit()
+    allocate_stock(session)
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_allocation_reserves_by_priority(db):
+    assert db.get(models.BOMMaterial, 1).quantity_reserved == 8
+    assert db.get(models.BOMMaterial, 2).quantity_reserved == 2
+
+
+def test_outward_cannot_take_reserved_stock(db):
+    # All 10 are reserved, so a manual issue gets nothing
+    with pytest.raises(InsufficientStockError):
+        issue_materials(db, [{"storage_id": 1, "qty": 1}])
+    db.rollback()
+    assert db.get(models.Storage, 1).current_stock == 10
+
+    db.get(models.Storage, 1).current_stock = 12
+    db.commit()
+    issue_materials(db, [{"storage_id": 1, "qty": 2}])
+    db.commit()
+    db.expire_all()
+    assert db.get(models.Storage, 1).current_stock == 10
+    assert db.get(models.BOMMaterial, 1).quantity_reserved == 8
+
+
+def test_supply_cannot_take_another_boms_reservation(db):
+    # BOM B holds 2; the other 8 belong to the urgent BOM A
+    with pytest.raises(InsufficientStockError):
+        record_supply(db, {2: [(2, 3)]})
+    db.rollback()
+
+    record_supply(db, {2: [(2, 2)]})
+    db.commit()
+    db.expire_all()
+    assert db.get(models.Storage, 1).current_stock == 8
+    assert db.get(models.BOMMaterial, 1).quantity_reserved == 8
+    assert db.get(models.BOMMaterial, 2).quantity_provided == 2
+
+    # BOM A can still use everything reserved for it
+    record_supply(db, {1: [(1, 8)]})
+    db.commit()
+    db.expire_all()
+    assert db.get(models.Storage, 1).current_stock == 0
+    assert db.get(models.BOM, 1).status == "completed"
+
+
+def test_supply_beyond_requirement_is_rejected(db):
+    with pytest.raises(ValueError):
+        record_supply(db, {1: [(1, 9)]})
+    db.rollback()
+    # Split lines for the same material count together
+    with pytest.raises(ValueError):
+        record_supply(db, {1: [(1, 5), (1, 4)]})
+    db.rollback()
+    db.expire_all()
+    assert db.get(models.Storage, 1).current_stock == 10
+    assert db.get(models.BOMMaterial, 1).quantity_provided == 0
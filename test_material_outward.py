@@ -0,0 +1,124 @@
+import threading
+
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import select, func
+
+from app import models
+from app.middleware import FlashMiddleware, FLASH_COOKIE, decode_messages
+from app.routers import material_outward
+from app.stock import issue_materials, InsufficientStockError
+
+INITIAL_STOCK = 500
+THREADS = 8
+ISSUES_PER_THREAD = 100
+
+
+@pytest.fixture
+def journal_mode():
+    # Concurrent writers, as in production
+    return "WAL"
+
+
+@pytest.fixture(autouse=True)
+def stock(session_factory):
+    with session_factory() as db:
+        db.add_all([
+            models.Storage(id=1, base_name="Bolt", defined_name_with_spec="M8", current_stock=INITIAL_STOCK),
+            models.Storage(id=2, base_name="Nut", defined_name_with_spec="M8", current_stock=INITIAL_STOCK),
+        ])
+        db.commit()
+
+
+@pytest.fixture
+def client(make_client):
+    app = FastAPI()
+    app.add_middleware(FlashMiddleware)
+    app.include_router(material_outward.router, prefix="/material_outward")
+    return make_client(app)
+
+
+def test_concurrent_issues_never_oversell(session_factory):
+    # 8 threads x 100 issues of 1 unit against 500 in stock: exactly 500 may succeed
+    issued = []
+    rejected = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(section):
+        db = session_factory()
+        try:
+            for _ in range(ISSUES_PER_THREAD):
+                try:
+                    issue_materials(db, [{"storage_id": 1, "qty": 1, "receiver_section": section}])
+                    db.commit()
+                    with lock:
+                        issued.append(1)
+                except InsufficientStockError:
+                    db.rollback()
+                    with lock:
+                        rejected.append(1)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=worker, args=(f"Section {i}",)) for i in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    db = session_factory()
+    stock = db.execute(select(models.Storage.current_stock).where(models.Storage.id == 1)).scalar()
+    outwards = db.execute(select(func.count(models.MaterialOutward.id))).scalar()
+    db.close()
+
+    assert stock >= 0
+    assert len(issued) + len(rejected) == THREADS * ISSUES_PER_THREAD
+    assert len(issued) == INITIAL_STOCK
+    assert stock == INITIAL_STOCK - len(issued)
+    assert outwards == len(issued)
+
+
+def test_bulk_issue_is_atomic_unless_partial(session_factory):
+    db = session_factory()
+    lines = [{"storage_id": 1, "qty": 10}, {"storage_id": 2, "qty": INITIAL_STOCK + 1}]
+
+    with pytest.raises(InsufficientStockError) as exc:
+        issue_materials(db, lines)
+    db.rollback()
+    assert exc.value.shortages == {2: INITIAL_STOCK + 1}
+    assert db.get(models.Storage, 1).current_stock == INITIAL_STOCK
+
+    outward_ids, rejected = issue_materials(db, lines, partial=True)
+    db.commit()
+    assert len(outward_ids) == 1
+    assert rejected == [lines[1]]
+    assert db.get(models.Storage, 1).current_stock == INITIAL_STOCK - 10
+    assert db.get(models.Storage, 2).current_stock == INITIAL_STOCK
+    db.close()
+
+
+def test_api_lists_rows_issued_before_storage_id(client, session_factory):
+    db = session_factory()
+    db.add(models.MaterialOutward(material_details="Old bolt", receiver_section="Assembly", qty=None))
+    db.commit()
+    db.close()
+    client.post("/material_outward/api", json={"storage_id": 1, "qty": 2})
+
+    response = client.get("/material_outward/api")
+    assert response.status_code == 200
+    assert [(row["storage_id"], row["qty"]) for row in response.json()] == [(1, 2.0), (None, None)]
+    assert client.post("/material_outward/api", json={"storage_id": 1, "qty": 0}).status_code == 422
+
+
+def test_failed_issue_is_flashed(client):
+    response = client.post("/material_outward/add", data={"storage_id": 1, "qty": INITIAL_STOCK + 1},
+                           follow_redirects=False)
+    assert response.status_code == 303
+    assert response.headers["location"] == "/material_outward"
+    messages = decode_messages(response.cookies[FLASH_COOKIE].encode())
+    assert messages == [("error", f"Could not issue the material: Insufficient unreserved stock for "
+                                  f"storage item(s) 1 (requested {float(INITIAL_STOCK + 1)})")]
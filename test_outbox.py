@@ -0,0 +1,124 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+from app import models, outbox
+
+
+@pytest.fixture(autouse=True)
+def outbox_on_test_db(session_factory, monkeypatch):
+    # The dispatcher reads and moves cursors through its own sessions
+    monkeypatch.setattr(outbox, "SessionLocal", session_factory)
+    monkeypatch.setattr(outbox, "_subscribers", {})
+
+
+def add_dealers(Session, *names):
+    with Session() as db:
+        for name in names:
+            db.add(models.Dealer(name=name))
+            db.commit()
+
+
+def events(Session):
+    with Session() as db:
+        return db.execute(select(models.OutboxEvent.__table__)).all()
+
+
+def cursor(Session, name):
+    with Session() as db:
+        return db.execute(
+            select(models.OutboxCursor.__table__).where(models.OutboxCursor.subscriber == name)
+        ).one()
+
+
+def test_events_commit_with_the_change_and_vanish_on_rollback(session_factory):
+    with session_factory() as db:
+        dealer = models.Dealer(name="Acme")
+        db.add(dealer)
+        db.commit()
+        recorded = events(session_factory)
+        assert [(e.resource, e.action, e.row_ids) for e in recorded] == [("dealers", "changed", f"[{dealer.id}]")]
+
+        db.add(models.Dealer(name="Rolled back"))
+        db.flush()
+        db.rollback()
+        assert len(events(session_factory)) == 1
+
+        db.delete(dealer)
+        db.commit()
+    assert [(e.resource, e.action) for e in events(session_factory)] == [
+        ("dealers", "changed"), ("dealers", "deleted"),
+    ]
+
+
+def test_delivery_is_batched_and_in_order(session_factory, monkeypatch):
+    monkeypatch.setattr(outbox, "BATCH_SIZE", 2)
+    batches = []
+    outbox.subscribe("recorder")(lambda delivered: batches.append([e.id for e in delivered]))
+    outbox.start_after("recorder", 0)
+    add_dealers(session_factory, "A", "B", "C", "D", "E")
+
+    asyncio.run(outbox.Dispatcher().dispatch())
+    assert batches == [[1, 2], [3, 4], [5]]
+    assert outbox._subscribers["recorder"].position == 5
+
+    add_dealers(session_factory, "F")
+    asyncio.run(outbox.Dispatcher().dispatch())
+    assert batches[-1] == [6]
+
+
+def test_failing_subscriber_is_retried_from_the_same_position(session_factory):
+    calls = []
+
+    async def flaky(delivered):
+        calls.append([e.id for e in delivered])
+        if len(calls) == 1:
+            raise RuntimeError("webhook down")
+
+    outbox.subscribe("flaky", durable=True)(flaky)
+    outbox._create_cursor("flaky", 0)
+    add_dealers(session_factory, "A", "B")
+    dispatcher = outbox.Dispatcher()
+
+    asyncio.run(dispatcher.dispatch())
+    row = cursor(session_factory, "flaky")
+    assert (row.position, row.attempts, row.last_error) == (0, 1, "webhook down")
+    assert row.lease_owner is None
+    subscriber = outbox._subscribers["flaky"]
+    assert subscriber.retry_at > 0
+
+    # Backing off: nothing is delivered until retry_at passes
+    asyncio.run(dispatcher.dispatch())
+    assert len(calls) == 1
+
+    subscriber.retry_at = 0
+    asyncio.run(dispatcher.dispatch())
+    assert calls == [[1, 2], [1, 2]]
+    row = cursor(session_factory, "flaky")
+    assert (row.position, row.attempts, row.last_error) == (2, 0, None)
+
+
+def test_lease_keeps_two_owners_apart(session_factory):
+    outbox._create_cursor("hook", 7)
+    assert outbox._claim("hook", "worker-1") == 7
+    assert outbox._claim("hook", "worker-2") is None
+    # The holder can renew its own lease
+    assert outbox._claim("hook", "worker-1") == 7
+
+    # A second owner's advance or release does not touch the cursor
+    outbox._advance("hook", "worker-2", 99)
+    outbox._release("hook", "worker-2", 99)
+    assert cursor(session_factory, "hook").position == 7
+
+    outbox._advance("hook", "worker-1", 9)
+    outbox._release("hook", "worker-1", 9)
+    assert outbox._claim("hook", "worker-2") == 9
+
+    # A lease that ran out can be taken over
+    with session_factory() as db:
+        db.execute(update(models.OutboxCursor.__table__).values(leased_until=datetime.now() - timedelta(seconds=1)))
+        db.commit()
+    assert outbox._claim("hook", "worker-1") == 9
+    assert outbox._claim("hook", "worker-2") is None
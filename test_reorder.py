@@ -0,0 +1,104 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from app import models
+from app.reorder import reorder_suggestions, create_draft_orders
+
+TODAY = date(2026, 3, 31)
+
+
+def days_ago(days):
+    return TODAY - timedelta(days=days)
+
+
+@pytest.fixture
+def db(session_factory):
+    with session_factory() as db:
+        db.add_all([
+            models.Dealer(id=1, name="Acme"),
+            models.Dealer(id=2, name="Bolt House"),
+            # 1: short, 2: well stocked, 3: short with no lead history,
+            # 4: short without a dealer, 5: covered by what is on order
+            models.Storage(id=1, base_name="Bolt", dealer_id=1, current_stock=20, price=10),
+            models.Storage(id=2, base_name="Nut", dealer_id=1, current_stock=100, price=2),
+            models.Storage(id=3, base_name="Washer", dealer_id=2, current_stock=0, price=1),
+            models.Storage(id=4, base_name="Rivet", current_stock=0),
+            models.Storage(id=5, base_name="Pin", dealer_id=2, current_stock=0),
+
+            # Usage over the 90 day window; the 500 issued before it is ignored
+            models.MaterialOutward(storage_id=1, qty=60, date=days_ago(10)),
+            models.MaterialOutward(storage_id=1, qty=30, date=days_ago(80)),
+            models.MaterialOutward(storage_id=1, qty=500, date=days_ago(100)),
+            models.BOMSupplyTransaction(id=1, bom_id=1, supply_date=days_ago(20)),
+            models.BOMSupplyItem(transaction_id=1, bom_id=1, storage_id=1, quantity_provided=90),
+            models.MaterialOutward(storage_id=2, qty=90, date=days_ago(5)),
+            models.MaterialOutward(storage_id=3, qty=45, date=days_ago(5)),
+            models.MaterialOutward(storage_id=4, qty=9, date=days_ago(5)),
+            models.MaterialOutward(storage_id=5, qty=45, date=days_ago(5)),
+
+            # Acme delivered in 10, 6 and 8 days
+            models.PurchaseOrder(po_no=1, dealer_id=1, status="Received", date=date(2026, 1, 1)),
+            models.MaterialInward(id=1, po_no=1, date_of_inward=date(2026, 1, 11)),
+            models.PurchaseOrder(po_no=2, dealer_id=1, status="Received", date=date(2026, 2, 1)),
+            models.MaterialInward(id=2, po_no=2, date_of_inward=date(2026, 2, 7)),
+            models.MaterialInward(id=3, po_no=2, date_of_inward=date(2026, 2, 20)),
+            # Still open: 12 bolts ordered, 4 received so far
+            models.PurchaseOrder(po_no=3, dealer_id=1, status="Sent", date=date(2026, 3, 20)),
+            models.PurchaseOrderItem(id=1, po_no=3, material_id=1, quantity=12),
+            models.MaterialInward(id=4, po_no=3, date_of_inward=date(2026, 3, 28)),
+            models.MaterialInwardItem(material_inward_id=4, po_item_id=1, quantity_received=4),
+            # A cancelled order is not on order; an open one covers the pins
+            models.PurchaseOrder(po_no=4, dealer_id=2, status="cancelled", date=days_ago(3)),
+            models.PurchaseOrderItem(id=2, po_no=4, material_id=3, quantity=100),
+            models.PurchaseOrder(po_no=5, dealer_id=2, status=None, date=days_ago(3)),
+            models.PurchaseOrderItem(id=3, po_no=5, material_id=5, quantity=10),
+
+            # An open BOM still needs 10 bolts; the completed one no longer counts
+            models.BOM(id=1, bom_identifier="BOM-1", status="pending"),
+            models.BOMMaterial(bom_id=1, storage_id=1, quantity_required=15, quantity_provided=5),
+            models.BOM(id=2, bom_identifier="BOM-2", status="completed"),
+            models.BOMMaterial(bom_id=2, storage_id=2, quantity_required=500, quantity_provided=0),
+        ])
+        db.commit()
+        yield db
+
+
+def test_suggested_quantities(db):
+    suggestions = {s.storage_id: s for s in reorder_suggestions(db, today=TODAY)}
+    assert list(suggestions) == [4, 1, 3]
+
+    bolt = suggestions[1]
+    assert (bolt.daily_usage, bolt.lead_days) == (2.0, 8.0)
+    assert (bolt.current_stock, bolt.on_order, bolt.committed) == (20, 8, 10)
+    # 2/day over 8 + 7 safety days; topped up to 30 days beyond from 20 + 8 - 10
+    assert bolt.reorder_point == 30
+    assert bolt.quantity == 72
+
+    washer = suggestions[3]
+    assert (washer.daily_usage, washer.lead_days, washer.on_order) == (0.5, 7.0, 0)
+    assert washer.quantity == 22
+
+    rivet = suggestions[4]
+    assert (rivet.dealer_id, rivet.quantity) == (None, 5)
+
+    assert [s.storage_id for s in reorder_suggestions(db, dealer_id=2, today=TODAY)] == [3]
+
+
+def test_second_run_drafts_nothing(db):
+    report = create_draft_orders(db, today=TODAY)
+    db.commit()
+    assert report["items"] == 2
+    assert report["unassigned"] == [4]
+
+    drafts = {po.dealer_id: po for po in db.scalars(select(models.PurchaseOrder).where(
+        models.PurchaseOrder.po_no.in_(report["orders"])))}
+    assert sorted(drafts) == [1, 2]
+    assert all(po.status == "draft" and po.date == TODAY for po in drafts.values())
+    assert [(i.material_id, i.quantity) for i in drafts[1].items] == [(1, 72)]
+    assert [(i.material_id, i.quantity) for i in drafts[2].items] == [(3, 22)]
+
+    # The drafts count as on order now
+    again = create_draft_orders(db, today=TODAY)
+    assert again == {"orders": [], "items": 0, "unassigned": [4]}
@@ -0,0 +1,75 @@
+import asyncio
+import json
+import time
+
+import anyio.to_thread
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app import request_profiler
+
+
+def spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def profiled_work():
+    spin(0.3)
+
+
+def other_work():
+    spin(0.3)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(request_profiler, "PROFILER_TOKEN", "secret")
+    monkeypatch.setattr(request_profiler, "PROFILE_DIR", str(tmp_path))
+    # The middleware wraps anyio's run_sync; put the original back afterwards
+    monkeypatch.setattr(anyio.to_thread, "run_sync", anyio.to_thread.run_sync)
+    app = FastAPI()
+    app.add_middleware(request_profiler.RequestProfilerMiddleware)
+
+    @app.get("/profiled")
+    def profiled():
+        profiled_work()
+        return {}
+
+    @app.get("/other")
+    def other():
+        other_work()
+        return {}
+
+    return app
+
+
+def test_profile_holds_only_the_requests_threads(app, tmp_path):
+    async def run():
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            responses = await asyncio.gather(
+                client.get("/profiled", headers={"X-Profile": "secret"}),
+                client.get("/other"),
+                client.get("/other"),
+            )
+        assert [r.status_code for r in responses] == [200, 200, 200]
+    asyncio.run(run())
+
+    (file_name,) = [p.name for p in tmp_path.iterdir()]
+    profile = json.loads((tmp_path / file_name).read_text())
+    names = {frame["name"] for frame in profile["shared"]["frames"]}
+    assert "profiled_work" in names
+    assert "other_work" not in names
+    assert any(p["name"].startswith("AnyIO worker thread") for p in profile["profiles"])
+    assert anyio.to_thread.run_sync.tracks_workers
+
+
+def test_wrong_token_is_not_profiled(app, tmp_path):
+    async def run():
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            response = await client.get("/other", headers={"X-Profile": "sécret".encode()})
+        assert response.status_code == 200
+    asyncio.run(run())
+    assert list(tmp_path.iterdir()) == []
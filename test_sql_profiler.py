@@ -0,0 +1,86 @@
+import pytest
+from fastapi import Depends, FastAPI, Request
+from fastapi.responses import HTMLResponse
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.database import create_db_engine, get_db
+from app import models, sql_profiler
+from app.routers import products
+from app.shared import templates
+from app.sql_profiler import query_budget
+
+
+@pytest.fixture
+def client(tmp_engine, session_factory, make_client, monkeypatch):
+    db = session_factory()
+    db.add_all([models.Dealer(id=d, name=f"Dealer {d}") for d in range(1, 4)])
+    db.add_all([
+        models.Storage(base_name="Bolt", defined_name_with_spec=f"M{i}", dealer_id=i % 3 + 1)
+        for i in range(6)
+    ])
+    db.commit()
+    db.close()
+
+    app = FastAPI()
+    app.add_middleware(sql_profiler.SQLProfilerMiddleware)
+    app.include_router(products.router, prefix="/products")
+
+    # The storage picker as it was before it loaded dealers eagerly; routes
+    # render inside try/except, so the strict error never reaches the caller
+    @app.get("/lazy_picker")
+    def lazy_picker(request: Request, db: Session = Depends(get_db)):
+        try:
+            materials = db.query(models.Storage).limit(10).all()
+            return templates.TemplateResponse("_material_options.html", {"request": request, "materials": materials})
+        except Exception as e:
+            return HTMLResponse(f"<p>Error loading materials: {e}</p>")
+
+    @app.get("/over_budget")
+    @query_budget(2)
+    def over_budget(db: Session = Depends(get_db)):
+        try:
+            return {"dealers": [db.get(models.Dealer, d).name for d in range(1, 4)]}
+        except Exception as e:
+            return {"error": str(e)}
+
+    sql_profiler.instrument(tmp_engine)
+    monkeypatch.setattr(sql_profiler, "STRICT", True)
+    return make_client(app)
+
+
+def test_strict_mode_fails_a_page_that_lazy_loads(client):
+    response = client.get("/lazy_picker")
+    assert response.status_code == 500
+    assert "lazy loaded Storage.dealer" in response.text
+
+
+def test_strict_mode_fails_a_route_over_its_budget(client):
+    response = client.get("/over_budget")
+    assert response.status_code == 500
+    assert "budget of 2 statements" in response.text
+
+
+def test_strict_mode_passes_an_eager_page(client):
+    response = client.get("/products/search_materials", params={"q": "Bolt"})
+    assert response.status_code == 200
+    assert response.text.count("Dealer ") == 6
+    assert 'desc="1 queries"' in response.headers["server-timing"]
+
+
+def test_instrumenting_again_adds_no_listeners(client, tmp_engine, tmp_path):
+    other = create_db_engine(f"sqlite:///{tmp_path / 'other.db'}")
+    sql_profiler.instrument(other)
+    sql_profiler.instrument(tmp_engine)
+    tmp_engine.dispose()
+    sql_profiler.instrument(tmp_engine)
+    other.dispose()
+
+    with Session() as session:
+        listeners = list(session.dispatch.do_orm_execute)
+    assert listeners.count(sql_profiler._check_lazy_load) == 1
+    assert len(tmp_engine.dispatch.before_cursor_execute) == 1
+    assert event.contains(other, "after_cursor_execute", sql_profiler._after_cursor_execute)
+
+    response = client.get("/over_budget")
+    assert response.status_code == 500
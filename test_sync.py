@@ -0,0 +1,102 @@
+import pytest
+
+from app import models
+from app.pricing import revise_prices
+from app.stock import issue_materials
+from app.storage_import import import_storage
+from app.sync import changes_since
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    session.add_all([
+        models.Dealer(id=1, name="Acme"),
+        models.Storage(id=1, base_name="Bolt", defined_name_with_spec="M8", dealer_id=1, price=10, current_stock=50),
+        models.Storage(id=2, base_name="Nut", defined_name_with_spec="M10", dealer_id=1, price=2, current_stock=50),
+        models.PurchaseOrder(po_no=1, dealer_id=1, status="Draft"),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def read_all(db, resource, token=None, limit=500):
+    """Follow the feed to its end; returns (changed ids, deleted ids, last token, pages)"""
+    changed, deleted, pages = [], [], 0
+    while True:
+        page = changes_since(db, resource, token, limit)
+        changed += [row["po_no" if resource == "purchase_orders" else "id"] for row in page["changes"]]
+        deleted += page["deleted"]
+        token = page["next"]
+        pages += 1
+        if not page["has_more"]:
+            return changed, deleted, token, pages
+
+
+def test_pages_split_one_large_transaction(db):
+    _, _, token, _ = read_all(db, "dealers")
+    db.add_all([models.Dealer(name=f"Dealer {n}") for n in range(25)])
+    db.commit()
+
+    changed, deleted, token, pages = read_all(db, "dealers", token, limit=10)
+    assert pages == 3
+    assert len(changed) == len(set(changed)) == 25
+    assert deleted == []
+    assert read_all(db, "dealers", token)[:2] == ([], [])
+
+
+def test_deleted_rows_come_back_as_tombstones(db):
+    _, _, token, _ = read_all(db, "storage")
+    db.delete(db.get(models.Storage, 2))
+    db.get(models.Storage, 1).price = 11
+    db.commit()
+
+    changed, deleted, token, _ = read_all(db, "storage", token)
+    assert changed == [1]
+    assert deleted == [2]
+    assert read_all(db, "storage", token)[:2] == ([], [])
+
+
+def test_child_added_through_the_parent_changes_the_parent(db):
+    _, _, token, _ = read_all(db, "purchase_orders")
+    po = db.get(models.PurchaseOrder, 1)
+    po.items.append(models.PurchaseOrderItem(material_id=1, material_name="Bolt", quantity=5))
+    db.commit()
+    changed, _, token, _ = read_all(db, "purchase_orders", token)
+    assert changed == [1]
+
+    item = db.query(models.PurchaseOrderItem).one()
+    item.quantity = 6
+    db.commit()
+    changed, _, token, _ = read_all(db, "purchase_orders", token)
+    assert changed == [1]
+
+    po.items.remove(item)
+    db.commit()
+    changed, _, token, _ = read_all(db, "purchase_orders", token)
+    assert changed == [1]
+
+
+def test_core_writes_stamp_change_seq(db):
+    _, _, token, _ = read_all(db, "storage")
+
+    revise_prices(db, percent=10, brand=None)
+    db.commit()
+    changed, _, token, _ = read_all(db, "storage", token)
+    assert sorted(changed) == [1, 2]
+
+    issue_materials(db, [{"storage_id": 2, "qty": 5}])
+    db.commit()
+    changed, _, token, _ = read_all(db, "storage", token)
+    assert changed == [2]
+
+    report = import_storage(db, iter([
+        ["base_name", "defined_name_with_spec", "dealer_id", "price"],
+        ["Bolt", "M8", "1", "12"],
+        ["Washer", "M6", "1", "1"],
+    ]))
+    assert (report["inserted"], report["updated"]) == (1, 1)
+    changed, _, token, _ = read_all(db, "storage", token)
+    assert sorted(changed) == [1, max(changed)]
+    assert max(changed) > 2
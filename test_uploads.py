@@ -0,0 +1,108 @@
+import asyncio
+import io
+import os
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+from starlette.datastructures import UploadFile
+
+from app import uploads
+
+CONTENT = bytes(range(100)) * 10  # 1000 bytes
+
+
+def store(content, filename="proof.pdf"):
+    return asyncio.run(uploads.store_upload(UploadFile(io.BytesIO(content), filename=filename), "proofs"))
+
+
+@pytest.fixture(autouse=True)
+def upload_root(tmp_path, monkeypatch):
+    root = tmp_path / "uploads"
+    monkeypatch.setattr(uploads, "UPLOAD_ROOT", str(root))
+    return root
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.get("/files/{key:path}")
+    async def serve(key: str, request: Request):
+        path = uploads.resolve_upload(os.path.join(uploads.UPLOAD_ROOT, key))
+        if path is None:
+            raise HTTPException(status_code=404)
+        return uploads.UploadResponse(path, request.headers)
+
+    return TestClient(app)
+
+
+@pytest.fixture
+def key(upload_root):
+    return os.path.relpath(store(CONTENT), upload_root)
+
+
+def test_same_content_is_stored_once(upload_root):
+    first = store(CONTENT, "a.pdf")
+    second = store(CONTENT, "b.pdf")
+    assert first == second
+    assert os.path.basename(first).endswith(".pdf")
+    assert open(first, "rb").read() == CONTENT
+    assert os.listdir(upload_root / "proofs" / "tmp") == []
+
+
+def test_whole_file_and_not_modified(client, key):
+    response = client.get(f"/files/{key}")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["accept-ranges"] == "bytes"
+
+    etag = response.headers["etag"]
+    response = client.get(f"/files/{key}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_byte_ranges(client, key):
+    response = client.get(f"/files/{key}", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 10-19/1000"
+    assert response.content == CONTENT[10:20]
+
+    response = client.get(f"/files/{key}", headers={"Range": "bytes=-5"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[-5:]
+
+    response = client.get(f"/files/{key}", headers={"Range": "bytes=990-5000"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == "bytes 990-999/1000"
+
+
+def test_unsatisfiable_range_is_416(client, key):
+    response = client.get(f"/files/{key}", headers={"Range": "bytes=1000-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */1000"
+
+
+@pytest.mark.parametrize("header", ["bytes=500-100", "bytes=0-1,5-6", "items=0-10"])
+def test_invalid_range_sends_the_whole_file(client, key, header):
+    response = client.get(f"/files/{key}", headers={"Range": header})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+def test_stale_if_range_sends_the_whole_file(client, key):
+    response = client.get(f"/files/{key}", headers={"Range": "bytes=0-9", "If-Range": '"other"'})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+def test_paths_outside_the_store_are_refused(client, key, upload_root, tmp_path):
+    secret = tmp_path / "secret.txt"
+    secret.write_text("not an upload")
+    assert uploads.resolve_upload(str(upload_root / ".." / "secret.txt")) is None
+    assert uploads.resolve_upload(str(upload_root / "proofs" / "missing.pdf")) is None
+    assert uploads.resolve_upload("") is None
+    assert uploads.resolve_upload(str(upload_root / key)) is not None
+    assert client.get("/files/../secret.txt").status_code == 404
+    assert client.get("/files/proofs/..%2F..%2Fsecret.txt").status_code == 404